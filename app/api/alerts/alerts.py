@@ -0,0 +1,215 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.auth import get_current_active_user
+from app.core.config import settings
+from app.core.responses import respond
+from app.db.database import get_session
+from app.models import Company, PriceAlert, Watchlist
+from app.schemas.alerts import (
+    AlertDeliverySchema,
+    PriceAlertCreateSchema,
+    PriceAlertSchema,
+)
+from app.schemas.base import ErrorSchema
+from app.schemas.company import CompanyModelSchema
+from app.schemas.token import TokenData
+from app.services.alerts import alerts
+from app.services.ticks import ticks
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    response_model=List[PriceAlertSchema],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def list_alerts(
+    active: Optional[bool] = Query(None),
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> List[PriceAlertSchema]:
+    statement = select(PriceAlert).where(PriceAlert.user_id == current_user.id)
+    if active is not None:
+        statement = statement.where(PriceAlert.active == active)
+    result = await db.execute(statement.order_by(col(PriceAlert.id).desc()))
+    return respond([PriceAlertSchema.from_orm(row) for row in result.scalars().all()])
+
+
+@router.post(
+    "",
+    response_model=PriceAlertSchema,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+        status.HTTP_406_NOT_ACCEPTABLE: {"model": ErrorSchema},
+    },
+)
+async def create_alert(
+    body: PriceAlertCreateSchema,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> PriceAlertSchema:
+    result = await db.execute(
+        select(Company.price, Company.symbol).where(Company.id == body.company_id)
+    )
+    company = result.one_or_none()
+    if company is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
+        )
+    result = await db.execute(
+        select(func.count(col(PriceAlert.id))).where(
+            PriceAlert.user_id == current_user.id, PriceAlert.active.is_(True)
+        )
+    )
+    if result.scalar_one() >= settings.ALERTS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Too many active alerts",
+        )
+
+    now = datetime.now(timezone.utc)
+    alert = PriceAlert(user_id=current_user.id, created_at=now, **body.dict())
+    # an alert already satisfied at the current price fires right away
+    fired = alerts.satisfied(body.direction, body.threshold, company.price)
+    if fired:
+        alert.active = False
+        alert.triggered_at = now
+        alert.triggered_price = company.price
+    db.add(alert)
+    await db.commit()
+    if fired:
+        alerts.fired(alert, company.symbol)
+    else:
+        alerts.add(alert, company.price, company.symbol)
+    return respond(
+        PriceAlertSchema.from_orm(alert), status_code=status.HTTP_201_CREATED
+    )
+
+
+@router.get(
+    "/deliveries",
+    response_model=List[AlertDeliverySchema],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def get_deliveries(
+    current_user: TokenData = Depends(get_current_active_user),
+) -> List[AlertDeliverySchema]:
+    # Drains the queue: each triggered alert is delivered once per process.
+    return respond(
+        [AlertDeliverySchema(**delivery) for delivery in alerts.drain(current_user.id)]
+    )
+
+
+@router.get(
+    "/watchlist",
+    response_model=List[CompanyModelSchema],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def get_watchlist(
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> List[CompanyModelSchema]:
+    # one query for the whole list, instead of a GET /company/{id} per symbol
+    table = Company.__table__
+    result = await db.execute(
+        select(*table.columns)
+        .join(Watchlist, Watchlist.company_id == Company.id)
+        .where(Watchlist.user_id == current_user.id)
+        .order_by(Company.symbol)
+    )
+    companies = []
+    for row in result.all():
+        company = CompanyModelSchema.from_orm(row)
+        latest = ticks.latest(company.symbol)
+        if latest is not None:
+            company.price = latest
+        companies.append(company)
+    return respond(companies)
+
+
+@router.put(
+    "/watchlist/{company_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+    },
+)
+async def watch_company(
+    company_id: int,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+):
+    result = await db.execute(select(Company.id).where(Company.id == company_id))
+    if result.one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
+        )
+    if await db.get(Watchlist, (current_user.id, company_id)) is None:
+        db.add(Watchlist(user_id=current_user.id, company_id=company_id))
+        await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.delete(
+    "/watchlist/{company_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def unwatch_company(
+    company_id: int,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+):
+    await db.execute(
+        delete(Watchlist).where(
+            Watchlist.user_id == current_user.id, Watchlist.company_id == company_id
+        )
+    )
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.delete(
+    "/{alert_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+    },
+)
+async def delete_alert(
+    alert_id: int,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+):
+    alert = await db.get(PriceAlert, alert_id)
+    if alert is None or alert.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found"
+        )
+    await db.delete(alert)
+    await db.commit()
+    alerts.remove(alert_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
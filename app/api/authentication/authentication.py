@@ -1,44 +1,70 @@
-from datetime import timedelta
-
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlmodel import or_
+from sqlmodel import or_, update
 
 from app.core.auth import (
     authenticate_user,
-    create_access_token,
+    create_user_token,
     get_current_active_user,
+    get_current_user,
     pwd_context,
+    revocations,
 )
-from app.core.config import settings
+from app.core.responses import respond
 from app.db.database import get_session
 from app.models import User
 from app.schemas.base import ErrorSchema
-from app.schemas.token import Token
+from app.schemas.token import Token, TokenData
 from app.schemas.user import UserModelSchema, UserRegistrationSchema
 
 router = APIRouter()
 
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_session),
+):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def logout(
+    current_user: TokenData = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+):
+    # Revokes every token the user holds, on every device.
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(token_version=User.token_version + 1)
+    )
+    result = await db.execute(
+        select(User.token_version).where(User.id == current_user.id)
+    )
+    version = result.scalar_one()
+    await db.commit()
+    revocations.revoke(current_user.id, version)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 @router.get(
     "/users/me/",
     response_model=UserModelSchema,
@@ -47,8 +73,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
     },
 )
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
-    return UserModelSchema.from_orm(current_user)
+async def read_users_me(
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+):
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+    return respond(UserModelSchema.from_orm(user))
 
 
 @router.post(
@@ -80,5 +115,5 @@ async def user_registration(
         db.add(user)
         await db.commit()
         await db.refresh(user)
-        access_token = create_access_token(data={"user_id": user.id})
+        access_token = create_user_token(user)
         return {"access_token": access_token, "token_type": "bearer"}
@@ -1,28 +1,86 @@
+import json
+import logging
+from datetime import date
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import requests
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlmodel import and_, col, or_
+from starlette.concurrency import run_in_threadpool
 
 from app.api.shares.constants import Currency
-from app.api.utils import convert_currency
+from app.api.utils import convert_currency, convert_prices
+from app.core.config import settings
+from app.core.etag import (
+    cache_headers,
+    companies_etag,
+    company_etag,
+    is_fresh,
+    not_modified,
+)
+from app.core.responses import respond
 from app.db.database import get_session
-from app.models import Company
+from app.models import Company, CompanyStats, ShareHolder, User
 from app.schemas.base import ErrorSchema
 from app.schemas.company import (
+    CompanyBatchMissingSchema,
+    CompanyBatchSchema,
+    CompanyBulkResultSchema,
+    CompanyChangesSchema,
     CompanyCreateSchema,
+    CompanyHolderSchema,
     CompanyModelSchema,
     CompanyPatchSchema,
+    CompanyPricesResultSchema,
     CompanySchema,
+    CompanySearchSchema,
+    CompanyStatsSchema,
+    TickStatsSchema,
+)
+from app.services.changes import (
+    TokenExpired,
+    changes_since,
+    decode_token,
+    encode_token,
+    tombstone,
+)
+from app.services.events import company_events
+from app.services.imports import CompanyImport, import_format, read_lines
+from app.services.prices import apply_prices
+from app.services.rates import current_rates, rate_history
+from app.services.screener import Screen, screener
+from app.services.search import search_index
+from app.services.stats import (
+    create_company_stats,
+    delete_company_stats,
+    refresh_market_caps,
 )
+from app.services.ticks import ticks
+from app.services.upstream import CircuitOpen, alpha_vantage, quotes
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# ids plus symbols per GET /company/batch
+BATCH_LIMIT = 500
+
 
 class Sort(str, Enum):
 
@@ -54,9 +112,51 @@ async def create_company(
     except NoResultFound:
         company: Company = Company.from_orm(company)
         db.add(company)
+        await db.flush()
+        await create_company_stats(db, Company.__table__.c.id == company.id)
         await db.commit()
         await db.refresh(company)
-        return CompanyModelSchema.from_orm(company)
+        company_events.upserted([company])
+        return respond(
+            CompanyModelSchema.from_orm(company), status_code=status.HTTP_201_CREATED
+        )
+
+
+@router.post(
+    "/bulk",
+    response_model=CompanyBulkResultSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: {"model": ErrorSchema},
+    },
+)
+async def bulk_create_companies(
+    request: Request, db: AsyncSession = Depends(get_session)
+) -> CompanyBulkResultSchema:
+
+    format_ = import_format(request.headers.get("content-type"))
+    if format_ is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson",
+        )
+    job = CompanyImport(db, settings.BULK_IMPORT_CHUNK_SIZE)
+    result = await job.run(read_lines(request.stream()), format_)
+    return respond(result)
+
+
+@router.post(
+    "/prices",
+    response_model=CompanyPricesResultSchema,
+    status_code=status.HTTP_200_OK,
+)
+async def update_company_prices(
+    prices: Dict[str, float] = Body(..., example={"BTC": 41250.5, "ETH": 3100}),
+    db: AsyncSession = Depends(get_session),
+) -> CompanyPricesResultSchema:
+
+    applied, rejected = await apply_prices(db, prices)
+    return respond(CompanyPricesResultSchema(applied=applied, rejected=rejected))
 
 
 @router.get(
@@ -65,6 +165,8 @@ async def create_company(
     status_code=status.HTTP_200_OK,
 )
 async def get_companies(
+    request: Request,
+    response: Response,
     name: Optional[str] = Query(None),
     currency: Optional[str] = Query(None),
     price: Optional[float] = Query(None),
@@ -75,57 +177,248 @@ async def get_companies(
     available__gt: Optional[int] = Query(None),
     price__sort: Optional[Sort] = Query(None),
     updated: Optional[Sort] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
     db: AsyncSession = Depends(get_session),
 ) -> List[CompanyModelSchema]:
 
-    _filter = []
-    order = []
-
-    if name is not None:
-        _filter.append(col(Company.name).contains(name))
+    etag = companies_etag(request, ticks.version)
+    if is_fresh(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
 
-    if currency is not None:
-        _filter.append(col(Company.currency).contains(currency))
+    price_bound = None
+    available_bound = None
+    order = []
 
     if price is not None and (price__gt is not None or price__lt is not None):
-
-        _filter.append(Company.price == price)
-
-    else:
-        if price__gt is not None:
-            _filter.append(Company.price > price__gt)
-        else:
-            if price__lt is not None:
-                _filter.append(Company.price < price__lt)
+        price_bound = ("eq", price)
+    elif price__gt is not None:
+        price_bound = ("gt", price__gt)
+    elif price__lt is not None:
+        price_bound = ("lt", price__lt)
 
     if available is not None and (
         available__gt is not None or available__lt is not None
     ):
-        _filter.append(Company.available_shares == available)
-
-    else:
-        if available__gt is not None:
-            _filter.append(Company.available_shares > available__gt)
-        else:
-            if available__lt is not None:
-                _filter.append(Company.available_shares < available__lt)
+        available_bound = ("eq", available)
+    elif available__gt is not None:
+        available_bound = ("gt", available__gt)
+    elif available__lt is not None:
+        available_bound = ("lt", available__lt)
 
     if price__sort is not None:
-        if price__sort.value == "desc":
-            order.append(col(Company.price).desc())
-        else:
-            order.append(col(Company.price).asc())
+        order.append(("price", price__sort.value == "desc"))
 
     if updated is not None:
-        if updated.value == "asc":
-            order.append(col(Company.updated_at).asc())
-        else:
-            order.append(col(Company.updated_at).desc())
+        order.append(("updated_at", updated.value == "desc"))
+
+    screen = Screen(
+        currency=currency,
+        price=price_bound,
+        available=available_bound,
+        order=order,
+        limit=limit,
+    )
+
+    # Prices show pending ticks, as on /company/{id}; filters and sorting use
+    # the committed ones, at most TICK_FLUSH_INTERVAL behind.
+    if name is None and settings.SCREENER_ENABLED and screen.covered():
+        rows = await screener.query(screen)
+        companies = [CompanyModelSchema(**row) for row in rows]
+    else:
+        _filter = screen.where()
+        if name is not None:
+            _filter.append(col(Company.name).contains(name))
+
+        statement = (
+            select(Company)
+            .where(and_(*_filter))
+            .order_by(*screen.order_by())
+            .limit(limit)
+        )
+        result = await db.execute(statement)
+        companies = [CompanyModelSchema.from_orm(c) for c in result.scalars().all()]
+    for company in companies:
+        latest = ticks.latest(company.symbol)
+        if latest is not None:
+            company.price = latest
+    return respond(companies, response=response)
+
+
+@router.get(
+    "/search",
+    response_model=List[CompanySearchSchema],
+    status_code=status.HTTP_200_OK,
+)
+async def search_companies(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+) -> List[CompanySearchSchema]:
+
+    if not search_index.ready:
+        await search_index.refresh()
+    return respond(
+        [
+            CompanySearchSchema(id=id_, name=name, symbol=symbol)
+            for id_, name, symbol in search_index.search(q, limit)
+        ]
+    )
+
+
+def split_keys(values: Optional[List[str]]) -> List[str]:
+    # repeated parameters, comma separated values, or both
+    return [
+        key.strip() for value in values or [] for key in value.split(",") if key.strip()
+    ]
+
+
+@router.get(
+    "/batch",
+    response_model=CompanyBatchSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"model": ErrorSchema},
+    },
+)
+async def get_companies_batch(
+    ids: Optional[List[str]] = Query(None),
+    symbols: Optional[List[str]] = Query(None),
+    currency: Currency = Query(None),
+    as_of: date = Query(None, description="convert at the rates of this day"),
+    db: AsyncSession = Depends(get_session),
+) -> CompanyBatchSchema:
+    # Companies come back in request order, ids first, each once; keys that
+    # match nothing are listed under "missing".
+    try:
+        wanted_ids = list(dict.fromkeys(int(key) for key in split_keys(ids)))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be integers",
+        )
+    wanted_symbols = list(dict.fromkeys(key.upper() for key in split_keys(symbols)))
+    if len(wanted_ids) + len(wanted_symbols) > BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="At most %d ids and symbols" % BATCH_LIMIT,
+        )
+
+    found = []
+    if wanted_ids or wanted_symbols:
+        # columns, not entities: Company eagerly loads its shareholders
+        result = await db.execute(
+            select(*Company.__table__.columns).where(
+                or_(
+                    col(Company.id).in_(wanted_ids),
+                    col(Company.symbol).in_(wanted_symbols),
+                )
+            )
+        )
+        found = result.all()
+    by_id = {company.id: company for company in found}
+    by_symbol = {company.symbol: company for company in found}
+
+    companies = []
+    seen = set()
+    for company in [by_id.get(key) for key in wanted_ids] + [
+        by_symbol.get(key) for key in wanted_symbols
+    ]:
+        if company is None or company.id in seen:
+            continue
+        seen.add(company.id)
+        company = CompanyModelSchema.from_orm(company)
+        latest = ticks.latest(company.symbol)
+        if latest is not None:
+            company.price = latest
+        companies.append(company)
+    if currency and companies:
+        try:
+            await convert_prices(db, companies, currency.value, as_of)
+        except LookupError as error:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=str(error)
+            )
+    return respond(
+        CompanyBatchSchema(
+            companies=companies,
+            missing=CompanyBatchMissingSchema(
+                ids=[key for key in wanted_ids if key not in by_id],
+                symbols=[key for key in wanted_symbols if key not in by_symbol],
+            ),
+        )
+    )
+
+
+@router.get(
+    "/changes",
+    response_model=CompanyChangesSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_410_GONE: {"model": ErrorSchema},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"model": ErrorSchema},
+    },
+)
+async def get_company_changes(
+    since: Optional[str] = Query(None, description="token of the previous call"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_session),
+) -> CompanyChangesSchema:
+    # Without a token, every company; then only what was created, updated or
+    # deleted since. Call again with the new token while "more" is true.
+    # Tokens from before the last tombstone pruning get 410.
+    try:
+        watermark = decode_token(since) if since is not None else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid change token",
+        )
+    try:
+        changed, deleted, watermark, more = await changes_since(db, watermark, limit)
+    except TokenExpired:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Change token expired, resync without since",
+        )
+    return respond(
+        CompanyChangesSchema(
+            changed=[CompanyModelSchema.from_orm(company) for company in changed],
+            deleted=deleted,
+            token=encode_token(watermark),
+            more=more,
+        )
+    )
 
-    statement = select(Company).where(and_(*_filter)).order_by(*order)
-    companies = await db.execute(statement)
-    result = companies.scalars().all()
-    return result
+
+@router.websocket("/ticks")
+async def ingest_ticks(websocket: WebSocket):
+    # Each message is a {symbol: price} map; ticks are acknowledged only by
+    # the counters on /company/ticks/stats.
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                prices = json.loads(message)
+            except ValueError:
+                prices = None
+            if not isinstance(prices, dict):
+                ticks.stats["rejected"] += 1
+                continue
+            for symbol, price in prices.items():
+                ticks.put(symbol, price)
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get(
+    "/ticks/stats",
+    response_model=TickStatsSchema,
+    status_code=status.HTTP_200_OK,
+)
+async def get_tick_stats() -> TickStatsSchema:
+    return respond(TickStatsSchema(**ticks.snapshot()))
 
 
 @router.get(
@@ -138,10 +431,33 @@ async def get_companies(
 )
 async def get_company_by_id(
     company_id: int,
+    request: Request,
+    response: Response,
     currency: Currency = Query(None),
+    as_of: date = Query(None, description="convert at the rates of this day"),
     db: AsyncSession = Depends(get_session),
 ) -> CompanyModelSchema:
 
+    version = screener.version_of(company_id)
+    if version is None:
+        result = await db.execute(
+            select(Company.updated_at, Company.symbol).where(Company.id == company_id)
+        )
+        version = result.one_or_none()
+    if version is not None:
+        updated_at, symbol = version
+        etag = company_etag(
+            company_id,
+            updated_at,
+            currency and currency.value,
+            currency
+            and (as_of, rate_history.version if as_of else current_rates.version),
+            ticks.latest(symbol),
+        )
+        if is_fresh(request, etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
+
     company = await db.get(Company, company_id)
     if company is None:
         raise HTTPException(
@@ -149,13 +465,84 @@ async def get_company_by_id(
         )
 
     company = CompanyModelSchema.from_orm(company)
+    latest = ticks.latest(company.symbol)
+    if latest is not None:
+        company.price = latest
     if currency:
-        result = await convert_currency(
-            from_=company.currency, to=currency.value, amount=company.price
-        )
+        try:
+            result = await convert_currency(
+                db,
+                as_of=as_of,
+                from_=company.currency,
+                to=currency.value,
+                amount=company.price,
+            )
+        except LookupError as error:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=str(error)
+            )
         company.currency = currency.value
         company.price = result
-    return company
+    return respond(company, response=response)
+
+
+@router.get(
+    "/{company_id}/stats",
+    response_model=CompanyStatsSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+    },
+)
+async def get_company_stats(
+    company_id: int, db: AsyncSession = Depends(get_session)
+) -> CompanyStatsSchema:
+
+    result = await db.execute(
+        select(CompanyStats, Company.currency)
+        .join(Company, Company.id == CompanyStats.company_id)
+        .where(CompanyStats.company_id == company_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
+        )
+    company_stats, currency = row
+    return respond(
+        CompanyStatsSchema(
+            **company_stats.dict(),
+            currency=currency,
+            base_currency=settings.BASE_CURRENCY,
+        )
+    )
+
+
+@router.get(
+    "/{company_id}/holders",
+    response_model=List[CompanyHolderSchema],
+    status_code=status.HTTP_200_OK,
+)
+async def get_company_holders(
+    company_id: int,
+    top: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_session),
+) -> List[CompanyHolderSchema]:
+
+    # walks ix_shareholder_company_id_quantity from the largest holding down
+    result = await db.execute(
+        select(ShareHolder.user_id, User.username, ShareHolder.quantity)
+        .join(User, User.id == ShareHolder.user_id)
+        .where(ShareHolder.company_id == company_id, ShareHolder.quantity > 0)
+        .order_by(col(ShareHolder.quantity).desc())
+        .limit(top)
+    )
+    return respond(
+        [
+            CompanyHolderSchema(user_id=user_id, username=username, quantity=quantity)
+            for user_id, username, quantity in result
+        ]
+    )
 
 
 @router.delete(
@@ -174,8 +561,11 @@ async def delete_company_by_id(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
         )
+    await tombstone(db, company_id)
     await db.delete(company)
+    await delete_company_stats(db, company_id)
     await db.commit()
+    company_events.deleted([company_id])
     return JSONResponse(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -210,19 +600,20 @@ async def update_company_by_id(
     )
 
     if company != company_db:
-        print("---" * 20)
-        print("UPDATE MADE ! " * 4)
-        print("---" * 20)
+        logger.info("company %d updated", company_db.id)
         company_db.name = company.name
         company_db.price = company.price
         company_db.available_shares = company.available_shares
         company_db.symbol = company.symbol
 
         db.add(company_db)
+        await db.flush()
+        await refresh_market_caps(db, [company_id])
         await db.commit()
         await db.refresh(company_db)
+        company_events.upserted([company_db])
 
-    return CompanyModelSchema.from_orm(company_db)
+    return respond(CompanyModelSchema.from_orm(company_db))
 
 
 @router.patch(
@@ -251,9 +642,12 @@ async def patch_update_company_by_id(
             setattr(company_db, key, data[key])
 
     db.add(company_db)
+    await db.flush()
+    await refresh_market_caps(db, [company_id])
     await db.commit()
     await db.refresh(company_db)
-    return CompanyModelSchema.from_orm(company_db)
+    company_events.upserted([company_db])
+    return respond(CompanyModelSchema.from_orm(company_db))
 
 
 @router.get(
@@ -261,22 +655,40 @@ async def patch_update_company_by_id(
     status_code=status.HTTP_200_OK,
     responses={
         status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorSchema},
     },
 )
 async def get_company_from_api(
     company_symbol: str,
+    response: Response,
 ):
 
     url = "https://www.alphavantage.co/query?function=OVERVIEW&symbol=%s&apikey=%s" % (
         company_symbol,
         "RV14VT854NVHV1U4",
     )
-    response: requests.Response = requests.get(url)
-    data = response.json()
-
-    if response.status_code != status.HTTP_200_OK:
+    key = company_symbol.upper()
+    try:
+        upstream: requests.Response = await run_in_threadpool(alpha_vantage.get, url)
+        data = upstream.json() if upstream.status_code < 500 else None
+    except (CircuitOpen, requests.RequestException, ValueError):
+        data = None
+    if data is None:
+        # Alpha Vantage is down or failing; answer with the last good quote
+        data = quotes.get(key)
+        if data is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Quote service unavailable",
+            )
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        return data
+
+    if upstream.status_code != status.HTTP_200_OK:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
         )
 
+    if data:
+        quotes.put(key, data)
     return data
@@ -0,0 +1,183 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.auth import get_current_active_user
+from app.core.config import settings
+from app.core.responses import respond
+from app.db.database import get_session
+from app.models import Job
+from app.schemas.base import ErrorSchema
+from app.schemas.jobs import JobCreateSchema, JobSchema
+from app.schemas.token import TokenData
+from app.services.imports import import_format
+from app.services.jobs import (
+    SUCCEEDED,
+    cancel_job,
+    create_job,
+    job_path,
+    new_job_id,
+    queued_jobs,
+)
+
+router = APIRouter()
+
+
+async def check_queue(
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> None:
+    # Jobs only run in the scheduler's worker processes.
+    if not settings.SCHEDULER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Jobs are disabled on this server",
+        )
+    if await queued_jobs(db, current_user.id) >= settings.JOB_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many unfinished jobs",
+        )
+
+
+async def get_job(
+    job_id: str,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> Job:
+    job = await db.get(Job, job_id)
+    # other users' jobs are reported as missing rather than forbidden
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return job
+
+
+@router.post(
+    "",
+    response_model=JobSchema,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"model": ErrorSchema},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorSchema},
+    },
+    dependencies=[Depends(check_queue)],
+)
+async def create(
+    body: JobCreateSchema,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> JobSchema:
+    params = {}
+    if body.currency is not None:
+        params["currency"] = body.currency.value
+    job = await create_job(db, current_user.id, body.kind, params)
+    return respond(JobSchema.from_orm(job), status.HTTP_202_ACCEPTED)
+
+
+@router.post(
+    "/import_companies",
+    response_model=JobSchema,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: {"model": ErrorSchema},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"model": ErrorSchema},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorSchema},
+    },
+    dependencies=[Depends(check_queue)],
+)
+async def create_import(
+    request: Request,
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> JobSchema:
+    # POST /company/bulk in the background: the body is saved and imported
+    # by a worker; rejected lines are the job's CSV result.
+    format_ = import_format(request.headers.get("content-type"))
+    if format_ is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson",
+        )
+    job_id = new_job_id()
+    path = job_path(job_id, ".upload")
+    await run_in_threadpool(os.makedirs, settings.JOB_RESULTS_DIR, exist_ok=True)
+    # file I/O in the threadpool, so a large upload does not stall the loop
+    upload = await run_in_threadpool(open, path, "wb")
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(upload.write, chunk)
+    except BaseException:
+        upload.close()
+        os.remove(path)
+        raise
+    await run_in_threadpool(upload.close)
+    job = await create_job(
+        db, current_user.id, "import_companies", {"format": format_}, job_id
+    )
+    return respond(JobSchema.from_orm(job), status.HTTP_202_ACCEPTED)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+    },
+)
+async def detail(job: Job = Depends(get_job)) -> JobSchema:
+    return respond(JobSchema.from_orm(job))
+
+
+@router.get(
+    "/{job_id}/result",
+    response_class=FileResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+        status.HTTP_409_CONFLICT: {"model": ErrorSchema},
+    },
+)
+async def result(job: Job = Depends(get_job)):
+    if job.status != SUCCEEDED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Job is %s" % job.status
+        )
+    path = job_path(job.id, ".csv")
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job result expired"
+        )
+    return FileResponse(
+        path, media_type="text/csv", filename="%s-%s.csv" % (job.kind, job.id)
+    )
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=JobSchema,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+        status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
+        status.HTTP_409_CONFLICT: {"model": ErrorSchema},
+    },
+)
+async def cancel(
+    job: Job = Depends(get_job), db: AsyncSession = Depends(get_session)
+) -> JobSchema:
+    if not await cancel_job(db, job):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Job is %s" % job.status
+        )
+    await db.refresh(job)
+    return respond(JobSchema.from_orm(job))
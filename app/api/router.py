@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
+from app.api.alerts import alerts
 from app.api.authentication import authentication
 from app.api.company import company
+from app.api.jobs import jobs
 from app.api.shares import shares
 
 api_router = APIRouter()
@@ -9,4 +11,6 @@ api_router = APIRouter()
 api_router.include_router(authentication.router, prefix="/account", tags=["auth"])
 api_router.include_router(company.router, prefix="/company", tags=["company"])
 api_router.include_router(shares.router, prefix="/shares", tags=["shares"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
 # print(api_router.routes[0].__dict__)
@@ -1,15 +1,15 @@
 from enum import Enum
 from functools import reduce
 
-from sqlalchemy import create_engine
 from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
 
+from app.db.database import sync_engine
 from app.models import Rate
 
 
 def get_currencies():
-    session = sessionmaker(create_engine("sqlite:///./database.db"))
+    session = sessionmaker(sync_engine)
     with session() as session:
         stmt = select(Rate.currency)
         result = session.execute(stmt)
@@ -1,21 +1,90 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlmodel import col
 
 from app.core.auth import get_current_active_user
+from app.core.responses import respond
+from app.core.tracing import span
 from app.db.database import get_session
-from app.models import Company, ShareHolder, User
+from app.models import Company, PortfolioSnapshot, ShareHolder, User
 from app.schemas.base import ErrorSchema
+from app.schemas.shares import PortfolioSnapshotSchema, ReservationSchema
+from app.schemas.token import TokenData
 from app.schemas.user import UserModelSchema
+from app.services.events import company_events
+from app.services.inventory import NotEnoughShares, UnknownCompany, inventory
+from app.services.stats import record_trade
 
 router = APIRouter()
 
 
+async def reserve(side: str, user_id: int, company_id: int, quantity: int):
+    # hot symbols: answered once journaled, written to the database in batches
+    try:
+        if side == "buy":
+            reservation = await inventory.buy(user_id, company_id, quantity)
+        else:
+            reservation = await inventory.sell(user_id, company_id, quantity)
+    except UnknownCompany:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Company not found"
+        )
+    except NotEnoughShares:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Not enough company shares"
+            if side == "buy"
+            else "Not enough shares",
+        )
+    content = ReservationSchema(
+        id=reservation.id,
+        company_id=company_id,
+        side=side,
+        quantity=quantity,
+        reserved_at=reservation.reserved_at,
+    )
+    return JSONResponse(jsonable_encoder(content), status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get(
+    "/portfolio/history",
+    response_model=List[PortfolioSnapshotSchema],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
+    },
+)
+async def portfolio_history(
+    since: Optional[datetime] = Query(None),
+    limit: int = Query(30, ge=1, le=1000),
+    current_user: TokenData = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_session),
+) -> List[PortfolioSnapshotSchema]:
+    # newest first, straight off the (user_id, taken_at) index
+    statement = select(PortfolioSnapshot).where(
+        PortfolioSnapshot.user_id == current_user.id
+    )
+    if since is not None:
+        statement = statement.where(PortfolioSnapshot.taken_at >= since)
+    statement = statement.order_by(col(PortfolioSnapshot.taken_at).desc()).limit(limit)
+    result = await db.execute(statement)
+    return respond(
+        [PortfolioSnapshotSchema.from_orm(row) for row in result.scalars().all()]
+    )
+
+
 @router.post(
     "/buy/{company_id}",
     response_model=UserModelSchema,
     status_code=status.HTTP_200_OK,
     responses={
+        status.HTTP_202_ACCEPTED: {"model": ReservationSchema},
         status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
         status.HTTP_406_NOT_ACCEPTABLE: {"model": ErrorSchema},
         status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
@@ -24,9 +93,12 @@ router = APIRouter()
 async def buy(
     company_id: int,
     quantity: int = Body(..., embed=True),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_session),
 ) -> UserModelSchema:
+    if inventory.manages(company_id):
+        return await reserve("buy", current_user.id, company_id, quantity)
+
     company = await db.get(Company, company_id)
 
     if company is None:
@@ -49,17 +121,26 @@ async def buy(
 
     company.available_shares -= quantity
     if result:
+        new_holder = result.quantity <= 0
         result.quantity += quantity
         db.add(result)
     else:
+        new_holder = True
         share_holder = ShareHolder(
             quantity=quantity, user_id=current_user.id, company_id=company.id
         )
         db.add(share_holder)
 
+    await record_trade(db, company.id, quantity, int(new_holder))
     await db.commit()
-    current_user = await db.get(User, current_user.id)
-    return UserModelSchema.from_orm(current_user)
+    await db.refresh(company, ["updated_at"])
+    company_events.upserted([company])
+    # tokens from before the user claims were added still load the user
+    # into this session; reload it so the response shows the new holding
+    with span("shares.user_response"):
+        current_user = await db.get(User, current_user.id, populate_existing=True)
+        user = UserModelSchema.from_orm(current_user)
+    return respond(user)
 
 
 @router.post(
@@ -67,6 +148,7 @@ async def buy(
     response_model=UserModelSchema,
     status_code=status.HTTP_200_OK,
     responses={
+        status.HTTP_202_ACCEPTED: {"model": ReservationSchema},
         status.HTTP_401_UNAUTHORIZED: {"model": ErrorSchema},
         status.HTTP_406_NOT_ACCEPTABLE: {"model": ErrorSchema},
         status.HTTP_404_NOT_FOUND: {"model": ErrorSchema},
@@ -75,9 +157,12 @@ async def buy(
 async def sell(
     company_id: int,
     quantity: int = Body(..., embed=True),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_session),
 ) -> UserModelSchema:
+    if inventory.manages(company_id):
+        return await reserve("sell", current_user.id, company_id, quantity)
+
     company = await db.get(Company, company_id)
 
     if company is None:
@@ -102,6 +187,11 @@ async def sell(
     company.available_shares += quantity
     db.add(result)
     db.add(company)
+    await record_trade(db, company.id, -quantity, -int(result.quantity <= 0))
     await db.commit()
-    current_user = await db.get(User, current_user.id)
-    return UserModelSchema.from_orm(current_user)
+    await db.refresh(company, ["updated_at"])
+    company_events.upserted([company])
+    with span("shares.user_response"):
+        current_user = await db.get(User, current_user.id, populate_existing=True)
+        user = UserModelSchema.from_orm(current_user)
+    return respond(user)
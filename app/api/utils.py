@@ -1,47 +1,96 @@
-from typing import Any, Dict, List
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
 
 import requests
-from sqlalchemy import and_, create_engine, or_, text
+from sqlalchemy import and_, or_, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
-from app.db.database import engine
-from app.models import Rate
+from app.db.database import sync_engine
+from app.models import Rate, RateHistory
+from app.services.events import company_events
+from app.services.prices import reprice
+from app.services.rates import current_rates, rate_history
+from app.services.stats import market_caps
+from app.services.upstream import CircuitOpen, fx_api
 
+logger = logging.getLogger(__name__)
 
-async def convert_currency(**kwargs: Dict[str, Any]) -> float:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
-        query = """
-            WITH a AS (
-                SELECT rate AS to_rate
-                FROM rate
-                WHERE currency='%s'
-            ),
-            b AS (
-                SELECT ((a.to_rate / rate.rate) * %f) AS converted_amount
-                FROM a, rate
-                WHERE rate.currency='%s'
-            )
-            SELECT * FROM b;
-        """ % (
-            kwargs["to"],
-            kwargs["amount"],
-            kwargs["from_"],
+
+async def convert_currency(
+    db: AsyncSession, as_of: Optional[date] = None, **kwargs: Dict[str, Any]
+) -> float:
+    if as_of is not None:
+        # raises LookupError when either currency has no rate by then
+        return await rate_history.convert(
+            kwargs["from_"], kwargs["to"], kwargs["amount"], as_of
+        )
+    query = """
+        WITH a AS (
+            SELECT rate AS to_rate
+            FROM rate
+            WHERE currency='%s'
+        ),
+        b AS (
+            SELECT ((a.to_rate / rate.rate) * %f) AS converted_amount
+            FROM a, rate
+            WHERE rate.currency='%s'
         )
-        result = await session.execute(text(query))
+        SELECT * FROM b;
+    """ % (
+        kwargs["to"],
+        kwargs["amount"],
+        kwargs["from_"],
+    )
+    result = await db.execute(text(query))
     return round(result.scalar_one(), 2)
 
 
+async def convert_prices(
+    db: AsyncSession, companies: list, to: str, as_of: Optional[date] = None
+) -> None:
+    """Converts the ``price`` of each company schema to ``to``, in place.
+
+    Same arithmetic as ``convert_currency``, with every rate involved read in
+    one query; raises LookupError when a currency has no rate.
+    """
+    if as_of is not None:
+        for company in companies:
+            company.price = await rate_history.convert(
+                company.currency, to, company.price, as_of
+            )
+            company.currency = to
+        return
+    wanted = {company.currency for company in companies} | {to}
+    result = await db.execute(
+        select(Rate.currency, Rate.rate).where(Rate.currency.in_(wanted))
+    )
+    rates = dict(result.all())
+    if to not in rates:
+        raise LookupError("No exchange rate for %s" % to)
+    for company in companies:
+        if not rates.get(company.currency):
+            raise LookupError("No exchange rate for %s" % company.currency)
+        company.price = round(rates[to] / rates[company.currency] * company.price, 2)
+        company.currency = to
+
+
 def load_curreny():
     url = "%slatest?access_key=%s&format=1" % (settings.FX_API_URL, settings.FX_API_KEY)
-    response: requests.Response = requests.get(url)
+    try:
+        response: requests.Response = fx_api.get(url)
+    except (CircuitOpen, requests.RequestException) as error:
+        # the rates already in the table stay in use until the next run
+        logger.warning("fetching rates failed: %s", type(error).__name__)
+        return
     if response.status_code == 200:
         data = response.json()
-        session = sessionmaker(create_engine("sqlite:///./database.db"))
-        print("about processing")
+        session = sessionmaker(sync_engine)
+        logger.info("processing rates of %s", data["date"])
+        observed_at = datetime.now(timezone.utc)
         with session() as session:
             _filter = list(
                 map(
@@ -56,25 +105,58 @@ def load_curreny():
             stmt = select(Rate).filter(or_(*_filter))
             result = session.execute(stmt)
             rates: List[Rate] = result.scalars().all()
-            print(len(rates))
+            logger.info("%d rates changed", len(rates))
+            repriced = []
             if rates:
                 for rate in rates:
+                    if rate.rate:
+                        repriced.append(
+                            {
+                                "rate_currency": rate.currency,
+                                "old_rate": rate.rate,
+                                "new_rate": data["rates"][rate.currency],
+                            }
+                        )
                     rate.base = data["base"]
                     rate.date = data["date"]
                     rate.rate = data["rates"][rate.currency]
                     session.add(rate)
+                    session.add(
+                        RateHistory(
+                            base=rate.base,
+                            currency=rate.currency,
+                            rate=rate.rate,
+                            observed_at=observed_at,
+                        )
+                    )
             else:
                 if session.execute(text("SELECT * FROM rate;")).first() is None:
-                    print("rewriting")
+                    logger.info("rate table is empty, loading every rate")
                     for rate, fx in data["rates"].items():
                         rate = Rate(
                             base=data["base"], date=data["date"], currency=rate, rate=fx
                         )
                         session.add(rate)
+                        session.add(
+                            RateHistory(
+                                base=data["base"],
+                                currency=rate.currency,
+                                rate=fx,
+                                observed_at=observed_at,
+                            )
+                        )
 
             if session.dirty or session.new:
-                print("updated")
+                logger.info("rates updated")
+                session.flush()
+                if repriced:
+                    session.execute(reprice, repriced)
+                session.execute(market_caps())
                 session.commit()
+                # companies were repriced with Core, behind the ORM's back
+                company_events.invalidated(prices_only=True)
+                rate_history.invalidate()
+                current_rates.bump()
 
 
 # load_curreny()
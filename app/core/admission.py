@@ -0,0 +1,152 @@
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.auth import token_subject
+from app.core.tracing import span
+from app.db.database import pool_stats
+
+# (method, path prefix, route class, token cost), first match wins
+ROUTES = (
+    ("POST", "/shares/", "trade", 5.0),
+    ("POST", "/account/login", "write", 5.0),
+    ("POST", "/company/bulk", "write", 20.0),
+    ("POST", "/company/prices", "write", 10.0),
+    ("POST", "/jobs", "write", 10.0),
+)
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# classes that queue on the SQLite writer and are shed when checkouts slow down
+DB_BOUND = ("trade", "write")
+
+
+def classify(method: str, path: str) -> Tuple[str, float]:
+    for route_method, prefix, route_class, cost in ROUTES:
+        if method == route_method and path.startswith(prefix):
+            return route_class, cost
+    if method in READ_METHODS:
+        return "read", 1.0
+    return "write", 2.0
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+    def take(self, cost: float, rate: float, burst: float, now: float) -> float:
+        # Returns 0 when admitted, otherwise the seconds until ``cost`` is available.
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class AdmissionMiddleware:
+    """Rate limits clients and caps concurrent requests per route class.
+
+    Clients are keyed by their JWT subject, or by IP when the request carries
+    no valid bearer token. Over-budget clients get 429; requests beyond a
+    class's concurrency limit, or DB-bound requests while connection
+    checkouts are slow, get 503 before they reach the database.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate: float,
+        burst: float,
+        concurrency: Dict[str, int],
+        shed_wait: float,
+        max_clients: int = 10000,
+    ) -> None:
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.shed_wait = shed_wait
+        self.max_clients = max_clients
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.in_flight = dict.fromkeys(concurrency, 0)
+
+    @staticmethod
+    def client_key(scope: Scope) -> str:
+        authorization = Headers(scope=scope).get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            subject = token_subject(token)
+            if subject is not None:
+                return "user:%s" % subject
+        client = scope.get("client")
+        return "ip:%s" % (client[0] if client else "unknown")
+
+    def _bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_clients:
+                self._prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        # buckets that would have refilled completely carry no state
+        idle = self.burst / self.rate
+        self.buckets = {
+            key: bucket
+            for key, bucket in self.buckets.items()
+            if now - bucket.updated < idle
+        }
+
+    def _reject(self, status_code: int, detail: str, retry_after: float):
+        return JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def admit(self, scope: Scope, route_class: str, cost: float):
+        limit: Optional[int] = self.concurrency.get(route_class)
+        if limit is not None and self.in_flight[route_class] >= limit:
+            return self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, retry shortly", 1
+            )
+        if route_class in DB_BOUND and pool_stats.recent_wait() > self.shed_wait:
+            return self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, retry shortly", 1
+            )
+        now = time.monotonic()
+        wait = self._bucket(self.client_key(scope), now).take(
+            min(cost, self.burst), self.rate, self.burst, now
+        )
+        if wait:
+            return self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", wait
+            )
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class, cost = classify(scope["method"], scope["path"])
+        with span("admission", route_class=route_class):
+            rejection = self.admit(scope, route_class, cost)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+        tracked = route_class in self.in_flight
+        if tracked:
+            self.in_flight[route_class] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tracked:
+                self.in_flight[route_class] -= 1
@@ -1,5 +1,7 @@
+import asyncio
+import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -8,13 +10,15 @@ from passlib.context import CryptContext
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker
+from sqlmodel import or_
 
 from app.core.config import settings
-from app.db.database import engine
+from app.core.tracing import span, traced
+from app.db.database import async_session, get_session
 from app.models import User
 from app.schemas.token import TokenData
-from app.schemas.user import UserModelSchema
+
+logger = logging.getLogger(__name__)
 
 # to get a string like this run:
 
@@ -31,25 +35,22 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-async def get_user(username: str):
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async with async_session() as session:
-        try:
-            statement = select(User).where(User.username == username)
-            result = await session.execute(statement)
-            user = result.one()
-        except NoResultFound:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Username or password is incorrect.",
-            )
+async def get_user(db: AsyncSession, username: str):
+    try:
+        statement = select(User).where(User.username == username)
+        result = await db.execute(statement)
+        user = result.one()
+    except NoResultFound:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Username or password is incorrect.",
+        )
 
-    return UserModelSchema.from_orm(user[0])
+    return user[0]
 
 
-async def authenticate_user(username: str, password: str):
-    user = await get_user(username)
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
 
     if not user:
         return False
@@ -71,33 +72,130 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    print("here" * 20)
+def create_user_token(user: User) -> str:
+    # Everything get_current_user needs rides in the token, so authenticated
+    # requests do not have to look the user up.
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "dis": bool(user.disabled),
+            "ver": user.token_version,
+        },
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+
+class TokenRevocations:
+    """Token versions and disabled flags for the users that need checking.
+
+    Only users who bumped ``token_version`` or were disabled are held, so the
+    set stays small. It is re-read every ``interval`` seconds; revocations
+    made by this process apply immediately.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.versions: Dict[int, int] = {}
+        self.disabled: Set[int] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def accepts(self, token: TokenData) -> bool:
+        if token.id in self.disabled:
+            return False
+        return token.version >= self.versions.get(token.id, 0)
 
+    def revoke(self, user_id: int, version: int) -> None:
+        self.versions[user_id] = max(version, self.versions.get(user_id, 0))
+
+    async def refresh(self) -> None:
+        async with async_session() as session:
+            result = await session.execute(
+                select(User.id, User.token_version, User.disabled).where(
+                    or_(User.token_version > 0, User.disabled)
+                )
+            )
+            rows = result.all()
+        # versions only grow; keep local revocations the read may predate
+        self.versions = {
+            id_: max(version, self.versions.get(id_, 0))
+            for id_, version, _ in rows
+            if version
+        }
+        self.disabled = {id_ for id_, _, disabled in rows if disabled}
+
+    async def start(self) -> None:
+        await self.refresh()
+        self.task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("token revocation refresh failed")
+
+
+revocations = TokenRevocations(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+
+
+def token_subject(token: str) -> Optional[str]:
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+@traced("dependency.get_current_user")
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_session)
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    print("here" * 20)
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        with span("auth.decode_token"):
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = await get_user(username=token_data.username)
-    if user is None:
+    if payload.get("uid") is None:
+        # tokens issued before the claims were added only name the user
+        with span("auth.get_user"):
+            user = await get_user(db, username=username)
+        token_data = TokenData(id=user.id, username=username, disabled=user.disabled)
+    else:
+        token_data = TokenData(
+            id=payload["uid"],
+            username=username,
+            disabled=payload.get("dis", False),
+            version=payload.get("ver", 0),
+        )
+    if not revocations.accepts(token_data):
         raise credentials_exception
-    return user
+    return token_data
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
-    print("here" * 20)
+@traced("dependency.get_current_active_user")
+async def get_current_active_user(
+    current_user: TokenData = Depends(get_current_user),
+):
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -0,0 +1,143 @@
+import base64
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.auth import token_subject
+from app.core.routing import route_template
+
+# credentials travel in these bodies; they are captured without them
+REDACTED = ("/account/login", "/account/auth/register")
+
+
+class CaptureLog:
+    """Rotating JSON lines file, written from a listener thread.
+
+    Requests only put their line on a queue. It is started and stopped with
+    the app rather than by the middleware, since Starlette rebuilds the
+    middleware stack every time one is added.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("app.capture")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.listener: Optional[QueueListener] = None
+        self.handler: Optional[logging.Handler] = None
+
+    @property
+    def running(self) -> bool:
+        return self.listener is not None
+
+    def start(self, path: str, max_bytes: int, backups: int) -> None:
+        if self.running:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records: queue.Queue = queue.Queue(-1)
+        self.handler = QueueHandler(records)
+        self.logger.addHandler(self.handler)
+        self.listener = QueueListener(records, handler)
+        self.listener.start()
+
+    def write(self, line: str) -> None:
+        self.logger.info(line)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.logger.removeHandler(self.handler)
+        # flushes what is still queued
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = self.handler = None
+
+
+class CaptureMiddleware:
+    """Records a sample of requests as JSON lines for ``benchmarks.replay``.
+
+    Each line has the route template, query string, body, the JWT subject (never
+    the token), status and duration.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float, max_body: int) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+
+    @staticmethod
+    def subject_of(headers: Headers) -> Optional[str]:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            return token_subject(token)
+        return None
+
+    def encode_body(self, path: str, body: bytes) -> dict:
+        if path in REDACTED:
+            return {"body": None, "redacted": True}
+        if len(body) > self.max_body:
+            return {"body": None, "truncated": len(body)}
+        try:
+            return {"body": body.decode()}
+        except UnicodeDecodeError:
+            return {"body": base64.b64encode(body).decode(), "base64": True}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not capture.running
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        status = 500
+
+        async def receive_body() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        headers = Headers(scope=scope)
+        at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_body, send_status)
+        finally:
+            duration = time.perf_counter() - started
+            record = {
+                "at": round(at, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "query": scope["query_string"].decode("latin-1"),
+                "content_type": headers.get("content-type"),
+                "subject": self.subject_of(headers),
+                "status": status,
+                "duration_ms": round(duration * 1000, 3),
+                **self.encode_body(scope["path"], b"".join(chunks)),
+            }
+            capture.write(json.dumps(record))
+
+
+capture = CaptureLog()
@@ -0,0 +1,98 @@
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if (
+            message.get("more_body", False)
+            or len(body) < self.middleware.minimum_size
+            or "content-encoding" in headers
+        ):
+            # Streamed, small or already encoded bodies are sent as they are.
+            self.passthrough = True
+            await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        body = self.middleware.compress(self.encoding, body)
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(body))
+        if "accept-encoding" not in headers.get("vary", "").lower():
+            headers.add_vary_header("Accept-Encoding")
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": body})
@@ -1,5 +1,5 @@
 import os
-from typing import List, Union
+from typing import Dict, List, Union
 
 from pydantic import AnyHttpUrl, BaseSettings, Field, validator
 
@@ -12,6 +12,10 @@ class Settings(BaseSettings):
     # 60 minutes * 24 hours * 8 days = 8 days
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # how often revoked token versions and disabled users are re-read
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = Field(
+        30.0, env="TOKEN_REVOCATION_REFRESH_SECONDS"
+    )
     # SERVER_NAME: str
     # SERVER_HOST: AnyHttpUrl
     PROJECT_NAME: str = Field(os.getenv("PROJECT_NAME"), env="PROJECT_NAME")
@@ -22,6 +26,94 @@ class Settings(BaseSettings):
         os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database.db"),
         env="DATABASE_URL",
     )
+    SCHEDULER_ENABLED: bool = Field(True, env="SCHEDULER_ENABLED")
+    # orjson-backed responses that skip re-validating already validated models
+    FAST_JSON: bool = Field(False, env="FAST_JSON")
+    # gzip/brotli for responses at least this many bytes long; 0 disables it
+    COMPRESSION_MINIMUM_SIZE: int = Field(1024, env="COMPRESSION_MINIMUM_SIZE")
+    # serve GET /company filters from the in-memory columnar snapshot
+    SCREENER_ENABLED: bool = Field(True, env="SCREENER_ENABLED")
+    # sent with company ETags; "no-cache" makes clients revalidate every time
+    COMPANY_CACHE_CONTROL: str = Field("no-cache", env="COMPANY_CACHE_CONTROL")
+    # rows per duplicate lookup, insert and commit in POST /company/bulk
+    BULK_IMPORT_CHUNK_SIZE: int = Field(1000, env="BULK_IMPORT_CHUNK_SIZE")
+    # seconds between batched writes of ticks from the /company/ticks socket
+    TICK_FLUSH_INTERVAL: float = Field(1.0, env="TICK_FLUSH_INTERVAL")
+    # ticks buffered ahead of the coalescer before new ones are dropped
+    TICK_QUEUE_SIZE: int = Field(100_000, env="TICK_QUEUE_SIZE")
+    # per-client token buckets: tokens refilled per second and bucket size
+    RATE_LIMIT_ENABLED: bool = Field(True, env="RATE_LIMIT_ENABLED")
+    RATE_LIMIT_RATE: float = Field(20.0, env="RATE_LIMIT_RATE")
+    RATE_LIMIT_BURST: float = Field(60.0, env="RATE_LIMIT_BURST")
+    # requests in flight per route class before new ones get 503
+    TRADE_CONCURRENCY: int = Field(8, env="TRADE_CONCURRENCY")
+    WRITE_CONCURRENCY: int = Field(8, env="WRITE_CONCURRENCY")
+    READ_CONCURRENCY: int = Field(128, env="READ_CONCURRENCY")
+    # shed trades and writes while connection checkouts average this long
+    SHED_DB_WAIT_MS: float = Field(250.0, env="SHED_DB_WAIT_MS")
+    # currency portfolio snapshots and company market caps are reported in
+    BASE_CURRENCY: str = Field("USD", env="BASE_CURRENCY")
+    # request the hot read paths after startup, before GET /ready turns 200;
+    # WARMUP_COMPANIES of the most held companies are loaded
+    WARMUP_ENABLED: bool = Field(True, env="WARMUP_ENABLED")
+    WARMUP_COMPANIES: int = Field(50, env="WARMUP_COMPANIES")
+    # triggered alerts kept per user until GET /alerts/deliveries drains them,
+    # and active alerts a user may have
+    ALERT_QUEUE_SIZE: int = Field(100, env="ALERT_QUEUE_SIZE")
+    ALERTS_PER_USER: int = Field(100, env="ALERTS_PER_USER")
+    # days of rate history kept at full resolution before daily compaction
+    RATE_HISTORY_RAW_DAYS: int = Field(7, env="RATE_HISTORY_RAW_DAYS")
+    # days tombstones of deleted companies are kept for GET /company/changes;
+    # older change tokens get 410 and must start over
+    CHANGE_TOMBSTONE_DAYS: int = Field(30, env="CHANGE_TOMBSTONE_DAYS")
+    # seconds a request may take (0 disables deadlines) and an outbound API
+    # call may take within it
+    REQUEST_TIMEOUT: float = Field(10.0, env="REQUEST_TIMEOUT")
+    UPSTREAM_TIMEOUT: float = Field(5.0, env="UPSTREAM_TIMEOUT")
+    # consecutive upstream failures that open a circuit breaker, seconds it
+    # stays open, and quotes kept to answer from while it is
+    BREAKER_FAILURES: int = Field(5, env="BREAKER_FAILURES")
+    BREAKER_RESET_SECONDS: float = Field(30.0, env="BREAKER_RESET_SECONDS")
+    QUOTE_CACHE_SIZE: int = Field(1000, env="QUOTE_CACHE_SIZE")
+    # symbols whose buys and sells are reserved in memory and written in
+    # batches every INVENTORY_FLUSH_INTERVAL seconds, e.g. '["BTC"]';
+    # reservations are journaled to INVENTORY_JOURNAL before they are answered
+    HOT_SYMBOLS: List[str] = Field([], env="HOT_SYMBOLS")
+    INVENTORY_FLUSH_INTERVAL: float = Field(0.25, env="INVENTORY_FLUSH_INTERVAL")
+    INVENTORY_JOURNAL: str = Field("./inventory.journal", env="INVENTORY_JOURNAL")
+    # JSON logs on stderr, written off the event loop. LOG_LEVELS and
+    # LOG_SAMPLING are JSON objects keyed by logger name, e.g.
+    # '{"apscheduler": "WARNING"}' and '{"app.api": 0.1}'; sampling keeps that
+    # share of a logger's records below WARNING. DB_ECHO logs every statement.
+    LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
+    LOG_LEVELS: Dict[str, str] = Field({}, env="LOG_LEVELS")
+    LOG_SAMPLING: Dict[str, float] = Field({}, env="LOG_SAMPLING")
+    LOG_QUEUE_SIZE: int = Field(10000, env="LOG_QUEUE_SIZE")
+    DB_ECHO: bool = Field(False, env="DB_ECHO")
+    # trace TRACE_SAMPLE_RATE of requests (and those a sampled traceparent
+    # header asks for), exporting spans to TRACE_PATH ("file") or to an OTLP
+    # collector's TRACE_OTLP_ENDPOINT ("otlp")
+    TRACE_ENABLED: bool = Field(False, env="TRACE_ENABLED")
+    TRACE_SAMPLE_RATE: float = Field(0.01, env="TRACE_SAMPLE_RATE")
+    TRACE_EXPORTER: str = Field("file", env="TRACE_EXPORTER")
+    TRACE_PATH: str = Field("./traces/spans.jsonl", env="TRACE_PATH")
+    TRACE_OTLP_ENDPOINT: str = Field(
+        "http://localhost:4318/v1/traces", env="TRACE_OTLP_ENDPOINT"
+    )
+    # record CAPTURE_SAMPLE_RATE of requests to CAPTURE_PATH for
+    # benchmarks.replay, rotating it every CAPTURE_MAX_BYTES; bodies over
+    # CAPTURE_MAX_BODY bytes are left out
+    CAPTURE_ENABLED: bool = Field(False, env="CAPTURE_ENABLED")
+    CAPTURE_PATH: str = Field("./captures/requests.jsonl", env="CAPTURE_PATH")
+    CAPTURE_SAMPLE_RATE: float = Field(0.01, env="CAPTURE_SAMPLE_RATE")
+    CAPTURE_MAX_BYTES: int = Field(50 * 1024 * 1024, env="CAPTURE_MAX_BYTES")
+    CAPTURE_BACKUPS: int = Field(5, env="CAPTURE_BACKUPS")
+    CAPTURE_MAX_BODY: int = Field(64 * 1024, env="CAPTURE_MAX_BODY")
+    # worker processes for /jobs, unfinished jobs allowed per user, and where
+    # their output files are written
+    JOB_CONCURRENCY: int = Field(2, env="JOB_CONCURRENCY")
+    JOB_MAX_PENDING: int = Field(5, env="JOB_MAX_PENDING")
+    JOB_RESULTS_DIR: str = Field("./job_results", env="JOB_RESULTS_DIR")
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
     # e.g: '["http://localhost", "http://localhost:4200", "http://localhost:3000", \
     # "http://localhost:8080", "http://local.dockertoolbox.tiangolo.com"]'
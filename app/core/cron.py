@@ -1,12 +1,47 @@
 from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from pytz import utc
 
 from app.api.utils import load_curreny
+from app.core.config import settings
+from app.core.logs import restart_logging
+from app.core.tracing import exporter
+from app.services.changes import prune_tombstones
+from app.services.events import WorkerEvents, worker_events
+from app.services.portfolio import snapshot_portfolios
+from app.services.rates import compact_rate_history
 
-jobstores = {"default": SQLAlchemyJobStore(url="sqlite:///jobs.sqlite")}
-executors = {"default": ThreadPoolExecutor(20), "processpool": ProcessPoolExecutor(5)}
+
+def init_worker(events) -> None:
+    # First thing in each processpool worker. It is forked from a process
+    # whose log writer and span exporter threads do not come along, and
+    # ``events`` carries its company writes back to that process.
+    restart_logging()
+    exporter.after_fork()
+    if settings.TRACE_ENABLED:
+        exporter.start(
+            settings.TRACE_EXPORTER,
+            settings.TRACE_PATH,
+            settings.TRACE_OTLP_ENDPOINT,
+            settings.PROJECT_NAME,
+        )
+    WorkerEvents.forward(events)
+
+
+# "jobs" holds /jobs submissions, whose state is kept in the job table instead
+jobstores = {
+    "default": SQLAlchemyJobStore(url="sqlite:///jobs.sqlite"),
+    "jobs": MemoryJobStore(),
+}
+executors = {
+    "default": ThreadPoolExecutor(20),
+    "processpool": ProcessPoolExecutor(
+        settings.JOB_CONCURRENCY,
+        pool_kwargs={"initializer": init_worker, "initargs": (worker_events.queue,)},
+    ),
+}
 job_defaults = {"coalesce": True, "max_instances": 3}
 
 scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, timezone=utc)
@@ -19,3 +54,33 @@ scheduler.add_job(
     max_instances=1,
     misfire_grace_time=900,
 )
+scheduler.add_job(
+    snapshot_portfolios,
+    "cron",
+    hour=0,
+    minute=5,
+    id="snapshot_portfolios",
+    replace_existing=True,
+    max_instances=1,
+    misfire_grace_time=3600,
+)
+scheduler.add_job(
+    compact_rate_history,
+    "cron",
+    hour=0,
+    minute=15,
+    id="compact_rate_history",
+    replace_existing=True,
+    max_instances=1,
+    misfire_grace_time=3600,
+)
+scheduler.add_job(
+    prune_tombstones,
+    "cron",
+    hour=0,
+    minute=25,
+    id="prune_tombstones",
+    replace_existing=True,
+    max_instances=1,
+    misfire_grace_time=3600,
+)
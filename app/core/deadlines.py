@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.routing import route_label
+
+# (method, path prefix, seconds, seconds per MiB of body), first match wins;
+# others get the default
+ROUTES = (
+    ("POST", "/company/bulk", 120.0, 4.0),
+    ("POST", "/jobs/import_companies", 120.0, 4.0),
+    ("GET", "/jobs/", 60.0, 0.0),
+)
+HEADER = "x-request-timeout"
+MIB = 1024 * 1024
+
+# time.monotonic() by which the current request must be answered
+deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+# set once the current request starts committing; it is not cancelled after
+committing: ContextVar[Optional[asyncio.Event]] = ContextVar("committing", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None outside of one."""
+    at = deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def timeout(upper: Optional[float] = None) -> Optional[float]:
+    """What is left of the deadline, at most ``upper``; raises once it passed."""
+    left = remaining()
+    if left is None:
+        return upper
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left if upper is None else min(left, upper)
+
+
+async def within_deadline(coroutine):
+    try:
+        seconds = timeout()
+    except DeadlineExceeded:
+        coroutine.close()
+        raise
+    try:
+        return await asyncio.wait_for(coroutine, seconds)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded() from None
+
+
+def _discard(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+def mark_committing() -> None:
+    event = committing.get()
+    if event is not None and deadline.get() is not None:
+        event.set()
+
+
+def route_timeout(
+    method: str, path: str, default: float, length: Optional[int] = None
+) -> float:
+    for route_method, prefix, seconds, per_mib in ROUTES:
+        if method == route_method and path.startswith(prefix):
+            return seconds + per_mib * (length or 0) / MIB
+    return default
+
+
+class DeadlineMiddleware:
+    """Gives every request a deadline and cancels it once the deadline passes.
+
+    The budget is the route's from ``ROUTES`` (or ``default``), grown with
+    the Content-Length for routes that take large bodies; an
+    ``X-Request-Timeout`` header in seconds can shorten it, not extend it. The
+    deadline is published through the ``deadline`` context variable so
+    database sessions and upstream calls give up on it too. Requests that run
+    out are cancelled and get 504, counted per route in ``exceeded``, unless
+    they already started committing: those run to the end, with what follows
+    the commit, and answer for themselves.
+    """
+
+    def __init__(self, app: ASGIApp, default: float) -> None:
+        self.app = app
+        self.default = default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = 0
+        seconds = route_timeout(scope["method"], scope["path"], self.default, length)
+        try:
+            requested = float(headers.get(HEADER, "inf"))
+        except ValueError:
+            requested = float("inf")
+        if requested > 0:
+            seconds = min(seconds, requested)
+
+        started = False
+
+        async def send_started(message: Message) -> None:
+            nonlocal started
+            started = True
+            await send(message)
+
+        event = asyncio.Event()
+        token = deadline.set(time.monotonic() + seconds)
+        marker = committing.set(event)
+        try:
+            # the task copies the context, deadline included
+            task = asyncio.ensure_future(self.app(scope, receive, send_started))
+        finally:
+            committing.reset(marker)
+            deadline.reset(token)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=seconds)
+            if not done and event.is_set():
+                # Cancelling now would answer 504 for a write that landed
+                # and skip the events after it. Its statements still give
+                # up on the deadline, so this wait is short.
+                done, _ = await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if done:
+            try:
+                task.result()
+                return
+            except DeadlineExceeded:
+                pass
+        else:
+            # Answer now rather than when the cancelled handler has unwound;
+            # closing its session can wait on a locked database.
+            task.cancel()
+            task.add_done_callback(_discard)
+
+        exceeded[route_label(scope)] += 1
+        if started:
+            # too late for a 504; the server drops the connection
+            raise DeadlineExceeded()
+        response = JSONResponse(
+            {"detail": "Deadline exceeded"},
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        )
+        await response(scope, receive, send)
+
+
+# requests that ran out of time, by "METHOD /route/{template}"
+exceeded: Dict[str, int] = defaultdict(int)
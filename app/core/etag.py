@@ -0,0 +1,93 @@
+import hashlib
+import os
+from typing import Dict, List
+
+from fastapi import Request, Response, status
+
+from app.core.config import settings
+from app.models import Company
+from app.services.events import CompanyListener, company_events
+
+# In-process counters restart at zero, so every tag also carries a boot token.
+BOOT = os.urandom(8).hex()
+
+
+class CompanyVersion(CompanyListener):
+    """Table-level and per-row write counters for the company table.
+
+    ``updated_at`` only has second resolution, so per-row tags also mix in
+    how many times this process saw the row change.
+    """
+
+    def __init__(self):
+        self.table = 0
+        self.generation = 0
+        self.rows: Dict[int, int] = {}
+
+    def upsert(self, companies: List[Company]) -> None:
+        self.table += 1
+        for company in companies:
+            self.rows[company.id] = self.rows.get(company.id, 0) + 1
+
+    def delete(self, ids: List[int]) -> None:
+        self.table += 1
+        for id_ in ids:
+            self.rows.pop(id_, None)
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        # rows changed in bulk, so every per-row tag has to change as well
+        self.table += 1
+        self.generation += 1
+
+
+company_version = company_events.subscribe(CompanyVersion())
+
+
+def make_etag(*parts) -> str:
+    key = "|".join(str(part) for part in (BOOT,) + parts)
+    return '"%s"' % hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def company_etag(company_id: int, updated_at, *parts) -> str:
+    return make_etag(
+        "company",
+        company_id,
+        updated_at,
+        company_version.rows.get(company_id, 0),
+        company_version.generation,
+        *parts,
+    )
+
+
+def companies_etag(request: Request, *parts) -> str:
+    return make_etag(
+        "companies",
+        company_version.table,
+        sorted(request.query_params.multi_items()),
+        *parts,
+    )
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function.
+    return etag in (tag.strip().replace("W/", "", 1) for tag in header.split(","))
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # the tag is the same for every content coding of the body
+    return {
+        "ETag": etag,
+        "Cache-Control": settings.COMPANY_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag)
+    )
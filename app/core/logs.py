@@ -0,0 +1,179 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+HEADER = "x-request-id"
+# ids taken from clients end up in every log line of their request
+VALID_ID = re.compile(r"^[\w.\-]{1,64}$")
+# LogRecord attributes; anything else on a record came from ``extra=``
+STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None)))
+STANDARD |= {"message", "request_id"}
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in STANDARD:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Samples chatty loggers and stamps the request id, on the caller's thread.
+
+    ``sampling`` maps logger names to the share of their records below
+    WARNING that are kept; a name also covers its child loggers.
+    """
+
+    def __init__(self, sampling: Dict[str, float]):
+        super().__init__()
+        self.sampling = sampling
+        self.rates: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        if name not in self.rates:
+            matches = [
+                prefix
+                for prefix in self.sampling
+                if name == prefix or name.startswith(prefix + ".")
+            ]
+            self.rates[name] = self.sampling[max(matches, key=len)] if matches else 1.0
+        return self.rates[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self.rate(record.name)
+            if rate < 1 and random.random() >= rate:
+                return False
+        record.request_id = request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops them when it falls behind."""
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve what cannot cross threads (arguments may change, tracebacks
+        # reference frames); formatting is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging() -> Optional[NonBlockingQueueHandler]:
+    """Routes every logger through a queue to a JSON stderr writer thread.
+
+    Safe to call more than once; only the first call configures anything.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return handler
+    levels = {
+        # SQLAlchemy logs statements at INFO whenever the logger allows it
+        "sqlalchemy.engine": "INFO" if settings.DB_ECHO else "WARNING",
+        **settings.LOG_LEVELS,
+    }
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JSONFormatter())
+    records: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(ContextFilter(settings.LOG_SAMPLING))
+    root.addHandler(handler)
+    listener = QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    # flushes what is still queued
+    atexit.register(listener.stop)
+    return handler
+
+
+def restart_logging() -> Optional[NonBlockingQueueHandler]:
+    """``configure_logging`` in a forked process.
+
+    The writer thread did not come along, so the inherited handler is
+    replaced with one that has its own.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    return configure_logging()
+
+
+class RequestIdMiddleware:
+    """Gives every request an id for its log lines, its trace and its response.
+
+    A well-formed ``X-Request-ID`` from the client (or a proxy) is kept,
+    otherwise one is generated. It is echoed back in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        value = Headers(scope=scope).get(HEADER, "")
+        if not VALID_ID.match(value):
+            value = uuid.uuid4().hex
+
+        async def send_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (HEADER.encode(), value.encode())
+                ]
+            await send(message)
+
+        token = request_id.set(value)
+        try:
+            await self.app(scope, receive, send_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,40 @@
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def respond(
+    content: Any, status_code: int = 200, response: Optional[Response] = None
+) -> Any:
+    # Handlers pass content they already validated (``from_orm``); returning a
+    # Response makes FastAPI skip validating it again against ``response_model``.
+    if settings.FAST_JSON:
+        fast = FastJSONResponse(content, status_code=status_code)
+        if response is not None:
+            # FastAPI only merges the injected response's headers into
+            # content it serializes itself, so carry them over here.
+            fast.headers.raw.extend(response.headers.raw)
+        return fast
+    return content
@@ -0,0 +1,27 @@
+from typing import Dict, Optional
+
+from starlette.types import Scope
+
+# endpoint -> the path template of the route it serves
+_templates: Dict[object, Optional[str]] = {}
+
+
+def route_template(scope: Scope) -> Optional[str]:
+    # The router leaves the matched endpoint in the scope, so this only
+    # answers once the request has been routed.
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return None
+    if endpoint not in _templates:
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                _templates[endpoint] = route.path
+                break
+        else:
+            _templates[endpoint] = None
+    return _templates[endpoint]
+
+
+def route_label(scope: Scope) -> str:
+    # raw paths would give every unmatched URL its own label
+    return "%s %s" % (scope["method"], route_template(scope) or "(unmatched)")
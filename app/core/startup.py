@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, contextmanager
+from typing import Dict, List
+from urllib.parse import urlencode
+
+from fastapi import HTTPException
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.auth import get_user
+from app.core.config import settings
+from app.db.database import async_session
+from app.models import CompanyStats, Rate
+from app.services.rates import rate_history
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """Seconds spent in each startup hook and warm-up step.
+
+    ``ready`` turns true once warm-up has finished (or failed; a cold cache is
+    no reason to keep a worker out of rotation), which ``GET /ready`` reports
+    to the load balancer.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.started = time.perf_counter()
+        self.ready = False
+        self.ready_after = None
+        self.task = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self) -> None:
+        self.ready_after = round(time.perf_counter() - self.started, 4)
+        self.ready = True
+
+    def warm_up(self, app) -> None:
+        # in the background, so /ping answers while the caches fill
+        self.task = asyncio.create_task(warm_up(app, self))
+
+    async def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_after_s": self.ready_after,
+            "phases": dict(self.phases),
+            "errors": dict(self.errors),
+        }
+
+
+async def get(app, path: str, **params) -> int:
+    # One GET straight through the router: routing, validation, queries and
+    # serialization all run, but admission control does not count it.
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params).encode(),
+        "root_path": "",
+        "headers": [(b"host", b"warmup")],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+        "app": app,
+    }
+    status = 500
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    try:
+        # normally opened by FastAPI's middleware, for dependencies with yield
+        async with AsyncExitStack() as stack:
+            scope["fastapi_astack"] = stack
+            await app.router(scope, receive, send)
+    except HTTPException as error:
+        status = error.status_code
+    return status
+
+
+async def hot_companies(limit: int) -> List[int]:
+    async with async_session() as db:
+        result = await db.execute(
+            select(CompanyStats.company_id)
+            .order_by(col(CompanyStats.holders).desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+async def warm_up(app, profile: StartupProfile) -> None:
+    """Pay the first-request costs before the worker reports ready.
+
+    Builds the OpenAPI schema, then requests the hot read paths once so their
+    statements are compiled and cached, the rows of the most held companies
+    are in the page cache and rates are loaded.
+    """
+    steps = (
+        ("openapi", warm_openapi),
+        ("rates", warm_rates),
+        ("companies", warm_companies),
+        ("login", warm_login),
+    )
+    for name, step in steps:
+        with profile.phase("warmup." + name):
+            try:
+                await step(app)
+            except Exception as error:
+                profile.errors[name] = repr(error)
+    profile.mark_ready()
+    logger.info(
+        "ready after %.3fs",
+        profile.ready_after,
+        extra={"phases": profile.phases},
+    )
+
+
+async def warm_openapi(app) -> None:
+    app.openapi()
+
+
+async def warm_rates(app) -> None:
+    await rate_history.refresh()
+    async with async_session() as db:
+        result = await db.execute(select(Rate.currency))
+        currencies = result.scalars().all()
+    ids = await hot_companies(1)
+    if ids and settings.BASE_CURRENCY in currencies:
+        await get(app, "/company/%d" % ids[0], currency=settings.BASE_CURRENCY)
+
+
+async def warm_companies(app) -> None:
+    # a page, as clients ask for; the whole table would hold up readiness
+    await get(app, "/company", limit=100)
+    await get(app, "/company/search", q="a")
+    for company_id in await hot_companies(settings.WARMUP_COMPANIES):
+        await get(app, "/company/%d" % company_id)
+        await get(app, "/company/%d/stats" % company_id)
+        await get(app, "/company/%d/holders" % company_id)
+
+
+async def warm_login(app) -> None:
+    # compiles the login lookup without paying for a bcrypt check
+    async with async_session() as db:
+        try:
+            await get_user(db, "")
+        except HTTPException:
+            pass
+
+
+startup = StartupProfile()
@@ -0,0 +1,316 @@
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import requests
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logs import request_id
+from app.core.routing import route_label
+
+logger = logging.getLogger(__name__)
+
+FILE = "file"
+OTLP = "otlp"
+# spans of unfinished requests are dropped beyond this many, per request
+MAX_SPANS = 1000
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "end",
+        "attributes",
+        "spans",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        spans: List["Span"],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = 0
+        self.attributes = attributes
+        # every span of the request, shared with the root
+        self.spans = spans
+
+    def child(self, name: str, attributes: Dict[str, Any]) -> "Span":
+        return Span(name, self.trace_id, self.span_id, self.spans, attributes)
+
+    def finish(self) -> None:
+        self.end = time.time_ns()
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(self)
+
+    def record(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round((self.end - self.start) / 1e6, 3),
+            "attributes": self.attributes,
+        }
+
+
+# the innermost open span of the current request; None when it is not sampled
+current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Times the block as a child of the current span, if the request is traced."""
+    parent = current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, attributes)
+    token = current.set(child)
+    try:
+        yield child
+    except BaseException as error:
+        # the type only; messages can carry URLs with keys, or SQL parameters
+        child.attributes["error"] = type(error).__name__
+        raise
+    finally:
+        current.reset(token)
+        child.finish()
+
+
+def traced(name: str):
+    """Decorates a coroutine function, such as a dependency, to run in a span."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    # for spans opened and closed in different callbacks, like SQL events;
+    # they do not become the current span
+    parent = current.get()
+    return None if parent is None else parent.child(name, attributes)
+
+
+def otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(service: str, spans: List[Span]) -> dict:
+    # OTLP/HTTP JSON, as accepted on a collector's /v1/traces
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": otlp_value(service)}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app"},
+                        "spans": [
+                            {
+                                "traceId": item.trace_id,
+                                "spanId": item.span_id,
+                                "parentSpanId": item.parent_id or "",
+                                "name": item.name,
+                                "kind": 2 if item.parent_id is None else 1,
+                                "startTimeUnixNano": str(item.start),
+                                "endTimeUnixNano": str(item.end),
+                                "attributes": [
+                                    {"key": key, "value": otlp_value(value)}
+                                    for key, value in item.attributes.items()
+                                ],
+                            }
+                            for item in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter:
+    """Ships finished traces from a background thread, in batches.
+
+    Requests only put their spans on a queue. ``file`` appends one JSON line
+    per span to ``path``; ``otlp`` posts OTLP/HTTP JSON to ``endpoint``.
+    Traces arriving while the queue is full are dropped and counted.
+    """
+
+    def __init__(self, batch_size: int = 512, interval: float = 1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: queue.Queue = queue.Queue(10000)
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"exported": 0, "dropped": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None
+
+    def start(self, exporter: str, path: str, endpoint: str, service: str) -> None:
+        if self.running:
+            return
+        if exporter == FILE:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.exporter, self.path = exporter, path
+        self.endpoint, self.service = endpoint, service
+        self.thread = threading.Thread(target=self._run, name="spans", daemon=True)
+        self.thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def after_fork(self) -> None:
+        # in a forked process: the parent's thread and queued spans stay behind
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.thread = None
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        self.thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    spans = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if spans is None:
+                    stopping = True
+                    break
+                batch.extend(spans)
+            if batch:
+                try:
+                    self._write(batch)
+                    self.stats["exported"] += len(batch)
+                except Exception as error:
+                    self.stats["failed"] += len(batch)
+                    logger.warning("exporting spans failed: %s", type(error).__name__)
+
+    def _write(self, batch: List[Span]) -> None:
+        if self.exporter == OTLP:
+            response = requests.post(
+                self.endpoint, json=otlp_payload(self.service, batch), timeout=5
+            )
+            response.raise_for_status()
+            return
+        with open(self.path, "a") as fh:
+            fh.write("".join(json.dumps(item.record()) + "\n" for item in batch))
+
+
+def parse_traceparent(value: str):
+    # W3C trace context: "00-<32 hex trace id>-<16 hex parent id>-<flags>"
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class TracingMiddleware:
+    """Opens the root span of sampled requests and exports the finished trace.
+
+    Sampling is decided once, at the head: an incoming ``traceparent`` header
+    decides for its trace, otherwise ``sample_rate`` of requests are traced.
+    Untraced requests only pay for that decision; ``span`` is a no-op for
+    them. Traced responses carry an ``X-Trace-Id`` header.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not exporter.running:
+            await self.app(scope, receive, send)
+            return
+        parent = Headers(scope=scope).get("traceparent")
+        context = parse_traceparent(parent) if parent else None
+        if context is not None:
+            trace_id, parent_id, sampled = context
+        else:
+            trace_id, parent_id = "%032x" % random.getrandbits(128), None
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        root = Span("http", trace_id, parent_id, [], {"http.target": scope["path"]})
+        if request_id.get() is not None:
+            root.attributes["request_id"] = request_id.get()
+
+        async def send_traced(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace_id.encode())
+                ]
+            await send(message)
+
+        token = current.set(root)
+        try:
+            await self.app(scope, receive, send_traced)
+        except BaseException as error:
+            root.attributes["error"] = type(error).__name__
+            raise
+        finally:
+            current.reset(token)
+            root.name = route_label(scope)
+            root.finish()
+            exporter.export(root.spans)
+
+
+exporter = SpanExporter()
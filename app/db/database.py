@@ -1,19 +1,188 @@
+import asyncio
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import Insert, Update
 from sqlmodel import SQLModel
 
 from app.core.config import settings
+from app.core.deadlines import (
+    DeadlineExceeded,
+    mark_committing,
+    remaining,
+    within_deadline,
+)
+from app.core.tracing import span, start_span
+
+# statements are logged through the "sqlalchemy.engine" logger when DB_ECHO
+# is set, rather than echo=True, which writes to stdout on the event loop
+engine = create_async_engine(settings.DATABASE_URL, future=True)
+
+
+# async drivers and the blocking driver used for the same database
+SYNC_DRIVERS = {"aiosqlite": "pysqlite", "asyncpg": "psycopg2", "aiomysql": "pymysql"}
+
+
+def sync_database_url(url: str) -> str:
+    url = make_url(url)
+    driver = SYNC_DRIVERS.get(url.get_driver_name())
+    if driver is not None:
+        url = url.set(drivername="%s+%s" % (url.get_backend_name(), driver))
+    return url.render_as_string(hide_password=False)
+
+
+# for scheduler jobs, which run in worker threads outside the event loop
+sync_engine = create_engine(sync_database_url(settings.DATABASE_URL), future=True)
+
+
+class PoolStats:
+    """Connection checkouts and a moving average of how long they waited.
+
+    The wait is measured from the dialect starting to connect until the pool
+    hands the connection out, which is every checkout under SQLite's
+    ``NullPool``. Samples older than ``window`` seconds no longer count.
+    """
+
+    def __init__(self, window: float = 1.0, alpha: float = 0.2):
+        self.window = window
+        self.alpha = alpha
+        self.checkouts = 0
+        self.wait = 0.0
+        self.sampled = 0.0
+
+    def connecting(self, dialect, conn_rec, cargs, cparams) -> None:
+        conn_rec.info["checkout_started"] = time.perf_counter()
+
+    def checked_out(self, dbapi_connection, conn_rec, connection_proxy) -> None:
+        self.checkouts += 1
+        started = conn_rec.info.pop("checkout_started", None)
+        if started is not None:
+            now = time.perf_counter()
+            self.wait += self.alpha * (now - started - self.wait)
+            self.sampled = now
+
+    def recent_wait(self) -> float:
+        if time.perf_counter() - self.sampled > self.window:
+            return 0.0
+        return self.wait
+
+
+pool_stats = PoolStats()
+event.listen(engine.sync_engine, "do_connect", pool_stats.connecting)
+event.listen(engine.sync_engine.pool, "checkout", pool_stats.checked_out)
+
+
+# One span per statement of a traced request. The events run in SQLAlchemy's
+# greenlet, which carries a copy of the request's context.
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    context.span = start_span(
+        "db.execute", statement=statement[:500], executemany=executemany
+    )
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(context, "span", None) is not None:
+        context.span.finish()
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _fail_statement(exception_context):
+    context = exception_context.execution_context
+    if getattr(context, "span", None) is not None:
+        error = exception_context.original_exception
+        context.span.attributes["error"] = type(error).__name__
+        context.span.finish()
+
+
+# tables whose rows take a change_seq from change_counter
+CHANGE_TABLES = {"company", "company_tombstone"}
+bump_counter = text("UPDATE change_counter SET seq = seq + 1 WHERE id = 1")
+
+
+def bump_change_seq(conn, clauseelement, multiparams, params, execution_options):
+    # The first INSERT or UPDATE of a change table in a transaction, Core or
+    # ORM, takes the next number. Its rows read it back through their
+    # change_seq default, and the row lock orders writers by commit. On
+    # PostgreSQL company writers queue on it until they commit (see README).
+    if not (
+        isinstance(clauseelement, (Insert, Update))
+        and clauseelement.table.name in CHANGE_TABLES
+    ):
+        return
+    transaction = conn.get_transaction()
+    if transaction is None or conn.info.get("change_seq_bumped") is not transaction:
+        conn.execute(bump_counter)
+        conn.info["change_seq_bumped"] = conn.get_transaction()
+
+
+# the app's engines only; tools with engines of their own number nothing
+event.listen(engine.sync_engine, "before_execute", bump_change_seq)
+event.listen(sync_engine, "before_execute", bump_change_seq)
 
 
 async def init_db():
     async with engine.begin() as conn:
         # await conn.run_sync(SQLModel.metadata.drop_all)
         await conn.run_sync(SQLModel.metadata.create_all)
+        if conn.dialect.name == "sqlite":
+            # Databases created before the app took over repricing and
+            # updated_at still carry the triggers; left in place they would
+            # reprice companies a second time.
+            await conn.execute(text("DROP TRIGGER IF EXISTS updated_at_trigger"))
+            await conn.execute(text("DROP TRIGGER IF EXISTS updated_rate_trigger"))
+
+
+class DeadlineSession(AsyncSession):
+    """An ``AsyncSession`` that gives up when the request's deadline passes.
+
+    Statements are cancelled at the deadline. A commit is only refused once
+    the deadline has passed, never cancelled halfway: starting one keeps
+    ``DeadlineMiddleware`` from cancelling the request, so a write that
+    landed is answered as such and the events after it are sent. Outside a
+    request there is no deadline and nothing changes.
+    """
+
+    async def execute(self, statement, *args, **kwargs):
+        if remaining() is None:
+            return await super().execute(statement, *args, **kwargs)
+        return await within_deadline(super().execute(statement, *args, **kwargs))
+
+    async def get(self, entity, ident, *args, **kwargs):
+        if remaining() is None:
+            return await super().get(entity, ident, *args, **kwargs)
+        return await within_deadline(super().get(entity, ident, *args, **kwargs))
+
+    async def flush(self, objects=None):
+        with span("db.flush"):
+            if remaining() is None:
+                return await super().flush(objects)
+            return await within_deadline(super().flush(objects))
+
+    async def commit(self):
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded()
+        mark_committing()
+        with span("db.commit"):
+            return await super().commit()
+
+
+async_session = sessionmaker(engine, class_=DeadlineSession, expire_on_commit=False)
 
 
 async def get_session() -> AsyncSession:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
+    # FastAPI caches dependencies per request, so the auth dependencies, the
+    # handler and the helpers it passes ``db`` to all share this session.
+    session = async_session()
+    try:
         yield session
+    finally:
+        # A request cancelled at its deadline answers without waiting for
+        # this, which can queue behind a statement stuck on a database lock.
+        with span("db.close"):
+            await asyncio.shield(session.close())
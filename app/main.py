@@ -1,22 +1,83 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.router import api_router
+from app.core.admission import AdmissionMiddleware
+from app.core.auth import revocations
+from app.core.capture import CaptureMiddleware, capture
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
 from app.core.cron import scheduler
+from app.core.deadlines import DeadlineMiddleware, exceeded
+from app.core.logs import RequestIdMiddleware, configure_logging
+from app.core.responses import FastJSONResponse
+from app.core.startup import startup
+from app.core.tracing import TracingMiddleware, exporter
 from app.db.database import init_db
 from app.models import *  # noqa
+from app.services.events import company_events, worker_events
+from app.services.inventory import inventory
+from app.services.jobs import recover_jobs
+from app.services.stats import backfill_company_stats
+from app.services.ticks import ticks
+from app.services.upstream import breakers
+
+log_handler = configure_logging()
 
 app = FastAPI(
-    title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=FastJSONResponse if settings.FAST_JSON else JSONResponse,
 )
 
 
 @app.on_event("startup")
 async def on_startup():
-    await init_db()
-    scheduler.print_jobs()
-    scheduler.start()
+    with startup.phase("init_db"):
+        await init_db()
+    with startup.phase("backfill_company_stats"):
+        await backfill_company_stats()
+    with startup.phase("recover_jobs"):
+        await recover_jobs()
+    with startup.phase("company_events"):
+        await company_events.load()
+    ticks.start()
+    if settings.CAPTURE_ENABLED:
+        capture.start(
+            settings.CAPTURE_PATH,
+            settings.CAPTURE_MAX_BYTES,
+            settings.CAPTURE_BACKUPS,
+        )
+    if settings.TRACE_ENABLED:
+        exporter.start(
+            settings.TRACE_EXPORTER,
+            settings.TRACE_PATH,
+            settings.TRACE_OTLP_ENDPOINT,
+            settings.PROJECT_NAME,
+        )
+    with startup.phase("revocations"):
+        await revocations.start()
+    if settings.SCHEDULER_ENABLED:
+        with startup.phase("scheduler"):
+            scheduler.print_jobs()
+            scheduler.start()
+            worker_events.start()
+    if settings.WARMUP_ENABLED:
+        startup.warm_up(app)
+    else:
+        startup.mark_ready()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await startup.stop()
+    await ticks.stop()
+    await revocations.stop()
+    await inventory.stop()
+    capture.stop()
+    exporter.stop()
+    worker_events.stop()
 
 
 @app.get("/ping")
@@ -24,6 +85,27 @@ async def pong():
     return {"ping": "pong!"}
 
 
+@app.get("/ready")
+async def ready():
+    # 503 until warm-up is done, so load balancers only route to warm workers
+    return JSONResponse(
+        startup.report(),
+        status_code=status.HTTP_200_OK
+        if startup.ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "deadline_exceeded": dict(exceeded),
+        "breakers": {breaker.name: breaker.snapshot() for breaker in breakers},
+        "spans": exporter.stats,
+        "logs": {"dropped": log_handler.dropped},
+    }
+
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -34,4 +116,41 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+if settings.COMPRESSION_MINIMUM_SIZE:
+    app.add_middleware(
+        CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE
+    )
+
+if settings.REQUEST_TIMEOUT:
+    app.add_middleware(DeadlineMiddleware, default=settings.REQUEST_TIMEOUT)
+
+# added last so it runs first and rejects before any other work is done
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        rate=settings.RATE_LIMIT_RATE,
+        burst=settings.RATE_LIMIT_BURST,
+        concurrency={
+            "trade": settings.TRADE_CONCURRENCY,
+            "write": settings.WRITE_CONCURRENCY,
+            "read": settings.READ_CONCURRENCY,
+        },
+        shed_wait=settings.SHED_DB_WAIT_MS / 1000,
+    )
+
+# outside admission, so shed and rate-limited requests are recorded too
+if settings.CAPTURE_ENABLED:
+    app.add_middleware(
+        CaptureMiddleware,
+        sample_rate=settings.CAPTURE_SAMPLE_RATE,
+        max_body=settings.CAPTURE_MAX_BODY,
+    )
+
+# outermost, so the root span covers every other middleware
+if settings.TRACE_ENABLED:
+    app.add_middleware(TracingMiddleware, sample_rate=settings.TRACE_SAMPLE_RATE)
+
+# every other middleware logs with the request id
+app.add_middleware(RequestIdMiddleware)
+
 app.include_router(api_router)
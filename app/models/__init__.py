@@ -1 +1,15 @@
-from .models import Company, Rate, ShareHolder, User  # noqa
+from .models import (  # noqa
+    ChangeCounter,
+    Company,
+    CompanyStats,
+    CompanyTombstone,
+    InventoryCheckpoint,
+    Job,
+    PortfolioSnapshot,
+    PriceAlert,
+    Rate,
+    RateHistory,
+    ShareHolder,
+    User,
+    Watchlist,
+)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import DDL, Column, ForeignKey, Integer, event, func
+from sqlalchemy import DDL, Column, ForeignKey, Index, Integer, event, func, text
 from sqlalchemy.orm import RelationshipProperty
 from sqlmodel import DateTime, Field, Relationship, SQLModel, UniqueConstraint
 
@@ -21,6 +21,10 @@ class User(
     email: Optional[str] = ""
     full_name: Optional[str] = ""
     disabled: Optional[bool] = False
+    # bumped to revoke every token issued before; tokens carry it as "ver"
+    token_version: int = Field(
+        0, nullable=False, sa_column_kwargs={"server_default": "0"}
+    )
     shares: List["ShareHolder"] = Relationship(
         sa_relationship=RelationshipProperty(
             "ShareHolder",
@@ -31,6 +35,29 @@ class User(
     )
 
 
+class ChangeCounter(SQLModel, table=True):
+
+    __tablename__ = "change_counter"
+
+    # a single row
+    id: int = Field(1, primary_key=True)
+    seq: int = Field(0, nullable=False)
+    # highest change_seq of a pruned tombstone; older tokens must resync
+    pruned_seq: int = Field(0, nullable=False, sa_column_kwargs={"server_default": "0"})
+
+
+event.listen(
+    ChangeCounter.__table__,
+    "after_create",
+    DDL("INSERT INTO change_counter (id, seq) VALUES (1, 0)"),
+)
+
+# The counter as bumped by the statement's transaction (see bump_change_seq
+# in app.db.database). The bump locks the counter row until commit, so
+# writers take numbers in commit order, on PostgreSQL as well as SQLite.
+current_change_seq = text("(SELECT seq FROM change_counter WHERE id = 1)")
+
+
 class Company(SQLModel, table=True):
 
     __table_args__ = (
@@ -58,7 +85,19 @@ class Company(SQLModel, table=True):
             DateTime(timezone=True),
             nullable=False,
             server_default=func.now(),
-            server_onupdate=func.now(),
+            # set by every UPDATE the app issues, in place of a SQLite trigger
+            onupdate=func.now(),
+        ),
+        default=None,
+    )
+    # for GET /company/changes; set on every INSERT and UPDATE, like updated_at
+    change_seq: int = Field(
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            index=True,
+            default=current_change_seq,
+            onupdate=current_change_seq,
         ),
         default=None,
     )
@@ -72,6 +111,30 @@ class Company(SQLModel, table=True):
     )
 
 
+class CompanyTombstone(SQLModel, table=True):
+
+    __tablename__ = "company_tombstone"
+
+    # no foreign key: the company is gone
+    company_id: int = Field(..., primary_key=True)
+    change_seq: int = Field(
+        sa_column=Column(
+            Integer, nullable=False, index=True, default=current_change_seq
+        ),
+        default=None,
+    )
+    # pruned after CHANGE_TOMBSTONE_DAYS
+    deleted_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            index=True,
+            server_default=func.now(),
+        ),
+        default=None,
+    )
+
+
 class ShareHolder(SQLModel, table=True):
 
     __table_args__ = (UniqueConstraint("user_id", "company_id"),)
@@ -109,37 +172,168 @@ class Rate(SQLModel, table=True):
     rate: float
 
 
-event.listen(
-    Company.__table__,
-    "after_create",
-    DDL(
-        """
-            CREATE TRIGGER updated_at_trigger
-            AFTER UPDATE OF name, currency, price, available_shares, symbol
-            ON company
-            FOR EACH ROW
-            BEGIN
-                UPDATE company
-                SET updated_at = CURRENT_TIMESTAMP
-                WHERE id = new.id;
-            END;
-        """
-    ),
-)
+class RateHistory(SQLModel, table=True):
 
-event.listen(
-    Rate.__table__,
-    "after_create",
-    DDL(
-        """
-            CREATE TRIGGER updated_rate_trigger
-            AFTER UPDATE OF rate
-            ON rate
-            BEGIN
-                UPDATE company
-                SET price = ROUND(((new.rate / old.rate) * price), 2)
-                WHERE currency = old.currency;
-            END;
-        """
-    ),
+    __tablename__ = "rate_history"
+
+    __table_args__ = (
+        Index("ix_rate_history_currency_observed_at", "currency", "observed_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    base: str
+    currency: str
+    rate: float
+    observed_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+
+
+class CompanyStats(SQLModel, table=True):
+
+    __tablename__ = "company_stats"
+
+    company_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("company.id", ondelete="CASCADE"), primary_key=True
+        )
+    )
+    holders: int = Field(0, nullable=False)
+    held_quantity: float = Field(0, nullable=False)
+    market_cap: float = Field(0, nullable=False)
+    market_cap_base: float = Field(0, nullable=False)
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+            onupdate=func.now(),
+        ),
+        default=None,
+    )
+
+
+class Job(SQLModel, table=True):
+
+    __table_args__ = (Index("ix_job_user_id_created_at", "user_id", "created_at"),)
+
+    id: str = Field(..., primary_key=True)
+    user_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=True
+        )
+    )
+    kind: str
+    # queued, running, succeeded, failed or cancelled
+    status: str = Field("queued", index=True)
+    params: str = "{}"
+    progress: float = Field(0, nullable=False)
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, server_default=func.now()
+        ),
+        default=None,
+    )
+    started_at: Optional[datetime] = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=True), default=None
+    )
+    finished_at: Optional[datetime] = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=True), default=None
+    )
+
+
+class PriceAlert(SQLModel, table=True):
+
+    __tablename__ = "price_alert"
+
+    __table_args__ = (Index("ix_price_alert_user_id_active", "user_id", "active"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+        )
+    )
+    company_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("company.id", ondelete="CASCADE"), nullable=False
+        )
+    )
+    # "above" fires once price >= threshold, "below" once price <= threshold
+    direction: str
+    threshold: float
+    active: bool = Field(True, nullable=False)
+    created_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, server_default=func.now()
+        ),
+        default=None,
+    )
+    triggered_at: Optional[datetime] = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=True), default=None
+    )
+    triggered_price: Optional[float] = None
+
+
+class Watchlist(SQLModel, table=True):
+
+    user_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+        )
+    )
+    company_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("company.id", ondelete="CASCADE"), primary_key=True
+        )
+    )
+    created_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, server_default=func.now()
+        ),
+        default=None,
+    )
+
+
+class PortfolioSnapshot(SQLModel, table=True):
+
+    __tablename__ = "portfolio_snapshot"
+    __table_args__ = (
+        Index("ix_portfolio_snapshot_user_id_taken_at", "user_id", "taken_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+        )
+    )
+    taken_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+    currency: str
+    value: float
+    holdings: int
+
+
+class InventoryCheckpoint(SQLModel, table=True):
+
+    __tablename__ = "inventory_checkpoint"
+
+    company_id: Optional[int] = Field(
+        sa_column=Column(
+            Integer, ForeignKey("company.id", ondelete="CASCADE"), primary_key=True
+        )
+    )
+    # last inventory journal entry applied to the company and its holdings
+    seq: int = Field(0, nullable=False)
+
+
+# top holders of a company, read by GET /company/{id}/holders
+Index(
+    "ix_shareholder_company_id_quantity",
+    ShareHolder.__table__.c.company_id,
+    ShareHolder.__table__.c.quantity.desc(),
 )
@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, confloat
+
+
+class PriceAlertCreateSchema(BaseModel):
+
+    company_id: int
+    direction: Literal["above", "below"]
+    threshold: confloat(ge=0)
+
+
+class PriceAlertSchema(BaseModel):
+
+    id: int
+    company_id: int
+    direction: str
+    threshold: float
+    active: bool
+    created_at: datetime
+    triggered_at: Optional[datetime]
+    triggered_price: Optional[float]
+
+    class Config:
+        orm_mode = True
+
+
+class AlertDeliverySchema(BaseModel):
+
+    alert_id: int
+    company_id: int
+    symbol: Optional[str]
+    direction: str
+    threshold: float
+    price: float
+    triggered_at: datetime
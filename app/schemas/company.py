@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field, confloat, conint, constr, validator
 
@@ -24,6 +24,85 @@ class CompanyModelSchema(BaseModel):
         orm_mode = True
 
 
+class CompanySearchSchema(BaseModel):
+
+    id: int
+    name: str
+    symbol: str
+
+
+class CompanyBatchMissingSchema(BaseModel):
+
+    ids: List[int]
+    symbols: List[str]
+
+
+class CompanyBatchSchema(BaseModel):
+
+    companies: List[CompanyModelSchema]
+    missing: CompanyBatchMissingSchema
+
+
+class CompanyChangesSchema(BaseModel):
+
+    changed: List[CompanyModelSchema]
+    deleted: List[int]
+    # pass back as ?since= for the changes after these
+    token: str
+    more: bool
+
+
+class CompanyBulkErrorSchema(BaseModel):
+
+    line: int
+    detail: str
+
+
+class CompanyBulkResultSchema(BaseModel):
+
+    inserted: int
+    rejected: int
+    errors: List[CompanyBulkErrorSchema]
+
+
+class CompanyPricesResultSchema(BaseModel):
+
+    applied: int
+    rejected: Dict[str, str]
+
+
+class TickStatsSchema(BaseModel):
+
+    received: int
+    dropped: int
+    rejected: int
+    coalesced: int
+    applied: int
+    flushes: int
+    failures: int
+    queued: int
+    pending: int
+
+
+class CompanyStatsSchema(BaseModel):
+
+    company_id: int
+    holders: int
+    held_quantity: float
+    market_cap: float
+    currency: str
+    market_cap_base: float
+    base_currency: str
+    updated_at: Optional[datetime]
+
+
+class CompanyHolderSchema(BaseModel):
+
+    user_id: int
+    username: str
+    quantity: float
+
+
 class CompanySchema(BaseModel):
     name: str = Field(..., min_length=2)
     symbol: constr(strip_whitespace=True, min_length=2) = Field(...)
@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, validator
+
+from app.api.shares.constants import Currency
+
+
+class JobCreateSchema(BaseModel):
+
+    kind: Literal["export_companies", "export_holdings", "snapshot_portfolios"]
+    # export_holdings values the caller's holdings in this currency, and
+    # snapshot_portfolios everyone's (BASE_CURRENCY by default)
+    currency: Optional[Currency] = None
+
+
+class JobSchema(BaseModel):
+
+    id: str
+    kind: str
+    status: str
+    progress: float
+    params: dict
+    result: Optional[dict]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    @validator("params", "result", pre=True)
+    def load_json(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        orm_mode = True
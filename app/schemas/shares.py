@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
 from pydantic import BaseModel
 
@@ -12,3 +13,23 @@ class ShareModelSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class PortfolioSnapshotSchema(BaseModel):
+
+    taken_at: datetime
+    currency: str
+    value: float
+    holdings: int
+
+    class Config:
+        orm_mode = True
+
+
+class ReservationSchema(BaseModel):
+
+    id: str
+    company_id: int
+    side: Literal["buy", "sell"]
+    quantity: float
+    reserved_at: datetime
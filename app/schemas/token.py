@@ -10,3 +10,6 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    id: Optional[int] = None
+    disabled: Optional[bool] = False
+    version: int = 0
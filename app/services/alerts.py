@@ -0,0 +1,273 @@
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.deadlines import deadline
+from app.core.tracing import current
+from app.db.database import async_session
+from app.models import Company, PriceAlert
+from app.services.events import SnapshotListener, company_events
+
+logger = logging.getLogger(__name__)
+
+ABOVE = "above"
+BELOW = "below"
+
+table = PriceAlert.__table__
+mark_triggered = (
+    update(table)
+    .where(table.c.id == bindparam("alert_id"), table.c.active.is_(True))
+    .values(
+        active=False,
+        triggered_at=bindparam("at"),
+        triggered_price=bindparam("price"),
+    )
+)
+
+
+class Alert(NamedTuple):
+
+    id: int
+    user_id: int
+    company_id: int
+    direction: str
+    threshold: float
+
+
+def as_alert(alert: PriceAlert) -> Alert:
+    return Alert(
+        alert.id, alert.user_id, alert.company_id, alert.direction, alert.threshold
+    )
+
+
+class Thresholds:
+    # Parallel threshold/id lists kept sorted by threshold, as in SortedKeys.
+    def __init__(self):
+        self.keys: List[float] = []
+        self.ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, threshold: float, id_: int) -> None:
+        index = bisect_right(self.keys, threshold)
+        self.keys.insert(index, threshold)
+        self.ids.insert(index, id_)
+
+    def remove(self, threshold: float, id_: int) -> None:
+        index = bisect_left(self.keys, threshold)
+        while index < len(self.keys) and self.keys[index] == threshold:
+            if self.ids[index] == id_:
+                del self.keys[index]
+                del self.ids[index]
+                return
+            index += 1
+
+    def pop_at_most(self, price: float) -> List[int]:
+        index = bisect_right(self.keys, price)
+        ids = self.ids[:index]
+        del self.keys[:index]
+        del self.ids[:index]
+        return ids
+
+    def pop_at_least(self, price: float) -> List[int]:
+        index = bisect_left(self.keys, price)
+        ids = self.ids[index:]
+        del self.keys[index:]
+        del self.ids[index:]
+        return ids
+
+
+class AlertIndex(SnapshotListener):
+    """Active price alerts, indexed per company by threshold.
+
+    Every active alert is unsatisfied at the last price seen, so a new price
+    triggers exactly a prefix of the sorted "above" thresholds and a suffix of
+    the "below" ones: two bisects plus the alerts that fire. Triggered alerts
+    are one-shot; they are queued for their user and marked inactive in the
+    background. Repricing that bypasses the ORM (rate changes, bulk imports)
+    only invalidates, so the index reloads and re-checks at current prices.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.alerts: Dict[int, Alert] = {}
+        self.above: Dict[int, Thresholds] = {}
+        self.below: Dict[int, Thresholds] = {}
+        self.symbols: Dict[int, str] = {}
+        self.deliveries: Dict[int, Deque[dict]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks = set()
+        # triggered, but not yet marked inactive in the table
+        self.unsaved: Set[int] = set()
+
+    async def fetch(self) -> list:
+        self.loop = asyncio.get_running_loop()
+        async with async_session() as session:
+            result = await session.execute(
+                select(
+                    PriceAlert.id,
+                    PriceAlert.user_id,
+                    PriceAlert.company_id,
+                    PriceAlert.direction,
+                    PriceAlert.threshold,
+                    Company.price,
+                    Company.symbol,
+                )
+                .join(Company, Company.id == PriceAlert.company_id)
+                .where(PriceAlert.active.is_(True))
+            )
+            return result.all()
+
+    def rebuild(self, rows: list) -> None:
+        self.alerts, self.above, self.below, self.symbols = {}, {}, {}, {}
+        prices: Dict[int, float] = {}
+        for *alert, price, symbol in rows:
+            if alert[0] in self.unsaved:
+                continue
+            self.index(Alert(*alert))
+            prices[alert[2]] = price
+            self.symbols[alert[2]] = symbol
+        for company_id, price in prices.items():
+            self.check(company_id, price)
+
+    def apply_upsert(self, companies: list) -> None:
+        for company in companies:
+            if company.id in self.above or company.id in self.below:
+                self.symbols[company.id] = company.symbol
+                self.check(company.id, company.price)
+
+    def apply_delete(self, ids: List[int]) -> None:
+        for company_id in ids:
+            for side in (self.above, self.below):
+                thresholds = side.pop(company_id, None)
+                for alert_id in thresholds.ids if thresholds else ():
+                    self.alerts.pop(alert_id, None)
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        # may run on a scheduler thread; reload on the loop that loaded us
+        self.stale = True
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.spawn, self.refresh())
+
+    def spawn(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def index(self, alert: Alert) -> None:
+        self.alerts[alert.id] = alert
+        side = self.above if alert.direction == ABOVE else self.below
+        side.setdefault(alert.company_id, Thresholds()).add(alert.threshold, alert.id)
+
+    def check(self, company_id: int, price: float) -> None:
+        fired = []
+        above = self.above.get(company_id)
+        if above is not None:
+            fired.extend(above.pop_at_most(price))
+            if not above:
+                del self.above[company_id]
+        below = self.below.get(company_id)
+        if below is not None:
+            fired.extend(below.pop_at_least(price))
+            if not below:
+                del self.below[company_id]
+        if fired:
+            self.trigger([self.alerts.pop(alert_id) for alert_id in fired], price)
+
+    @staticmethod
+    def satisfied(direction: str, threshold: float, price: float) -> bool:
+        # whether ``check`` would fire such an alert at ``price``
+        return threshold <= price if direction == ABOVE else threshold >= price
+
+    def deliver(self, alert: Alert, price: float, at: datetime) -> None:
+        queue = self.deliveries.get(alert.user_id)
+        if queue is None:
+            queue = self.deliveries[alert.user_id] = deque(
+                maxlen=settings.ALERT_QUEUE_SIZE
+            )
+        queue.append(
+            {
+                "alert_id": alert.id,
+                "company_id": alert.company_id,
+                "symbol": self.symbols.get(alert.company_id),
+                "direction": alert.direction,
+                "threshold": alert.threshold,
+                "price": price,
+                "triggered_at": at,
+            }
+        )
+
+    def trigger(self, alerts: List[Alert], price: float) -> None:
+        at = datetime.now(timezone.utc)
+        for alert in alerts:
+            self.deliver(alert, price, at)
+        ids = [alert.id for alert in alerts]
+        self.unsaved.update(ids)
+        self.spawn(self.persist(ids, price, at))
+
+    async def persist(self, ids: List[int], price: float, at: datetime) -> None:
+        # spawned from a request, but neither bound by its deadline nor
+        # part of its trace
+        deadline.set(None)
+        current.set(None)
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    mark_triggered,
+                    [{"alert_id": id_, "price": price, "at": at} for id_ in ids],
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("persisting triggered alerts failed")
+        finally:
+            self.unsaved.difference_update(ids)
+
+    def add(self, alert: PriceAlert, price: float, symbol: str) -> None:
+        # Through the replay queue, so a reload in flight cannot drop it.
+        if self.pending is not None:
+            self.pending.append((self.apply_add, (alert, price, symbol)))
+        else:
+            self.apply_add((alert, price, symbol))
+
+    def apply_add(self, args) -> None:
+        alert, price, symbol = args
+        self.symbols[alert.company_id] = symbol
+        self.index(as_alert(alert))
+        self.check(alert.company_id, price)
+
+    def fired(self, alert: PriceAlert, symbol: str) -> None:
+        # created already triggered: only its delivery is left to do
+        self.symbols[alert.company_id] = symbol
+        self.deliver(as_alert(alert), alert.triggered_price, alert.triggered_at)
+
+    def remove(self, alert_id: int) -> None:
+        if self.pending is not None:
+            self.pending.append((self.apply_remove, alert_id))
+        else:
+            self.apply_remove(alert_id)
+
+    def apply_remove(self, alert_id: int) -> None:
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        side = self.above if alert.direction == ABOVE else self.below
+        thresholds = side.get(alert.company_id)
+        if thresholds is not None:
+            thresholds.remove(alert.threshold, alert.id)
+            if not thresholds:
+                del side[alert.company_id]
+
+    def drain(self, user_id: int) -> List[dict]:
+        queue = self.deliveries.pop(user_id, None)
+        return list(queue) if queue else []
+
+
+alerts = company_events.subscribe(AlertIndex())
@@ -0,0 +1,138 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.config import settings
+from app.db.database import sync_engine
+from app.models import ChangeCounter, Company, CompanyTombstone
+
+tombstones = CompanyTombstone.__table__
+counter = ChangeCounter.__table__
+
+# (change_seq, id) of the last change a client has seen, and the change_seq
+# its full sync started from: no delete at or below that can concern it
+Watermark = Tuple[int, int, int]
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def encode_token(watermark: Watermark) -> str:
+    raw = "v1:%d:%d:%d" % watermark
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Watermark:
+    """Raises ValueError for anything ``encode_token`` did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(token)
+    version, *parts = raw.split(":")
+    if version != "v1" or len(parts) not in (2, 3):
+        raise ValueError(token)
+    seq, id_, floor = (parts + ["0"])[:3]
+    return int(seq), int(id_), int(floor)
+
+
+def after(seq_column, id_column, watermark: Watermark):
+    seq, id_, _ = watermark
+    return or_(seq_column > seq, and_(seq_column == seq, id_column > id_))
+
+
+async def tombstone(db: AsyncSession, company_id: int) -> None:
+    # Before the company's row goes: its change_seq may be the highest, and
+    # the tombstone's must come after it. Ids can be reused once the highest
+    # is deleted; only the last delete is kept.
+    await db.execute(
+        delete(CompanyTombstone).where(CompanyTombstone.company_id == company_id)
+    )
+    await db.execute(insert(CompanyTombstone.__table__).values(company_id=company_id))
+
+
+async def changes_since(
+    db: AsyncSession, watermark: Optional[Watermark], limit: int
+) -> Tuple[list, List[int], Watermark, bool]:
+    """The next ``limit`` changes after ``watermark``, in change order.
+
+    Returns the changed company rows, the deleted ids, the new watermark and
+    whether more changes follow. Without a watermark every live company is
+    a change and there is nothing to delete. Raises TokenExpired when
+    tombstones the watermark has not seen were pruned.
+    """
+    result = await db.execute(select(ChangeCounter.seq, ChangeCounter.pruned_seq))
+    seq, pruned = result.one_or_none() or (0, 0)
+    if watermark is None:
+        floor = seq
+    else:
+        floor = watermark[2]
+        if max(watermark[0], floor) < pruned:
+            raise TokenExpired()
+    # columns, not entities: Company eagerly loads its shareholders
+    result = await db.execute(
+        select(*Company.__table__.columns)
+        .where(after(Company.change_seq, Company.id, watermark or (0, 0, floor)))
+        .order_by(col(Company.change_seq), col(Company.id))
+        .limit(limit + 1)
+    )
+    page = [(row.change_seq, row.id, row) for row in result.all()]
+    if watermark is not None:
+        result = await db.execute(
+            select(CompanyTombstone.change_seq, CompanyTombstone.company_id)
+            .where(
+                CompanyTombstone.change_seq > floor,
+                after(
+                    CompanyTombstone.change_seq, CompanyTombstone.company_id, watermark
+                ),
+            )
+            .order_by(
+                col(CompanyTombstone.change_seq), col(CompanyTombstone.company_id)
+            )
+            .limit(limit + 1)
+        )
+        page += [(seq, id_, None) for seq, id_ in result.all()]
+    page.sort(key=lambda item: item[:2])
+    more = len(page) > limit
+    page = page[:limit]
+
+    changed = [row for _, _, row in page if row is not None]
+    live = {row.id for row in changed}
+    # a deleted id that came back later in the page only needs its new row
+    deleted = [id_ for _, id_, row in page if row is None and id_ not in live]
+    if page:
+        watermark = (*page[-1][:2], floor)
+    return changed, deleted, watermark or (0, 0, floor), more
+
+
+def prune_tombstones(days: Optional[int] = None) -> int:
+    """Deletes tombstones older than ``days``; returns how many.
+
+    The highest change_seq pruned becomes the horizon below which change
+    tokens are refused, since the deletes they have not seen are gone.
+    """
+    days = settings.CHANGE_TOMBSTONE_DAYS if days is None else days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    with sync_engine.begin() as conn:
+        horizon = conn.execute(
+            select(func.max(tombstones.c.change_seq)).where(
+                tombstones.c.deleted_at < cutoff
+            )
+        ).scalar()
+        if horizon is None:
+            return 0
+        result = conn.execute(
+            delete(tombstones).where(tombstones.c.change_seq <= horizon)
+        )
+        conn.execute(
+            update(counter)
+            .where(counter.c.id == 1, counter.c.pruned_seq < horizon)
+            .values(pruned_seq=horizon)
+        )
+    return result.rowcount
@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional
+
+from app.models import Company
+
+
+class CompanyListener:
+    """In-memory view of the company table that follows committed writes.
+
+    ``invalidate`` may be called from scheduler threads, so implementations
+    only flag themselves there and catch up on their next read.
+    """
+
+    async def load(self) -> None:
+        pass
+
+    def upsert(self, companies: List[Company]) -> None:
+        pass
+
+    def delete(self, ids: List[int]) -> None:
+        pass
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        pass
+
+
+class SnapshotListener(CompanyListener, ABC):
+    """Listener rebuilt from a full read of the table.
+
+    Writes that land while a reload is reading are queued and replayed on
+    top of the fresh snapshot, so they are not lost to the reload.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.stale = False
+        self.pending: Optional[list] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and not self.stale and self.pending is None
+
+    @abstractmethod
+    async def fetch(self) -> list:
+        ...
+
+    @abstractmethod
+    def rebuild(self, rows: list) -> None:
+        ...
+
+    @abstractmethod
+    def apply_upsert(self, companies: List[Company]) -> None:
+        ...
+
+    @abstractmethod
+    def apply_delete(self, ids: List[int]) -> None:
+        ...
+
+    async def load(self) -> None:
+        async with self._lock:
+            await self._load()
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            if self.stale or not self.loaded:
+                await self._load()
+
+    async def _load(self) -> None:
+        self.stale = False
+        self.pending = []
+        try:
+            rows = await self.fetch()
+        finally:
+            pending, self.pending = self.pending, None
+        self.rebuild(rows)
+        self.loaded = True
+        for method, args in pending:
+            method(args)
+
+    def upsert(self, companies: List[Company]) -> None:
+        if self.pending is not None:
+            self.pending.append((self.apply_upsert, companies))
+        else:
+            self.apply_upsert(companies)
+
+    def delete(self, ids: List[int]) -> None:
+        if self.pending is not None:
+            self.pending.append((self.apply_delete, ids))
+        else:
+            self.apply_delete(ids)
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        self.stale = True
+
+
+class CompanyEvents:
+    def __init__(self):
+        self.listeners: List[CompanyListener] = []
+
+    def subscribe(self, listener: CompanyListener) -> CompanyListener:
+        self.listeners.append(listener)
+        return listener
+
+    async def load(self) -> None:
+        for listener in self.listeners:
+            await listener.load()
+
+    def upserted(self, companies: Iterable[Company]) -> None:
+        companies = list(companies)
+        for listener in self.listeners:
+            listener.upsert(companies)
+
+    def deleted(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        for listener in self.listeners:
+            listener.delete(ids)
+
+    def invalidated(self, prices_only: bool = False) -> None:
+        # Rows changed outside the ORM (bulk statements, repricing); listeners
+        # reload before their next read. ``prices_only`` spares listeners that
+        # do not track prices.
+        for listener in self.listeners:
+            listener.invalidate(prices_only)
+
+
+company_events = CompanyEvents()
+
+
+class Forwarder(CompanyListener):
+    """Sends a worker process's company events to the parent's listeners.
+
+    Rows and ids stay behind; the parent invalidates instead.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def upsert(self, companies: List[Company]) -> None:
+        self.queue.put(False)
+
+    def delete(self, ids: List[int]) -> None:
+        self.queue.put(False)
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        self.queue.put(prices_only)
+
+
+class WorkerEvents:
+    """Relays the company events of ``processpool`` workers to this process.
+
+    A worker's own listeners are copies nothing reads, so ``forward``
+    replaces them there with a ``Forwarder``; a thread here hands what
+    arrives to ``company_events`` as invalidations.
+    """
+
+    def __init__(self):
+        self.queue = multiprocessing.Queue()
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def forward(queue) -> None:
+        company_events.listeners = [Forwarder(queue)]
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="worker-events", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _run(self) -> None:
+        while True:
+            prices_only = self.queue.get()
+            if prices_only is None:
+                return
+            company_events.invalidated(prices_only)
+
+
+worker_events = WorkerEvents()
@@ -0,0 +1,186 @@
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.models import Company
+from app.schemas.company import (
+    CompanyBulkErrorSchema,
+    CompanyBulkResultSchema,
+    CompanyCreateSchema,
+)
+from app.services.events import company_events
+from app.services.stats import create_company_stats
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+Line = Tuple[int, str]
+
+
+def import_format(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    return FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+async def read_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Line]:
+    # Splitting on the raw bytes is safe for UTF-8, and never holds more than
+    # one network chunk plus a partial line in memory.
+    number = 0
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8-sig" if number == 1 else "utf-8")
+    if buffer:
+        yield number + 1, buffer.decode("utf-8-sig" if not number else "utf-8")
+
+
+def format_errors(error: ValidationError) -> str:
+    return "; ".join(
+        "%s: %s" % (".".join(str(loc) for loc in e["loc"]), e["msg"])
+        for e in error.errors()
+    )
+
+
+class CompanyImport:
+    """Streams rows into ``company`` in chunks of ``chunk_size``.
+
+    Each chunk costs one duplicate lookup, one executemany insert and one
+    commit; bad rows are reported by line number and never abort the import.
+    """
+
+    def __init__(self, db: AsyncSession, chunk_size: int):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.names: Set[str] = set()
+        self.symbols: Set[str] = set()
+        self.inserted = 0
+        self.errors: List[CompanyBulkErrorSchema] = []
+
+    def reject(self, line: int, detail: str) -> None:
+        self.errors.append(CompanyBulkErrorSchema(line=line, detail=detail))
+
+    def rows(self, lines: AsyncIterator[Line], format_: str):
+        return self.csv_rows(lines) if format_ == "csv" else self.ndjson_rows(lines)
+
+    async def csv_rows(self, lines: AsyncIterator[Line]):
+        header = None
+        async for number, text in lines:
+            text = text.rstrip("\r")
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            if len(values) != len(header):
+                self.reject(
+                    number, "expected %d fields, got %d" % (len(header), len(values))
+                )
+                continue
+            yield number, dict(zip(header, values))
+
+    async def ndjson_rows(self, lines: AsyncIterator[Line]):
+        async for number, text in lines:
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as error:
+                self.reject(number, "invalid JSON: %s" % error)
+                continue
+            if not isinstance(row, dict):
+                self.reject(number, "expected a JSON object")
+                continue
+            yield number, row
+
+    async def run(self, lines: AsyncIterator[Line], format_: str):
+        chunk: List[Tuple[int, CompanyCreateSchema]] = []
+        async for number, row in self.rows(lines, format_):
+            try:
+                chunk.append((number, CompanyCreateSchema(**row)))
+            except ValidationError as error:
+                self.reject(number, format_errors(error))
+                continue
+            if len(chunk) >= self.chunk_size:
+                await self.flush(chunk)
+                chunk = []
+        if chunk:
+            await self.flush(chunk)
+        self.errors.sort(key=lambda error: error.line)
+        return CompanyBulkResultSchema(
+            inserted=self.inserted, rejected=len(self.errors), errors=self.errors
+        )
+
+    async def existing(self, chunk) -> Tuple[Set[str], Set[str]]:
+        names = [company.name for _, company in chunk]
+        symbols = [company.symbol for _, company in chunk]
+        result = await self.db.execute(
+            select(Company.name, Company.symbol).where(
+                or_(col(Company.name).in_(names), col(Company.symbol).in_(symbols))
+            )
+        )
+        rows = result.all()
+        return {name for name, _ in rows}, {symbol for _, symbol in rows}
+
+    async def flush(self, chunk) -> None:
+        inserted = self.inserted
+        try:
+            await self.insert(chunk)
+        finally:
+            # committed rows are visible now, whatever happens next
+            if self.inserted > inserted:
+                company_events.invalidated()
+
+    async def insert(self, chunk) -> None:
+        names, symbols = await self.existing(chunk)
+        rows: List[Tuple[int, Dict]] = []
+        for number, company in chunk:
+            if company.name in names or company.name in self.names:
+                self.reject(number, "Company already exists")
+            elif company.symbol in symbols or company.symbol in self.symbols:
+                self.reject(number, "Symbol already exists")
+            else:
+                self.names.add(company.name)
+                self.symbols.add(company.symbol)
+                rows.append((number, company.dict()))
+        if not rows:
+            return
+        try:
+            await self.db.execute(insert(Company), [row for _, row in rows])
+            await create_company_stats(
+                self.db,
+                Company.__table__.c.symbol.in_([row["symbol"] for _, row in rows]),
+            )
+            await self.db.commit()
+            self.inserted += len(rows)
+        except IntegrityError:
+            # A concurrent writer won the race for some name or symbol;
+            # retry row by row so only the clashing rows are rejected.
+            await self.db.rollback()
+            for number, row in rows:
+                try:
+                    await self.db.execute(insert(Company), [row])
+                    await create_company_stats(
+                        self.db, Company.__table__.c.symbol == row["symbol"]
+                    )
+                    await self.db.commit()
+                    self.inserted += 1
+                except IntegrityError:
+                    await self.db.rollback()
+                    self.reject(number, "Company or symbol already exists")
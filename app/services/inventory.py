@@ -0,0 +1,487 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.deadlines import deadline
+from app.core.tracing import current
+from app.db.database import async_session
+from app.models import Company, InventoryCheckpoint, ShareHolder
+from app.services.events import CompanyListener, company_events
+from app.services.stats import record_trade
+
+logger = logging.getLogger(__name__)
+
+company = Company.__table__
+holding = ShareHolder.__table__
+add_holding = (
+    update(holding)
+    .where(
+        holding.c.user_id == bindparam("holder_id"),
+        holding.c.company_id == bindparam("holding_company_id"),
+    )
+    .values(quantity=holding.c.quantity + bindparam("delta"))
+)
+
+
+class NotEnoughShares(Exception):
+    pass
+
+
+class UnknownCompany(LookupError):
+    pass
+
+
+class Reservation(NamedTuple):
+
+    id: str
+    seq: int
+    company_id: int
+    user_id: int
+    # negative for sells
+    quantity: float
+    reserved_at: datetime
+
+    def entry(self) -> dict:
+        return {**self._asdict(), "reserved_at": self.reserved_at.isoformat()}
+
+
+class Journal:
+    """Append-only file of reservations, fsynced before they are answered.
+
+    Reservations arriving while a write is in flight go out together in the
+    next write and fsync, so a burst of buys costs a few syncs, not one each.
+    ``rewrite`` takes its turn in the same queue, so the appends before it
+    are settled or among its entries, and those after it go to the new file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.buffer: List[
+            Tuple[Union[str, Callable[[], List[dict]]], asyncio.Future]
+        ] = []
+        self.writing: Optional[asyncio.Future] = None
+        self.fh = None
+
+    def read(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path) as fh:
+            for line in fh:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # a line torn by a crash was never acknowledged
+                    break
+        return entries
+
+    def open(self) -> None:
+        self.fh = open(self.path, "a")
+
+    def close(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    def append(self, entry: dict) -> asyncio.Future:
+        return self._queue(json.dumps(entry))
+
+    def rewrite(self, entries: Callable[[], List[dict]]) -> asyncio.Future:
+        """Replaces the file with ``entries()``, read when its turn comes."""
+        return self._queue(entries)
+
+    def _queue(self, item) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.buffer.append((item, future))
+        if self.writing is None:
+            self.writing = asyncio.ensure_future(self._drain())
+        return future
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self.buffer:
+                entries, future = self.buffer[0]
+                if callable(entries):
+                    self.buffer.pop(0)
+                    # the done callbacks of the appends before it run first
+                    await asyncio.sleep(0)
+                    lines = [json.dumps(entry) for entry in entries()]
+                    await self._run(loop, self._replace, lines, [future])
+                    continue
+                count = next(
+                    (i for i, (item, _) in enumerate(self.buffer) if callable(item)),
+                    len(self.buffer),
+                )
+                batch = self.buffer[:count]
+                del self.buffer[:count]
+                lines = [line for line, _ in batch]
+                await self._run(loop, self._write, lines, [f for _, f in batch])
+        finally:
+            self.writing = None
+
+    @staticmethod
+    async def _run(loop, write, lines: List[str], futures: List[asyncio.Future]):
+        try:
+            await loop.run_in_executor(None, write, lines)
+        except Exception as error:
+            for future in futures:
+                future.set_exception(error)
+        else:
+            for future in futures:
+                future.set_result(None)
+
+    def _write(self, lines: List[str]) -> None:
+        self.fh.write("".join(line + "\n" for line in lines))
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def _replace(self, lines: List[str]) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as fh:
+            fh.write("".join(line + "\n" for line in lines))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temporary, self.path)
+        self.fh.close()
+        self.fh = open(self.path, "a")
+
+    def truncate(self) -> None:
+        # only with nothing in flight: every entry is in the database
+        if self.writing is None and not self.buffer:
+            self.fh.truncate(0)
+
+
+async def apply_reservations(
+    db: AsyncSession, company_id: int, reservations: List[Reservation]
+) -> None:
+    """Writes a company's reservations as deltas, with their checkpoint.
+
+    One transaction moves the shares, the holdings, the stats and the
+    checkpoint, so replaying the journal after a crash skips exactly the
+    reservations that made it. Returns False, having written nothing, when
+    the company is gone.
+    """
+    deltas: Dict[int, float] = defaultdict(float)
+    for reservation in reservations:
+        deltas[reservation.user_id] += reservation.quantity
+    total = sum(deltas.values())
+    result = await db.execute(
+        update(company)
+        .where(company.c.id == company_id)
+        .values(available_shares=company.c.available_shares - total)
+    )
+    if not result.rowcount:
+        return False
+    result = await db.execute(
+        select(holding.c.user_id, holding.c.quantity).where(
+            holding.c.company_id == company_id, holding.c.user_id.in_(list(deltas))
+        )
+    )
+    before = dict(result.all())
+    holders = 0
+    for user_id, delta in deltas.items():
+        was, now = before.get(user_id, 0), before.get(user_id, 0) + delta
+        holders += (now > 0) - (was > 0)
+    updates = [
+        {"holder_id": user_id, "holding_company_id": company_id, "delta": delta}
+        for user_id, delta in deltas.items()
+        if user_id in before
+    ]
+    if updates:
+        await db.execute(add_holding, updates)
+    inserts = [
+        {"user_id": user_id, "company_id": company_id, "quantity": delta}
+        for user_id, delta in deltas.items()
+        if user_id not in before
+    ]
+    if inserts:
+        await db.execute(insert(holding), inserts)
+    await record_trade(db, company_id, total, holders)
+    await db.merge(
+        InventoryCheckpoint(
+            company_id=company_id, seq=max(item.seq for item in reservations)
+        )
+    )
+    return True
+
+
+class Inventory(CompanyListener):
+    """Available shares of the hot symbols, reserved in memory.
+
+    A buy checks and takes shares with no await in between, so reservations
+    on a symbol never wait on each other or on SQLite's writer. Sells check
+    the seller's holding, which needs the database, so they take the
+    company's lock, as do flushes. Each reservation is journaled before it is
+    answered and written to the database by the next flush.
+    """
+
+    def __init__(self, symbols: List[str], interval: float, journal: Journal):
+        self.symbols = set(symbols)
+        self.interval = interval
+        self.journal = journal
+        self.available: Dict[int, float] = {}
+        # journaled, waiting for the next flush
+        self.pending: Dict[int, List[Reservation]] = {}
+        # reserved but not yet in the database, per company and per holding
+        self.outstanding: Dict[int, float] = defaultdict(float)
+        self.unflushed: Dict[Tuple[int, int], float] = defaultdict(float)
+        self.unsettled = 0
+        # journaled and unsettled, by seq: what a rewritten journal keeps
+        self.journaled: Dict[int, Reservation] = {}
+        self.seq = 0
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    def manages(self, company_id: int) -> bool:
+        return company_id in self.available
+
+    async def load(self) -> None:
+        if not self.symbols or self.task is not None:
+            return
+        entries = self.journal.read()
+        async with async_session() as db:
+            result = await db.execute(
+                select(InventoryCheckpoint.company_id, InventoryCheckpoint.seq)
+            )
+            checkpoints = dict(result.all())
+            await self.replay(db, entries, checkpoints)
+            result = await db.execute(
+                select(Company.id, Company.available_shares).where(
+                    Company.symbol.in_(self.symbols)
+                )
+            )
+            self.available = dict(result.all())
+        self.seq = max(
+            [entry["seq"] for entry in entries] + list(checkpoints.values()) + [0]
+        )
+        self.locks = {company_id: asyncio.Lock() for company_id in self.available}
+        self.journal.open()
+        self.journal.truncate()
+        self.task = asyncio.create_task(self._flush_periodically())
+
+    async def replay(
+        self, db: AsyncSession, entries: List[dict], checkpoints: Dict[int, int]
+    ) -> None:
+        # reservations acknowledged before a crash but never flushed; a
+        # rewrite can repeat an entry written just before it
+        unapplied: Dict[int, List[Reservation]] = defaultdict(list)
+        for entry in {entry["seq"]: entry for entry in entries}.values():
+            if entry["seq"] > checkpoints.get(entry["company_id"], 0):
+                entry["reserved_at"] = datetime.fromisoformat(entry["reserved_at"])
+                unapplied[entry["company_id"]].append(Reservation(**entry))
+        result = await db.execute(
+            select(Company.id).where(Company.id.in_(list(unapplied)))
+        )
+        existing = set(result.scalars().all())
+        for company_id, reservations in unapplied.items():
+            if company_id in existing:
+                await apply_reservations(db, company_id, reservations)
+        await db.commit()
+        if unapplied:
+            logger.info(
+                "replayed %d journaled reservations",
+                sum(len(items) for items in unapplied.values()),
+            )
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        await self.flush()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.journal.writing is not None:
+            await self.journal.writing
+        self.journal.close()
+
+    async def buy(self, user_id: int, company_id: int, quantity: float):
+        if company_id not in self.available:
+            raise UnknownCompany()
+        if quantity <= 0 or self.available[company_id] < quantity:
+            raise NotEnoughShares()
+        self.available[company_id] -= quantity
+        reservation, journaled = self._reserve(user_id, company_id, quantity)
+        await asyncio.shield(journaled)
+        return reservation
+
+    async def sell(self, user_id: int, company_id: int, quantity: float):
+        async with self.locks[company_id]:
+            if company_id not in self.available:
+                raise UnknownCompany()
+            async with async_session() as db:
+                result = await db.execute(
+                    select(ShareHolder.quantity).where(
+                        ShareHolder.user_id == user_id,
+                        ShareHolder.company_id == company_id,
+                    )
+                )
+                held = result.scalar_one_or_none() or 0
+            held += self.unflushed[(user_id, company_id)]
+            if company_id not in self.available:
+                raise UnknownCompany()
+            if quantity <= 0 or held < quantity:
+                raise NotEnoughShares()
+            self.available[company_id] += quantity
+            # counted in unflushed from here on, so the lock can go
+            reservation, journaled = self._reserve(user_id, company_id, -quantity)
+        await asyncio.shield(journaled)
+        return reservation
+
+    def _reserve(
+        self, user_id: int, company_id: int, quantity: float
+    ) -> Tuple[Reservation, asyncio.Future]:
+        self.seq += 1
+        reservation = Reservation(
+            uuid.uuid4().hex,
+            self.seq,
+            company_id,
+            user_id,
+            quantity,
+            datetime.now(timezone.utc),
+        )
+        self.outstanding[company_id] += quantity
+        self.unflushed[(user_id, company_id)] += quantity
+        self.unsettled += 1
+        journaled = self.journal.append(reservation.entry())
+        # Settled by the journal write, not by the request: once written, it
+        # is flushed even if the client has gone away.
+        journaled.add_done_callback(partial(self._journaled, reservation))
+        return reservation, journaled
+
+    def _journaled(self, reservation: Reservation, future: asyncio.Future) -> None:
+        if reservation.company_id not in self.available:
+            # deleted while being journaled
+            self._settled([reservation])
+        elif future.exception() is None:
+            self.pending.setdefault(reservation.company_id, []).append(reservation)
+            self.journaled[reservation.seq] = reservation
+        else:
+            self.available[reservation.company_id] += reservation.quantity
+            self._settled([reservation])
+
+    def _settled(self, reservations: List[Reservation]) -> None:
+        for reservation in reservations:
+            key = (reservation.user_id, reservation.company_id)
+            self.outstanding[reservation.company_id] -= reservation.quantity
+            self.unflushed[key] -= reservation.quantity
+            if not self.unflushed[key]:
+                del self.unflushed[key]
+            self.journaled.pop(reservation.seq, None)
+        self.unsettled -= len(reservations)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        flushed: Set[int] = set()
+        for company_id in list(self.pending):
+            async with self.locks[company_id]:
+                batch = self.pending.pop(company_id, None)
+                if not batch:
+                    continue
+                try:
+                    async with async_session() as db:
+                        applied = await apply_reservations(db, company_id, batch)
+                        await db.commit()
+                except Exception:
+                    logger.exception("flushing reservations of %d failed", company_id)
+                    self.pending[company_id] = batch + self.pending.get(company_id, [])
+                    continue
+                self._settled(batch)
+                if applied:
+                    flushed.add(company_id)
+        if not flushed:
+            return
+        # Keep only what is not in the database yet, so the journal and its
+        # replay stay as small as one flush interval of traffic.
+        self.journal.rewrite(self._journal_entries).add_done_callback(self._rewritten)
+        async with async_session() as db:
+            result = await db.execute(
+                select(*company.columns).where(company.c.id.in_(flushed))
+            )
+            companies = result.all()
+        company_events.upserted(companies)
+
+    def _journal_entries(self) -> List[dict]:
+        return [self.journaled[seq].entry() for seq in sorted(self.journaled)]
+
+    @staticmethod
+    def _rewritten(future: asyncio.Future) -> None:
+        if future.exception() is not None:
+            logger.error("rewriting the journal failed: %r", future.exception())
+
+    def upsert(self, companies: List[Company]) -> None:
+        # Committed rows, including edits of available_shares. A row may have
+        # been read before a flush that committed since, so it can only lower
+        # the counter here; the exact count is re-read under the lock.
+        ids = []
+        for row in companies:
+            if row.id in self.available:
+                self.available[row.id] = min(
+                    self.available[row.id],
+                    row.available_shares - self.outstanding[row.id],
+                )
+                ids.append(row.id)
+        if ids:
+            task = asyncio.ensure_future(self._rebase(ids))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _rebase(self, ids: List[int]) -> None:
+        # spawned from a request, but neither bound by its deadline nor
+        # part of its trace
+        deadline.set(None)
+        current.set(None)
+        for company_id in ids:
+            # flushes and sells hold the lock, so the row and outstanding agree
+            async with self.locks[company_id]:
+                try:
+                    async with async_session() as db:
+                        result = await db.execute(
+                            select(Company.available_shares).where(
+                                Company.id == company_id
+                            )
+                        )
+                        shares = result.scalar_one_or_none()
+                except Exception:
+                    logger.exception("re-reading shares of %d failed", company_id)
+                    continue
+                if shares is not None and company_id in self.available:
+                    self.available[company_id] = shares - self.outstanding[company_id]
+
+    def delete(self, ids: List[int]) -> None:
+        managed = [company_id for company_id in ids if company_id in self.available]
+        for company_id in managed:
+            del self.available[company_id]
+            # nothing left to write them to
+            self._settled(self.pending.pop(company_id, []))
+        if managed and self.task is not None:
+            # nor to replay them onto, should the id be reused
+            self.journal.rewrite(self._journal_entries).add_done_callback(
+                self._rewritten
+            )
+
+
+inventory = company_events.subscribe(
+    Inventory(
+        settings.HOT_SYMBOLS,
+        settings.INVENTORY_FLUSH_INTERVAL,
+        Journal(settings.INVENTORY_JOURNAL),
+    )
+)
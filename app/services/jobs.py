@@ -0,0 +1,319 @@
+import asyncio
+import csv
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import numpy as np
+from apscheduler.jobstores.base import JobLookupError
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.config import settings
+from app.core.cron import scheduler
+from app.db.database import async_session, sync_engine
+from app.models import Company, CompanyStats, Job, ShareHolder
+from app.services.imports import CompanyImport, read_lines
+from app.services.portfolio import PARTITION_SIZE, base_prices, snapshot_portfolios
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+UNFINISHED = (QUEUED, RUNNING)
+# files a job may leave in JOB_RESULTS_DIR: its result and its input
+SUFFIXES = (".csv", ".upload")
+UPLOAD_CHUNK = 1024 * 1024
+
+table = Job.__table__
+
+
+def job_path(job_id: str, suffix: str) -> str:
+    return os.path.join(settings.JOB_RESULTS_DIR, job_id + suffix)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to a job body to report progress from the worker process.
+
+    Progress writes are throttled to one per ``interval`` seconds. Each write
+    only matches a running job, so a job cancelled through the API stops at
+    its next report.
+    """
+
+    def __init__(self, job_id: str, user_id: int, params: dict, interval: float = 0.5):
+        self.id = job_id
+        self.user_id = user_id
+        self.params = params
+        self.interval = interval
+        self.reported = 0.0
+
+    def progress(self, done: int, total: int) -> None:
+        now = time.monotonic()
+        if now - self.reported < self.interval:
+            return
+        self.reported = now
+        with sync_engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.id == self.id, table.c.status == RUNNING)
+                .values(progress=round(done / total, 4) if total else 0)
+            )
+        if not result.rowcount:
+            raise JobCancelled()
+
+    def path(self, suffix: str) -> str:
+        os.makedirs(settings.JOB_RESULTS_DIR, exist_ok=True)
+        return job_path(self.id, suffix)
+
+
+def stream(conn, statement, total: int, job: JobContext, writer) -> int:
+    # plain DBAPI rows, as in snapshot_portfolios
+    cursor = conn.connection.cursor()
+    cursor.execute(str(statement.compile(sync_engine)))
+    written = 0
+    while True:
+        rows = cursor.fetchmany(PARTITION_SIZE // 10)
+        if not rows:
+            break
+        writer.writerows(rows)
+        written += len(rows)
+        job.progress(written, total)
+    cursor.close()
+    return written
+
+
+def export_companies(job: JobContext) -> dict:
+    path = job.path(".csv")
+    columns = (
+        Company.id,
+        Company.symbol,
+        Company.name,
+        Company.currency,
+        Company.price,
+        Company.available_shares,
+        CompanyStats.holders,
+        CompanyStats.held_quantity,
+        CompanyStats.market_cap,
+        CompanyStats.market_cap_base,
+    )
+    statement = (
+        select(*columns)
+        .outerjoin(CompanyStats, CompanyStats.company_id == Company.id)
+        .order_by(Company.id)
+    )
+    with sync_engine.connect() as conn, open(path, "w", newline="") as output:
+        total = conn.execute(select(func.count(Company.id))).scalar_one()
+        writer = csv.writer(output)
+        writer.writerow([column.key for column in columns])
+        rows = stream(conn, statement, total, job, writer)
+    return {"rows": rows}
+
+
+def export_holdings(job: JobContext) -> dict:
+    currency = job.params.get("currency") or settings.BASE_CURRENCY
+    path = job.path(".csv")
+    with sync_engine.connect() as conn, open(path, "w", newline="") as output:
+        company_ids, prices = base_prices(conn, currency)
+        holdings = conn.execute(
+            select(Company.id, Company.symbol, Company.name, ShareHolder.quantity)
+            .join(ShareHolder, ShareHolder.company_id == Company.id)
+            .where(ShareHolder.user_id == job.user_id, ShareHolder.quantity > 0)
+            .order_by(Company.symbol)
+        ).all()
+        writer = csv.writer(output)
+        writer.writerow(["symbol", "name", "quantity", "price", "value", "currency"])
+        slots = np.searchsorted(company_ids, [row[0] for row in holdings])
+        total = 0.0
+        for done, (row, slot) in enumerate(zip(holdings, slots.tolist()), 1):
+            price = float(prices[slot])
+            value = round(price * row[3], 2)
+            total += value
+            writer.writerow([row[1], row[2], row[3], round(price, 4), value, currency])
+            job.progress(done, len(holdings))
+    return {"rows": len(holdings), "value": round(total, 2)}
+
+
+def take_portfolio_snapshots(job: JobContext) -> dict:
+    return {"snapshots": snapshot_portfolios(job.params.get("currency"))}
+
+
+async def read_upload(path: str, job: JobContext) -> AsyncIterator[bytes]:
+    size = os.path.getsize(path)
+    with open(path, "rb") as upload:
+        while True:
+            chunk = upload.read(UPLOAD_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+            job.progress(upload.tell(), size)
+
+
+async def run_import(job: JobContext, path: str):
+    async with async_session() as db:
+        task = CompanyImport(db, settings.BULK_IMPORT_CHUNK_SIZE)
+        return await task.run(read_lines(read_upload(path, job)), job.params["format"])
+
+
+def import_companies(job: JobContext) -> dict:
+    # Chunks already committed stay when the job is cancelled or fails.
+    result = asyncio.run(run_import(job, job.path(".upload")))
+    with open(job.path(".csv"), "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(["line", "detail"])
+        writer.writerows((error.line, error.detail) for error in result.errors)
+    os.remove(job.path(".upload"))
+    return {"inserted": result.inserted, "rejected": result.rejected}
+
+
+KINDS: Dict[str, Callable[[JobContext], dict]] = {
+    "export_companies": export_companies,
+    "export_holdings": export_holdings,
+    "snapshot_portfolios": take_portfolio_snapshots,
+    "import_companies": import_companies,
+}
+
+
+def finish(job_id: str, status: str, **values) -> None:
+    with sync_engine.begin() as conn:
+        conn.execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status == RUNNING)
+            .values(status=status, finished_at=datetime.now(timezone.utc), **values)
+        )
+
+
+def run_job(job_id: str) -> None:
+    """Runs a queued job; called in a ``processpool`` worker."""
+    with sync_engine.begin() as conn:
+        started = conn.execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status == QUEUED)
+            .values(status=RUNNING, started_at=datetime.now(timezone.utc))
+        ).rowcount
+        if not started:
+            # cancelled while waiting for a worker
+            return
+        kind, user_id, params = conn.execute(
+            select(table.c.kind, table.c.user_id, table.c.params).where(
+                table.c.id == job_id
+            )
+        ).one()
+    job = JobContext(job_id, user_id, json.loads(params))
+    try:
+        result = KINDS[kind](job)
+    except JobCancelled:
+        remove_result(job_id)
+    except Exception as error:
+        remove_result(job_id)
+        finish(job_id, FAILED, error=repr(error))
+    else:
+        finish(job_id, SUCCEEDED, progress=1, result=json.dumps(result))
+
+
+def remove_result(job_id: str) -> None:
+    for suffix in SUFFIXES:
+        path = job_path(job_id, suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def enqueue(job_id: str) -> None:
+    # The pool has JOB_CONCURRENCY workers; further jobs wait in its queue.
+    scheduler.add_job(
+        run_job,
+        args=[job_id],
+        id="job-%s" % job_id,
+        jobstore="jobs",
+        executor="processpool",
+        misfire_grace_time=None,
+        replace_existing=True,
+    )
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+async def create_job(
+    db: AsyncSession,
+    user_id: int,
+    kind: str,
+    params: dict,
+    job_id: Optional[str] = None,
+) -> Job:
+    job = Job(
+        id=job_id or new_job_id(),
+        user_id=user_id,
+        kind=kind,
+        params=json.dumps(params),
+        created_at=datetime.now(timezone.utc),
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    enqueue(job.id)
+    return job
+
+
+async def queued_jobs(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(
+        select(func.count(col(Job.id))).where(
+            Job.user_id == user_id, col(Job.status).in_(UNFINISHED)
+        )
+    )
+    return result.scalar_one()
+
+
+async def cancel_job(db: AsyncSession, job: Job) -> bool:
+    result = await db.execute(
+        update(table)
+        .where(table.c.id == job.id, table.c.status.in_(UNFINISHED))
+        .values(status=CANCELLED, finished_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+    if not result.rowcount:
+        return False
+    try:
+        scheduler.remove_job("job-%s" % job.id, jobstore="jobs")
+    except JobLookupError:
+        # already handed to a worker, which checks the status itself
+        pass
+    else:
+        remove_result(job.id)
+    return True
+
+
+async def recover_jobs() -> int:
+    # Jobs live in an in-memory job store, so requeue them after a restart;
+    # whatever was running when the process died is reported as failed.
+    async with async_session() as db:
+        result = await db.execute(select(Job.id).where(Job.status == RUNNING))
+        for job_id in result.scalars().all():
+            remove_result(job_id)
+        await db.execute(
+            update(table)
+            .where(table.c.status == RUNNING)
+            .values(
+                status=FAILED,
+                error="Interrupted by a restart",
+                finished_at=datetime.now(timezone.utc),
+            )
+        )
+        await db.commit()
+        result = await db.execute(
+            select(Job.id).where(Job.status == QUEUED).order_by(Job.created_at)
+        )
+        queued = result.scalars().all()
+    for job_id in queued:
+        enqueue(job_id)
+    return len(queued)
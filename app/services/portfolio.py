@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.config import settings
+from app.db.database import sync_engine
+from app.models import Company, PortfolioSnapshot, Rate, ShareHolder, User
+
+# holdings read per round trip while streaming the shareholder table
+PARTITION_SIZE = 100_000
+
+
+def base_prices(conn, base: str):
+    """Company ids (sorted) and their share prices converted to ``base``.
+
+    Rates are all quoted against the same provider base, so converting goes
+    through it exactly like ``convert_currency`` does.
+    """
+    rates: Dict[str, float] = {
+        currency: rate
+        for currency, rate in conn.execute(select(Rate.currency, Rate.rate))
+    }
+    to_rate = rates.get(base)
+    if to_rate is None:
+        raise ValueError("no exchange rate for base currency %r" % base)
+    rows = conn.execute(
+        select(Company.id, Company.price, Company.currency).order_by(Company.id)
+    ).all()
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    prices = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    # a listing in a currency with no rate cannot be valued; count it as 0
+    factors = np.array(
+        [to_rate / rates[row[2]] if row[2] in rates else 0.0 for row in rows],
+        dtype=np.float64,
+    )
+    return ids, prices * factors
+
+
+def snapshot_portfolios(base: Optional[str] = None) -> int:
+    """Value every user's holdings in ``base`` and store one snapshot each.
+
+    Holdings are streamed in partitions and summed per user with
+    ``np.bincount``, so memory stays proportional to users, not holdings.
+    Returns the number of snapshots written.
+    """
+    base = base or settings.BASE_CURRENCY
+    taken_at = datetime.now(timezone.utc)
+    with sync_engine.connect() as conn:
+        company_ids, prices = base_prices(conn, base)
+        user_ids = np.array(conn.execute(select(User.id)).scalars().all(), np.int64)
+        size = int(user_ids.max()) + 1 if len(user_ids) else 0
+        values = np.zeros(size, dtype=np.float64)
+        counts = np.zeros(size, dtype=np.int64)
+
+        statement = select(
+            ShareHolder.user_id, ShareHolder.company_id, ShareHolder.quantity
+        ).where(
+            col(ShareHolder.user_id).isnot(None),
+            col(ShareHolder.company_id).isnot(None),
+        )
+        # Plain DBAPI tuples: a Row object per holding costs more than the maths.
+        cursor = conn.connection.cursor()
+        cursor.execute(str(statement.compile(sync_engine)))
+        while len(company_ids):
+            partition = cursor.fetchmany(PARTITION_SIZE)
+            if not partition:
+                break
+            holdings = np.array(partition, dtype=np.float64).reshape(-1, 3)
+            users = holdings[:, 0].astype(np.int64)
+            companies = holdings[:, 1].astype(np.int64)
+            quantity = holdings[:, 2]
+            slots = np.searchsorted(company_ids, companies)
+            slots[slots == len(company_ids)] = 0
+            known = (company_ids[slots] == companies) & (users < size)
+            value = np.where(known, quantity * prices[slots], 0.0)
+            values += np.bincount(users, weights=value, minlength=size)[:size]
+            counts += np.bincount(
+                users, weights=(known & (quantity > 0)), minlength=size
+            )[:size].astype(np.int64)
+        cursor.close()
+
+    rows = [
+        {
+            "user_id": user_id,
+            "taken_at": taken_at,
+            "currency": base,
+            "value": round(value, 2),
+            "holdings": holdings,
+        }
+        for user_id, value, holdings in zip(
+            user_ids.tolist(),
+            values[user_ids].tolist(),
+            counts[user_ids].tolist(),
+        )
+    ]
+    with sync_engine.begin() as conn:
+        for start in range(0, len(rows), PARTITION_SIZE):
+            end = start + PARTITION_SIZE
+            conn.execute(insert(PortfolioSnapshot), rows[start:end])
+    return len(rows)
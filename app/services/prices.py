@@ -0,0 +1,88 @@
+from typing import Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Float, Numeric, bindparam, cast, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.models import Company
+from app.schemas.company import CompanyPatchSchema
+from app.services.events import company_events
+from app.services.imports import format_errors
+from app.services.stats import refresh_market_caps
+
+# bound parameters per IN lookup; SQLite allows 32766 since 3.32
+LOOKUP_CHUNK = 5000
+
+table = Company.__table__
+set_price = (
+    update(table)
+    .where(table.c.id == bindparam("row_id"))
+    .values(price=bindparam("new_price"))
+)
+# Keeps listing prices constant in the provider's base currency when a rate
+# moves; the cast makes ROUND(x, 2) valid on PostgreSQL as well.
+ratio = bindparam("new_rate", type_=Float) / bindparam("old_rate", type_=Float)
+reprice = (
+    update(table)
+    .where(table.c.currency == bindparam("rate_currency"))
+    .values(price=func.round(cast(ratio * table.c.price, Numeric), 2))
+)
+
+
+def chunks(items: list, size: int = LOOKUP_CHUNK):
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+async def apply_prices(
+    db: AsyncSession, prices: Dict[str, float]
+) -> Tuple[int, Dict[str, str]]:
+    """Set ``company.price`` by symbol in one executemany ``UPDATE``.
+
+    Returns how many symbols were applied and why the others were rejected.
+    Prices equal to the stored one count as applied but are not written, so
+    ``updated_at`` only moves for real changes.
+    """
+    rejected: Dict[str, str] = {}
+    wanted: Dict[str, float] = {}
+    for symbol, price in prices.items():
+        try:
+            wanted[symbol.strip().upper()] = CompanyPatchSchema(price=price).price
+        except ValidationError as error:
+            rejected[symbol] = format_errors(error)
+
+    current: Dict[str, Tuple[int, float]] = {}
+    for symbols in chunks(list(wanted)):
+        result = await db.execute(
+            select(Company.symbol, Company.id, Company.price).where(
+                col(Company.symbol).in_(symbols)
+            )
+        )
+        current.update((symbol, (id_, price)) for symbol, id_, price in result)
+
+    changes: List[dict] = []
+    applied = 0
+    for symbol, price in wanted.items():
+        found = current.get(symbol)
+        if found is None:
+            rejected[symbol] = "Company not found"
+            continue
+        applied += 1
+        if found[1] != price:
+            changes.append({"row_id": found[0], "new_price": price})
+
+    if changes:
+        await db.execute(set_price, changes)
+        await refresh_market_caps(db, [change["row_id"] for change in changes])
+        await db.commit()
+        # read back the updated_at the UPDATE set, without the
+        # eager-loaded shareholders a full ORM load would drag in
+        rows = []
+        for ids in chunks([change["row_id"] for change in changes]):
+            result = await db.execute(select(*table.columns).where(table.c.id.in_(ids)))
+            rows.extend(result.all())
+        company_events.upserted(rows)
+    return applied, rejected
@@ -0,0 +1,134 @@
+import asyncio
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.database import async_session, sync_engine
+from app.models import RateHistory
+from app.services.prices import chunks
+from app.services.screener import timestamp
+
+table = RateHistory.__table__
+
+
+def close_of(day: date) -> datetime:
+    # as-of lookups for a day see every rate observed during it
+    return datetime.combine(day, time.max, tzinfo=timezone.utc)
+
+
+class RateHistoryIndex:
+    """Every currency's rate history as sorted parallel time/rate lists.
+
+    ``rate_at`` bisects the observation times, so an as-of lookup costs
+    O(log n) per currency. ``load_curreny`` and compaction run on scheduler
+    threads and only flag the index stale; it reloads on its next read.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, List[int]] = {}
+        self.rates: Dict[str, List[float]] = {}
+        self.loaded = False
+        self.stale = False
+        # bumped on every change, for ETags of as-of conversions
+        self.version = 0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            if self.stale or not self.loaded:
+                await self._load()
+
+    async def _load(self) -> None:
+        self.stale = False
+        async with async_session() as session:
+            result = await session.execute(
+                select(table.c.currency, table.c.rate, table.c.observed_at).order_by(
+                    table.c.currency, table.c.observed_at, table.c.id
+                )
+            )
+            rows = result.all()
+        times: Dict[str, List[int]] = {}
+        rates: Dict[str, List[float]] = {}
+        for currency, rate, observed_at in rows:
+            if currency not in times:
+                times[currency], rates[currency] = [], []
+            times[currency].append(timestamp(observed_at))
+            rates[currency].append(rate)
+        self.times, self.rates = times, rates
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        self.stale = True
+        self.version += 1
+
+    def rate_at(self, currency: str, when: datetime) -> Optional[float]:
+        times = self.times.get(currency)
+        if not times:
+            return None
+        index = bisect_right(times, timestamp(when)) - 1
+        return self.rates[currency][index] if index >= 0 else None
+
+    async def convert(self, from_: str, to: str, amount: float, as_of: date) -> float:
+        await self.refresh()
+        when = close_of(as_of)
+        from_rate = self.rate_at(from_, when)
+        to_rate = self.rate_at(to, when)
+        if not from_rate or to_rate is None:
+            raise LookupError(
+                "No exchange rate for %s/%s as of %s" % (from_, to, as_of)
+            )
+        return round(to_rate / from_rate * amount, 2)
+
+
+def compact_rate_history(days: Optional[int] = None) -> int:
+    """Keep only each day's close for observations older than ``days``.
+
+    The close is the last rate observed that day, which is also what an as-of
+    lookup for the day returns, so compaction never changes a lookup result.
+    Returns the number of rows deleted.
+    """
+    days = settings.RATE_HISTORY_RAW_DAYS if days is None else days
+    today = datetime.now(timezone.utc).date()
+    cutoff = datetime.combine(today - timedelta(days=days), time.min, timezone.utc)
+    with sync_engine.connect() as conn:
+        rows = conn.execute(
+            select(table.c.id, table.c.currency, table.c.observed_at)
+            .where(table.c.observed_at < cutoff)
+            .order_by(table.c.currency, table.c.observed_at, table.c.id)
+        ).all()
+    closes: Dict[tuple, int] = {}
+    for id_, currency, observed_at in rows:
+        # later rows overwrite earlier ones, leaving the close of each day
+        closes[(currency, observed_at.date())] = id_
+    kept = set(closes.values())
+    stale = [row[0] for row in rows if row[0] not in kept]
+    with sync_engine.begin() as conn:
+        for ids in chunks(stale):
+            conn.execute(delete(table).where(table.c.id.in_(ids)))
+    if stale:
+        rate_history.invalidate()
+    return len(stale)
+
+
+rate_history = RateHistoryIndex()
+
+
+class RateVersion:
+    """Counts this process's writes to the ``rate`` table.
+
+    ETags of conversions at the current rates carry it. ``load_curreny``
+    bumps it from a scheduler thread once its changes are committed.
+    """
+
+    def __init__(self):
+        self.version = 0
+
+    def bump(self) -> None:
+        self.version += 1
+
+
+current_rates = RateVersion()
@@ -0,0 +1,269 @@
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.future import select
+from sqlmodel import col
+
+from app.core.config import settings
+from app.db.database import async_session
+from app.models import Company
+from app.services.events import SnapshotListener, company_events
+
+Bound = Optional[Tuple[str, float]]
+
+COLUMNS = {"price": Company.price, "available": Company.available_shares}
+ORDER_COLUMNS = {"price": Company.price, "updated_at": Company.updated_at}
+
+
+class Screen(NamedTuple):
+
+    currency: Optional[str] = None
+    price: Bound = None
+    available: Bound = None
+    # (column, descending) pairs, most significant first
+    order: List[Tuple[str, bool]] = []
+    limit: Optional[int] = None
+
+    def covered(self) -> bool:
+        # LIKE wildcards in the currency filter are left to SQL.
+        return self.currency is None or not any(c in self.currency for c in "%_")
+
+    def where(self) -> list:
+        clauses = []
+        if self.currency is not None:
+            clauses.append(col(Company.currency).contains(self.currency))
+        for name, bound in (("price", self.price), ("available", self.available)):
+            if bound is not None:
+                op, value = bound
+                column = COLUMNS[name]
+                if op == "eq":
+                    clauses.append(column == value)
+                elif op == "gt":
+                    clauses.append(column > value)
+                else:
+                    clauses.append(column < value)
+        return clauses
+
+    def order_by(self) -> list:
+        # ids break ties, so both paths page through results identically
+        return [
+            col(ORDER_COLUMNS[name]).desc()
+            if descending
+            else col(ORDER_COLUMNS[name]).asc()
+            for name, descending in self.order
+        ] + [col(Company.id).asc()]
+
+
+def timestamp(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+class CompanyScreener(SnapshotListener):
+    """Columnar snapshot of ``company`` for vectorized screener queries.
+
+    Rows live in fixed-capacity NumPy columns addressed through ``slots``.
+    Deleted rows are only masked out of ``alive`` until the next compaction.
+    """
+
+    numeric = {
+        "ids": np.int64,
+        "price": np.float64,
+        "available": np.int64,
+        "currency": np.int32,
+        "updated": np.int64,
+        "alive": np.bool_,
+    }
+    objects = ("name", "symbol", "created_at", "updated_at")
+
+    def __init__(self, capacity: int = 1024):
+        super().__init__()
+        self.size = 0
+        self.dead = 0
+        self.slots: Dict[int, int] = {}
+        self.codes: Dict[str, int] = {}
+        self.currencies: List[str] = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        for name, dtype in self.numeric.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        for name in self.objects:
+            setattr(self, name, np.empty(capacity, dtype=object))
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        for name in (*self.numeric, *self.objects):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def _code(self, currency: str) -> int:
+        code = self.codes.get(currency)
+        if code is None:
+            code = self.codes[currency] = len(self.currencies)
+            self.currencies.append(currency)
+        return code
+
+    def _write(self, slot: int, company: Company) -> None:
+        self.ids[slot] = company.id
+        self.price[slot] = company.price
+        self.available[slot] = company.available_shares
+        self.currency[slot] = self._code(company.currency)
+        self.updated[slot] = timestamp(company.updated_at)
+        self.alive[slot] = True
+        self.name[slot] = company.name
+        self.symbol[slot] = company.symbol
+        self.created_at[slot] = company.created_at
+        self.updated_at[slot] = company.updated_at
+
+    def rebuild(self, companies: List[Company]) -> None:
+        count = len(companies)
+        self._allocate(max(1024, count))
+        self.size, self.dead = count, 0
+        self.slots = {company.id: slot for slot, company in enumerate(companies)}
+        if count:
+            self.ids[:count] = [company.id for company in companies]
+            self.price[:count] = [company.price for company in companies]
+            self.available[:count] = [c.available_shares for c in companies]
+            self.currency[:count] = [self._code(c.currency) for c in companies]
+            self.updated[:count] = [timestamp(c.updated_at) for c in companies]
+            self.alive[:count] = True
+            for name in self.objects:
+                getattr(self, name)[:count] = [getattr(c, name) for c in companies]
+
+    async def load(self) -> None:
+        if settings.SCREENER_ENABLED:
+            await super().load()
+
+    async def fetch(self) -> list:
+        async with async_session() as session:
+            result = await session.execute(select(*Company.__table__.columns))
+            return result.all()
+
+    def apply_upsert(self, companies: List[Company]) -> None:
+        self._grow(self.size + len(companies))
+        for company in companies:
+            slot = self.slots.get(company.id)
+            if slot is None:
+                slot = self.slots[company.id] = self.size
+                self.size += 1
+            self._write(slot, company)
+
+    def apply_delete(self, ids: List[int]) -> None:
+        for id_ in ids:
+            slot = self.slots.pop(id_, None)
+            if slot is not None:
+                self.alive[slot] = False
+                self.dead += 1
+        if self.dead > 1024 and self.dead * 2 > self.size:
+            self._compact()
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.alive[: self.size])
+        for name in (*self.numeric, *self.objects):
+            column = getattr(self, name)
+            column[: len(keep)] = column[keep]
+        size = self.size = len(keep)
+        self.dead = 0
+        self.alive[size:] = False
+        self.slots = {int(id_): slot for slot, id_ in enumerate(self.ids[: self.size])}
+
+    def version_of(self, id_: int) -> Optional[Tuple[datetime, str]]:
+        if not self.ready:
+            return None
+        slot = self.slots.get(id_)
+        return None if slot is None else (self.updated_at[slot], self.symbol[slot])
+
+    @staticmethod
+    def _compare(column: np.ndarray, bound: Tuple[str, float]) -> np.ndarray:
+        op, value = bound
+        if op == "eq":
+            return column == value
+        if op == "gt":
+            return column > value
+        return column < value
+
+    def _sort_key(self, name: str, rows: np.ndarray, descending: bool) -> np.ndarray:
+        column = (self.price if name == "price" else self.updated)[rows]
+        return -column if descending else column
+
+    def _select(self, screen: Screen) -> np.ndarray:
+        n = self.size
+        mask = self.alive[:n].copy()
+        if screen.currency is not None:
+            needle = screen.currency.lower()
+            # SQLite's LIKE is case-insensitive for ASCII; match that.
+            allowed = np.array(
+                [needle in currency.lower() for currency in self.currencies],
+                dtype=np.bool_,
+            )
+            mask &= allowed[self.currency[:n]]
+        if screen.price is not None:
+            mask &= self._compare(self.price[:n], screen.price)
+        if screen.available is not None:
+            mask &= self._compare(self.available[:n], screen.available)
+        rows = np.flatnonzero(mask)
+
+        if not screen.order:
+            rows = rows[np.argsort(self.ids[rows], kind="stable")]
+            return rows[: screen.limit] if screen.limit else rows
+
+        if screen.limit and len(rows) > screen.limit and len(screen.order) == 1:
+            name, descending = screen.order[0]
+            key = self._sort_key(name, rows, descending)
+            # Keep every row tied with the last one on the page, so the
+            # lexsort below chooses among them by id, as ORDER BY does.
+            boundary = np.partition(key, screen.limit - 1)[screen.limit - 1]
+            rows = rows[key <= boundary]
+
+        # lexsort treats its last key as the primary one; ids break ties.
+        keys = [self.ids[rows]] + [
+            self._sort_key(name, rows, descending)
+            for name, descending in reversed(screen.order)
+        ]
+        rows = rows[np.lexsort(keys)]
+        return rows[: screen.limit] if screen.limit else rows
+
+    async def query(self, screen: Screen) -> List[dict]:
+        if self.stale or not self.loaded:
+            await self.refresh()
+        rows = self._select(screen)
+        currencies = self.currencies
+        columns = zip(
+            self.ids[rows].tolist(),
+            self.name[rows],
+            self.symbol[rows],
+            self.currency[rows].tolist(),
+            self.price[rows].tolist(),
+            self.available[rows].tolist(),
+            self.created_at[rows],
+            self.updated_at[rows],
+        )
+        return [
+            {
+                "id": id_,
+                "name": name,
+                "symbol": symbol,
+                "currency": currencies[code],
+                "price": price,
+                "available_shares": available,
+                "created_at": created,
+                "updated_at": updated,
+            }
+            for id_, name, symbol, code, price, available, created, updated in columns
+        ]
+
+
+screener = company_events.subscribe(CompanyScreener())
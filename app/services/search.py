@@ -0,0 +1,141 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy.future import select
+
+from app.db.database import async_session
+from app.models import Company
+from app.services.events import SnapshotListener, company_events
+
+
+def normalize(value: str) -> str:
+    return " ".join(value.casefold().split())
+
+
+class SortedKeys:
+    # Parallel key/id lists rather than a list of tuples: a million listings
+    # produce several million keys and the tuples would double the footprint.
+    def __init__(self, pairs: Iterable[Tuple[str, int]] = ()):
+        pairs = sorted(pairs)
+        self.keys: List[str] = [key for key, _ in pairs]
+        self.ids: List[int] = [id_ for _, id_ in pairs]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, id_: int) -> None:
+        index = bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.ids.insert(index, id_)
+
+    def remove(self, key: str, id_: int) -> None:
+        index = bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.ids[index] == id_:
+                del self.keys[index]
+                del self.ids[index]
+                return
+            index += 1
+
+    def prefixed(self, prefix: str, limit: int, seen: Set[int]) -> List[int]:
+        found = []
+        index = bisect_left(self.keys, prefix)
+        while index < len(self.keys) and len(found) < limit:
+            if not self.keys[index].startswith(prefix):
+                break
+            id_ = self.ids[index]
+            if id_ not in seen:
+                seen.add(id_)
+                found.append(id_)
+            index += 1
+        return found
+
+
+class CompanySearchIndex(SnapshotListener):
+    """Prefix index over company symbols, names and the words in names.
+
+    Matches are ranked symbol prefix first, then name prefix, then the prefix
+    of any later word of the name. Within a tier matches come in key order,
+    so an exact match precedes the longer keys it prefixes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.docs: Dict[int, Tuple[str, str]] = {}
+        self.symbols = SortedKeys()
+        self.names = SortedKeys()
+        self.words = SortedKeys()
+
+    @staticmethod
+    def _keys(name: str, symbol: str) -> Tuple[str, str, List[str]]:
+        name_key = normalize(name)
+        return normalize(symbol), name_key, sorted(set(name_key.split()[1:]))
+
+    def rebuild(self, rows: Iterable[Tuple[int, str, str]]) -> None:
+        symbols, names, words = [], [], []
+        docs = {}
+        for id_, name, symbol in rows:
+            docs[id_] = (name, symbol)
+            symbol_key, name_key, word_keys = self._keys(name, symbol)
+            symbols.append((symbol_key, id_))
+            names.append((name_key, id_))
+            words.extend((word, id_) for word in word_keys)
+        self.docs = docs
+        self.symbols = SortedKeys(symbols)
+        self.names = SortedKeys(names)
+        self.words = SortedKeys(words)
+
+    async def fetch(self) -> list:
+        async with async_session() as session:
+            result = await session.execute(
+                select(Company.id, Company.name, Company.symbol)
+            )
+            return result.all()
+
+    def add(self, id_: int, name: str, symbol: str) -> None:
+        if self.docs.get(id_) == (name, symbol):
+            return
+        self.remove(id_)
+        self.docs[id_] = (name, symbol)
+        symbol_key, name_key, word_keys = self._keys(name, symbol)
+        self.symbols.add(symbol_key, id_)
+        self.names.add(name_key, id_)
+        for word in word_keys:
+            self.words.add(word, id_)
+
+    def remove(self, id_: int) -> None:
+        doc = self.docs.pop(id_, None)
+        if doc is None:
+            return
+        symbol_key, name_key, word_keys = self._keys(*doc)
+        self.symbols.remove(symbol_key, id_)
+        self.names.remove(name_key, id_)
+        for word in word_keys:
+            self.words.remove(word, id_)
+
+    def apply_upsert(self, companies: List[Company]) -> None:
+        for company in companies:
+            self.add(company.id, company.name, company.symbol)
+
+    def apply_delete(self, ids: List[int]) -> None:
+        for id_ in ids:
+            self.remove(id_)
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        if not prices_only:
+            self.stale = True
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, str, str]]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        seen: Set[int] = set()
+        ids: List[int] = []
+        for keys in (self.symbols, self.names, self.words):
+            ids.extend(keys.prefixed(prefix, limit - len(ids), seen))
+            if len(ids) >= limit:
+                break
+        return [(id_, *self.docs[id_]) for id_ in ids]
+
+
+search_index = company_events.subscribe(CompanySearchIndex())
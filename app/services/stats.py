@@ -0,0 +1,118 @@
+from typing import List, Optional
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.database import async_session
+from app.models import Company, CompanyStats, Rate, ShareHolder
+
+stats = CompanyStats.__table__
+company = Company.__table__
+rate = Rate.__table__
+holding = ShareHolder.__table__
+
+
+def base_rate():
+    return (
+        select(rate.c.rate)
+        .where(rate.c.currency == settings.BASE_CURRENCY)
+        .scalar_subquery()
+    )
+
+
+def market_caps(where=None):
+    """``UPDATE`` recomputing market caps from current prices and rates.
+
+    Shares outstanding are the ones held plus the ones still available, so
+    trades leave the cap alone; prices, share counts and rates move it.
+    """
+    cap = (
+        select(company.c.price * (company.c.available_shares + stats.c.held_quantity))
+        .where(company.c.id == stats.c.company_id)
+        .scalar_subquery()
+    )
+    listing_rate = (
+        select(rate.c.rate)
+        .where(
+            rate.c.currency == company.c.currency,
+            company.c.id == stats.c.company_id,
+        )
+        .scalar_subquery()
+    )
+    statement = update(stats).values(
+        market_cap=cap,
+        market_cap_base=func.coalesce(cap * base_rate() / listing_rate, 0),
+    )
+    return statement if where is None else statement.where(where)
+
+
+def add_stats(where):
+    """``INSERT`` the stats rows of the companies matching ``where``.
+
+    Holdings are aggregated, so this also backfills missing rows.
+    """
+    held = holding.c.quantity > 0
+    held_quantity = func.coalesce(
+        func.sum(case((held, holding.c.quantity), else_=0)), 0
+    )
+    cap = (
+        func.max(company.c.price * company.c.available_shares)
+        + func.max(company.c.price) * held_quantity
+    )
+    listing_rate = (
+        select(rate.c.rate).where(rate.c.currency == company.c.currency)
+    ).scalar_subquery()
+    rows = (
+        select(
+            company.c.id,
+            func.coalesce(func.sum(case((held, 1), else_=0)), 0),
+            held_quantity,
+            cap,
+            func.coalesce(cap * base_rate() / func.max(listing_rate), 0),
+        )
+        .select_from(company.outerjoin(holding, holding.c.company_id == company.c.id))
+        .where(where)
+        .group_by(company.c.id)
+    )
+    return insert(stats).from_select(
+        ["company_id", "holders", "held_quantity", "market_cap", "market_cap_base"],
+        rows,
+    )
+
+
+async def create_company_stats(db: AsyncSession, where) -> None:
+    await db.execute(add_stats(where))
+
+
+async def refresh_market_caps(
+    db: AsyncSession, company_ids: Optional[List[int]] = None
+) -> None:
+    where = None if company_ids is None else stats.c.company_id.in_(company_ids)
+    await db.execute(market_caps(where))
+
+
+async def record_trade(
+    db: AsyncSession, company_id: int, quantity: float, holders: int
+) -> None:
+    # Deltas, so a trade on a widely held company stays a single-row write.
+    await db.execute(
+        update(stats)
+        .where(stats.c.company_id == company_id)
+        .values(
+            holders=stats.c.holders + holders,
+            held_quantity=stats.c.held_quantity + quantity,
+        )
+    )
+
+
+async def delete_company_stats(db: AsyncSession, company_id: int) -> None:
+    await db.execute(delete(stats).where(stats.c.company_id == company_id))
+
+
+async def backfill_company_stats() -> None:
+    # Companies written before company_stats existed, or by other tools.
+    async with async_session() as db:
+        await create_company_stats(db, company.c.id.notin_(select(stats.c.company_id)))
+        await db.commit()
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.database import async_session
+from app.models import Company
+from app.schemas.company import CompanyPatchSchema
+from app.services.events import SnapshotListener, company_events
+from app.services.prices import apply_prices
+
+logger = logging.getLogger(__name__)
+
+
+class CompanySymbols(SnapshotListener):
+    """The symbol of every company, to turn away ticks for unknown ones."""
+
+    def __init__(self):
+        super().__init__()
+        self.by_id: Dict[int, str] = {}
+        self.ids: Dict[str, int] = {}
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.ids
+
+    async def fetch(self) -> list:
+        async with async_session() as session:
+            result = await session.execute(select(Company.id, Company.symbol))
+            return result.all()
+
+    def rebuild(self, rows: list) -> None:
+        self.by_id = {id_: symbol for id_, symbol in rows}
+        self.ids = {symbol: id_ for id_, symbol in rows}
+
+    def apply_upsert(self, companies: List[Company]) -> None:
+        self.apply_delete([company.id for company in companies])
+        for company in companies:
+            self.by_id[company.id] = company.symbol
+            self.ids[company.symbol] = company.id
+
+    def apply_delete(self, ids: List[int]) -> None:
+        for id_ in ids:
+            symbol = self.by_id.pop(id_, None)
+            if symbol is not None and self.ids.get(symbol) == id_:
+                del self.ids[symbol]
+
+    def invalidate(self, prices_only: bool = False) -> None:
+        if not prices_only:
+            self.stale = True
+
+
+class TickPipeline:
+    """Absorbs price ticks and writes them to ``company`` in batches.
+
+    Producers enqueue without waiting and ticks are dropped once the queue is
+    full. Prices ``CompanyPatchSchema`` refuses and symbols no company has
+    are rejected before they get that far, or, while ``symbols`` is reloading,
+    by the consumer. It keeps only the last price per symbol in ``pending``,
+    which is handed to ``apply_prices`` every ``interval`` seconds. Prices
+    that are coalesced but not yet committed are served by ``latest``.
+    """
+
+    counters = (
+        "received",
+        "dropped",
+        "rejected",
+        "coalesced",
+        "applied",
+        "flushes",
+        "failures",
+    )
+
+    def __init__(self, interval: float, maxsize: int, symbols: CompanySymbols):
+        self.interval = interval
+        self.maxsize = maxsize
+        self.symbols = symbols
+        # bumped whenever ``latest`` may answer differently
+        self.version = 0
+        self.queue: Optional[asyncio.Queue] = None
+        self.pending: Dict[str, float] = {}
+        self.flushing: Dict[str, float] = {}
+        self.tasks = []
+        self.stats = dict.fromkeys(self.counters, 0)
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(self.maxsize)
+        self.tasks = [
+            asyncio.create_task(self._consume()),
+            asyncio.create_task(self._flush_periodically()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.queue is not None:
+            while not self.queue.empty():
+                self._coalesce(*self.queue.get_nowait())
+        await self.flush()
+
+    def put(self, symbol: str, price) -> bool:
+        self.stats["received"] += 1
+        symbol = symbol.strip().upper()
+        if isinstance(price, bool) or not isinstance(price, (int, float)):
+            self.stats["rejected"] += 1
+            return False
+        try:
+            price = CompanyPatchSchema(price=price).price
+        except ValidationError:
+            self.stats["rejected"] += 1
+            return False
+        if self.symbols.ready and symbol not in self.symbols:
+            self.stats["rejected"] += 1
+            return False
+        if self.queue is None:
+            self.stats["dropped"] += 1
+            return False
+        try:
+            self.queue.put_nowait((symbol, price))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        return True
+
+    def latest(self, symbol: str) -> Optional[float]:
+        price = self.pending.get(symbol)
+        if price is None:
+            price = self.flushing.get(symbol)
+        return price
+
+    def _coalesce(self, symbol: str, price: float) -> None:
+        # put() could not check symbols that arrived during a reload
+        if self.symbols.loaded and symbol not in self.symbols:
+            self.stats["rejected"] += 1
+            return
+        if symbol in self.pending:
+            self.stats["coalesced"] += 1
+        self.pending[symbol] = price
+        self.version += 1
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if not self.symbols.ready:
+                try:
+                    await self.symbols.refresh()
+                except Exception:
+                    logger.exception("tick symbols reload failed")
+            for symbol, price in batch:
+                self._coalesce(symbol, price)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        self.flushing, self.pending = self.pending, {}
+        try:
+            async with async_session() as session:
+                applied, rejected = await apply_prices(session, self.flushing)
+            self.stats["applied"] += applied
+            self.stats["rejected"] += len(rejected)
+            self.stats["flushes"] += 1
+        except asyncio.CancelledError:
+            self._restore()
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            logger.exception("tick flush failed")
+            self._restore()
+        finally:
+            self.flushing = {}
+            self.version += 1
+
+    def _restore(self) -> None:
+        # keep the batch for the next window unless newer ticks replaced it
+        for symbol, price in self.flushing.items():
+            self.pending.setdefault(symbol, price)
+
+    def snapshot(self) -> dict:
+        queued = self.queue.qsize() if self.queue is not None else 0
+        return {**self.stats, "queued": queued, "pending": len(self.pending)}
+
+
+symbols = company_events.subscribe(CompanySymbols())
+ticks = TickPipeline(settings.TICK_FLUSH_INTERVAL, settings.TICK_QUEUE_SIZE, symbols)
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import requests
+
+from app.core.config import settings
+from app.core.deadlines import DeadlineExceeded, timeout
+from app.core.tracing import span
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Fails fast while an upstream API keeps failing.
+
+    ``failures`` consecutive failures (errors, timeouts or 5xx answers) open
+    the circuit for ``reset_after`` seconds, during which calls raise
+    ``CircuitOpen`` without reaching the API. Then one trial call is let
+    through; it closes the circuit again or re-opens it. Calls come from
+    request threads and scheduler threads alike, hence the lock.
+    """
+
+    def __init__(self, name: str, failures: int, reset_after: float):
+        self.name = name
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_after:
+                    self.stats["rejected"] += 1
+                    return False
+                self.state = HALF_OPEN
+            elif self.state == HALF_OPEN:
+                # a trial call is already in flight
+                self.stats["rejected"] += 1
+                return False
+            self.stats["calls"] += 1
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.stats["failures"] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        # an inconclusive trial call; the next call is the trial instead
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, **self.stats}
+
+    def get(self, url: str) -> requests.Response:
+        # Blocking; handlers call it through run_in_threadpool, which carries
+        # the request's deadline over to this thread.
+        seconds = timeout(settings.UPSTREAM_TIMEOUT)
+        if not self.allow():
+            raise CircuitOpen(self.name)
+        try:
+            with span("http.client", service=self.name) as traced:
+                response = requests.get(url, timeout=seconds)
+                if traced is not None:
+                    traced.attributes["status_code"] = response.status_code
+        except requests.Timeout:
+            if seconds < settings.UPSTREAM_TIMEOUT:
+                # cut short by the request's own deadline, not the API's fault
+                self.abandon()
+                raise DeadlineExceeded() from None
+            self.record(False)
+            raise
+        except Exception:
+            self.record(False)
+            raise
+        self.record(response.status_code < 500)
+        return response
+
+
+class LastGood:
+    """The last successful answer per key, for when the upstream is down."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: Dict[str, Any] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.entries.get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+alpha_vantage = CircuitBreaker(
+    "alpha_vantage", settings.BREAKER_FAILURES, settings.BREAKER_RESET_SECONDS
+)
+fx_api = CircuitBreaker(
+    "fx_api", settings.BREAKER_FAILURES, settings.BREAKER_RESET_SECONDS
+)
+breakers = (alpha_vantage, fx_api)
+quotes = LastGood(settings.QUOTE_CACHE_SIZE)
@@ -0,0 +1,104 @@
+import asyncio
+import json as _json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+
+class Response(NamedTuple):
+
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return _json.loads(self.body)
+
+
+class ASGIClient:
+    """Drives an ASGI app in-process, without sockets or a server loop."""
+
+    def __init__(self, app, host: str = "benchmark"):
+        self.app = app
+        self.host = host
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        data: Optional[Dict[str, Any]] = None,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        raw_headers: List[Tuple[bytes, bytes]] = [(b"host", self.host.encode())]
+        body = b""
+        if json is not None:
+            body = _json.dumps(json).encode()
+            raw_headers.append((b"content-type", b"application/json"))
+        elif data is not None:
+            body = urlencode(data).encode()
+            raw_headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        elif content is not None:
+            body = content
+        for key, value in (headers or {}).items():
+            raw_headers.append((key.lower().encode(), value.encode()))
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+
+        query = {k: v for k, v in (params or {}).items() if v is not None}
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method.upper(),
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(query, doseq=True).encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": (self.host, 80),
+        }
+
+        done = asyncio.Event()
+        request_sent = False
+        status = 500
+        response_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", []):
+                    response_headers[key.decode().lower()] = value.decode()
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            # ServerErrorMiddleware re-raises after sending the 500 response.
+            if not done.is_set():
+                status = 500
+        finally:
+            done.set()
+        return Response(status, response_headers, b"".join(chunks))
+
+    async def get(self, path: str, **kwargs) -> Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Response:
+        return await self.request("POST", path, **kwargs)
@@ -0,0 +1,372 @@
+"""In-process load benchmark for the trading and listing endpoints.
+
+Seeds a throwaway SQLite database (or the one ``--database-url`` names),
+mounts the app in-process and drives a weighted mix of scenarios from
+concurrent async clients. Results are printed (or written) as JSON so runs
+can be diffed across commits and databases:
+
+    python -m benchmarks.load --users 200 --companies 10000 --clients 32
+    python -m benchmarks.load --database-url postgresql+asyncpg://localhost/bench
+    python -m benchmarks.load --mix buy=1,sell=1 --clients 64 --inventory
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+
+from benchmarks.client import ASGIClient, Response
+
+SCENARIOS: Dict[str, Callable] = {}
+DEFAULT_MIX = "login=1,list=3,detail=3,buy=2,sell=2"
+
+
+def scenario(name: str):
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+
+    return decorator
+
+
+class Context:
+    def __init__(
+        self, args, client: ASGIClient, tokens: List[str], currencies: List[str]
+    ):
+        self.args = args
+        self.client = client
+        self.tokens = tokens
+        self.currencies = currencies
+        self.etags: Dict[Tuple[int, str, str], str] = {}
+
+    def auth(self, worker: int) -> Dict[str, str]:
+        return {"Authorization": "Bearer %s" % self.tokens[worker % len(self.tokens)]}
+
+    def hot_company(self, rng: random.Random) -> int:
+        return rng.randint(1, max(self.args.hot_symbols, 1))
+
+    def any_company(self, rng: random.Random) -> int:
+        return rng.randint(1, self.args.companies)
+
+
+@scenario("login")
+async def login(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    from benchmarks.seed import PASSWORD
+
+    username = "user%d" % rng.randrange(ctx.args.users)
+    response = await ctx.client.post(
+        "/account/login", data={"username": username, "password": PASSWORD}
+    )
+    return "POST /account/login", response
+
+
+@scenario("list")
+async def list_companies(
+    ctx: Context, worker: int, rng: random.Random
+) -> Tuple[str, Response]:
+    params = rng.choice(
+        [
+            {"price__lt": round(rng.uniform(5, 200), 2), "price__sort": "asc"},
+            {"price__gt": round(rng.uniform(1500, 1990), 2)},
+            {"available__lt": rng.randint(10, 500), "updated": "desc"},
+            {"currency": rng.choice(ctx.currencies), "price__gt": 1950},
+            {
+                "name": rng.choice(["Acme", "Nova", "Titan", "Zenith"]),
+                "price__sort": "desc",
+            },
+        ]
+    )
+    return "GET /company", await ctx.client.get("/company", params=params)
+
+
+@scenario("search")
+async def search(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    from benchmarks.seed import WORDS
+
+    query = rng.choice(WORDS)[: rng.randint(1, 4)]
+    response = await ctx.client.get("/company/search", params={"q": query, "limit": 10})
+    return "GET /company/search", response
+
+
+@scenario("detail")
+async def detail(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    company_id = ctx.any_company(rng)
+    if rng.random() < 0.5:
+        response = await ctx.client.get(
+            "/company/%d" % company_id, params={"currency": rng.choice(ctx.currencies)}
+        )
+        return "GET /company/{id}?currency", response
+    return "GET /company/{id}", await ctx.client.get("/company/%d" % company_id)
+
+
+@scenario("batch")
+async def batch(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    # a dashboard's worth of tickers in one request
+    ids = [ctx.any_company(rng) for _ in range(100)]
+    response = await ctx.client.get(
+        "/company/batch",
+        params={
+            "ids": ",".join(map(str, ids)),
+            "currency": rng.choice(ctx.currencies),
+        },
+    )
+    return "GET /company/batch?currency", response
+
+
+@scenario("poll")
+async def poll(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    # Clients re-polling a small working set, revalidating with If-None-Match.
+    if rng.random() < 0.5:
+        path, params, label = (
+            "/company",
+            {"price__sort": "asc", "limit": 50},
+            "GET /company",
+        )
+    else:
+        path = "/company/%d" % rng.randint(1, min(ctx.args.companies, 50))
+        params, label = {}, "GET /company/{id}"
+    key = (worker, path, repr(params))
+    headers = {"If-None-Match": ctx.etags[key]} if key in ctx.etags else {}
+    response = await ctx.client.get(path, params=params, headers=headers)
+    if "etag" in response.headers:
+        ctx.etags[key] = response.headers["etag"]
+    return label + " (conditional)", response
+
+
+@scenario("buy")
+async def buy(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    response = await ctx.client.post(
+        "/shares/buy/%d" % ctx.hot_company(rng),
+        json={"quantity": rng.randint(1, 5)},
+        headers=ctx.auth(worker),
+    )
+    return "POST /shares/buy/{id}", response
+
+
+@scenario("sell")
+async def sell(ctx: Context, worker: int, rng: random.Random) -> Tuple[str, Response]:
+    response = await ctx.client.post(
+        "/shares/sell/%d" % ctx.hot_company(rng),
+        json={"quantity": 1},
+        headers=ctx.auth(worker),
+    )
+    return "POST /shares/sell/{id}", response
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError("unknown scenario %r" % name)
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(samples: Dict[str, List[Tuple[float, int]]], elapsed: float) -> dict:
+    endpoints = {}
+    total = 0
+    for label in sorted(samples):
+        latencies = sorted(latency for latency, _ in samples[label])
+        statuses: Dict[str, int] = defaultdict(int)
+        for _, status in samples[label]:
+            statuses[str(status)] += 1
+        total += len(latencies)
+        endpoints[label] = {
+            "count": len(latencies),
+            "errors": sum(
+                count for status, count in statuses.items() if int(status) >= 500
+            ),
+            "statuses": dict(statuses),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(database_url: str) -> None:
+    # Settings are read at import time, so this must run before the app is imported.
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    # warm-up requests would run alongside the probe and the timed run
+    os.environ.setdefault("WARMUP_ENABLED", "false")
+    # every simulated client shares one IP; opt in with RATE_LIMIT_ENABLED=true
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    for name in ("SECRET_KEY", "PROJECT_NAME", "FX_API_URL", "FX_API_KEY"):
+        os.environ.setdefault(name, "benchmark")
+
+
+async def obtain_tokens(client: ASGIClient, count: int) -> List[str]:
+    from benchmarks.seed import PASSWORD
+
+    tokens = []
+    for i in range(count):
+        response = await client.post(
+            "/account/login", data={"username": "user%d" % i, "password": PASSWORD}
+        )
+        if response.status != 200:
+            raise RuntimeError("login failed for user%d: %s" % (i, response.body))
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def probe_checkouts(ctx: Context, names: List[str]) -> Dict[str, int]:
+    # One request per scenario, run alone so the pool counter is unambiguous.
+    from app.db.database import pool_stats
+
+    checkouts = {}
+    rng = random.Random(0)
+    for name in names:
+        before = pool_stats.checkouts
+        label, _ = await SCENARIOS[name](ctx, 0, rng)
+        checkouts[label] = pool_stats.checkouts - before
+    return checkouts
+
+
+async def run(args) -> dict:
+    from app.db.database import engine
+    from app.main import app
+    from benchmarks.seed import CURRENCIES
+
+    await app.router.startup()
+    try:
+        client = ASGIClient(app)
+        tokens = await obtain_tokens(client, min(args.clients, args.users))
+        ctx = Context(args, client, tokens, CURRENCIES)
+        names = list(args.mix)
+        weights = [args.mix[name] for name in names]
+        checkouts = await probe_checkouts(ctx, names)
+        samples: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(index: int):
+            rng = random.Random(args.seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                func = SCENARIOS[rng.choices(names, weights)[0]]
+                started = time.perf_counter()
+                label, response = await func(ctx, index, rng)
+                samples[label].append((time.perf_counter() - started, response.status))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.clients)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await app.router.shutdown()
+        await engine.dispose()
+    return {**summarize(samples, elapsed), "checkouts_per_request": checkouts}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=5000)
+    parser.add_argument("--holdings", type=int, default=20000)
+    parser.add_argument("--hot-symbols", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--database", help="SQLite file to seed (default: temp file)")
+    parser.add_argument(
+        "--database-url",
+        help="async SQLAlchemy URL of a database to seed and use instead of SQLite; "
+        "its tables are dropped and recreated",
+    )
+    parser.add_argument(
+        "--inventory",
+        action="store_true",
+        help="reserve the hot symbols in memory (HOT_SYMBOLS) instead of in the "
+        "database",
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    path = args.database or os.path.join(workdir, "benchmark.db")
+    configure_environment(args.database_url or "sqlite+aiosqlite:///%s" % path)
+
+    from benchmarks.seed import make_symbol, seed_database
+
+    if args.inventory:
+        from app.core.config import settings
+
+        # settings are loaded already; the inventory reads them when the app is
+        settings.HOT_SYMBOLS = [make_symbol(i) for i in range(args.hot_symbols)]
+        settings.INVENTORY_JOURNAL = os.path.join(workdir, "inventory.journal")
+
+    seed_started = time.perf_counter()
+    seed_database(
+        os.environ["DATABASE_URL"],
+        users=args.users,
+        companies=args.companies,
+        holdings=args.holdings,
+        hot_symbols=args.hot_symbols,
+        seed=args.seed,
+    )
+    seed_elapsed = time.perf_counter() - seed_started
+
+    results = asyncio.run(run(args))
+    config = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ("output", "database", "database_url")
+    }
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed_s": round(seed_elapsed, 3),
+            "dialect": make_url(os.environ["DATABASE_URL"]).get_backend_name(),
+            "config": config,
+        },
+        **results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
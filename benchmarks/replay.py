@@ -0,0 +1,246 @@
+"""Replays requests recorded by ``CAPTURE_ENABLED`` against the app in-process.
+
+Copies a seeded database snapshot (or seeds a throwaway SQLite database),
+mounts the app and re-sends every captured request at its original offset
+divided by ``--speed``, then reports per-route latency beside the captured
+latency (or beside an earlier replay given as ``--baseline``):
+
+    python -m benchmarks.replay captures/requests.jsonl* \
+        --database snapshot.db --speed 4
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from benchmarks.client import ASGIClient
+from benchmarks.load import configure_environment, git_revision, percentile
+
+
+def load_capture(paths: List[str]) -> Tuple[List[dict], Dict[str, int]]:
+    records, skipped = [], defaultdict(int)
+    for path in paths:
+        with open(path) as fh:
+            for line in fh:
+                record = json.loads(line)
+                # bodies that were not recorded cannot be replayed faithfully
+                if record.get("redacted"):
+                    skipped["redacted"] += 1
+                elif record.get("truncated"):
+                    skipped["truncated"] += 1
+                else:
+                    records.append(record)
+    # rotated files are replayed as one capture, oldest request first
+    records.sort(key=lambda record: record["at"])
+    return records, skipped
+
+
+def label_of(record: dict) -> str:
+    return "%s %s" % (record["method"], record["route"] or record["path"])
+
+
+async def mint_tokens(subjects: set) -> Dict[str, str]:
+    # The snapshot has the users but not their passwords; sign tokens instead.
+    from fastapi import HTTPException
+
+    from app.core.auth import create_user_token, get_user
+    from app.db.database import async_session
+
+    tokens = {}
+    async with async_session() as db:
+        for subject in subjects:
+            try:
+                tokens[subject] = create_user_token(await get_user(db, subject))
+            except HTTPException:
+                pass
+    return tokens
+
+
+def build_request(record: dict, tokens: Dict[str, str]) -> Optional[dict]:
+    headers = {}
+    if record["subject"] is not None:
+        if record["subject"] not in tokens:
+            return None
+        headers["Authorization"] = "Bearer %s" % tokens[record["subject"]]
+    if record["content_type"]:
+        headers["Content-Type"] = record["content_type"]
+    body = (record["body"] or "").encode()
+    if record.get("base64"):
+        body = base64.b64decode(body)
+    return {
+        "params": parse_qs(record["query"], keep_blank_values=True),
+        "content": body,
+        "headers": headers,
+    }
+
+
+async def replay(args, records: List[dict]) -> dict:
+    from app.db.database import engine
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        client = ASGIClient(app)
+        tokens = await mint_tokens({r["subject"] for r in records if r["subject"]})
+        samples: Dict[str, List[Tuple[dict, float, int]]] = defaultdict(list)
+        lags: List[float] = []
+        unknown_subjects = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+        first = records[0]["at"] if records else 0.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def send(record: dict, request: dict):
+            offset = (record["at"] - first) / args.speed if args.speed else 0.0
+            await asyncio.sleep(max(started + offset - loop.time(), 0))
+            async with semaphore:
+                lags.append(loop.time() - started - offset)
+                sent = time.perf_counter()
+                response = await client.request(
+                    record["method"], record["path"], **request
+                )
+                elapsed = time.perf_counter() - sent
+            samples[label_of(record)].append((record, elapsed, response.status))
+
+        tasks = []
+        for record in records:
+            request = build_request(record, tokens)
+            if request is None:
+                unknown_subjects += 1
+                continue
+            tasks.append(send(record, request))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+    finally:
+        await app.router.shutdown()
+        await engine.dispose()
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": sum(len(values) for values in samples.values()),
+        "unknown_subjects": unknown_subjects,
+        # how late requests went out; a high value means the replay could not
+        # keep up with --speed and the latencies include queueing
+        "lag_p95_ms": round(percentile(lags, 95) * 1000, 3),
+        "routes": summarize(samples),
+    }
+
+
+def summarize(samples: Dict[str, List[Tuple[dict, float, int]]]) -> dict:
+    routes = {}
+    for label in sorted(samples):
+        captured = sorted(record["duration_ms"] for record, _, _ in samples[label])
+        replayed = sorted(elapsed * 1000 for _, elapsed, _ in samples[label])
+        statuses: Dict[str, int] = defaultdict(int)
+        for _, _, status in samples[label]:
+            statuses[str(status)] += 1
+        routes[label] = {
+            "count": len(replayed),
+            "statuses": dict(statuses),
+            # a different answer than in production usually means the
+            # snapshot does not match the captured traffic
+            "status_mismatches": sum(
+                1 for record, _, status in samples[label] if record["status"] != status
+            ),
+            "captured_p50_ms": round(percentile(captured, 50), 3),
+            "captured_p95_ms": round(percentile(captured, 95), 3),
+            "p50_ms": round(percentile(replayed, 50), 3),
+            "p95_ms": round(percentile(replayed, 95), 3),
+        }
+    return routes
+
+
+def add_deltas(routes: dict, baseline: Optional[dict]) -> None:
+    for label, route in routes.items():
+        if baseline is None:
+            before = {
+                "p50_ms": route["captured_p50_ms"],
+                "p95_ms": route["captured_p95_ms"],
+            }
+        elif label in baseline["routes"]:
+            before = baseline["routes"][label]
+        else:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            route["delta_" + key] = round(route[key] - before[key], 3)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="capture files, rotated ones too")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay N times faster than recorded; 0 sends everything at once",
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--database",
+        help="SQLite snapshot to replay against; it is copied, never modified",
+    )
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=5000)
+    parser.add_argument("--holdings", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--baseline", help="earlier replay report to compute the deltas against"
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "replay.db")
+    if args.database:
+        shutil.copyfile(args.database, path)
+    configure_environment("sqlite+aiosqlite:///%s" % path)
+    # a replay must not record itself
+    os.environ["CAPTURE_ENABLED"] = "false"
+    if not args.database:
+        from benchmarks.seed import seed_database
+
+        seed_database(
+            os.environ["DATABASE_URL"],
+            users=args.users,
+            companies=args.companies,
+            holdings=args.holdings,
+            seed=args.seed,
+        )
+
+    records, skipped = load_capture(args.captures)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    results = asyncio.run(replay(args, records))
+    add_deltas(results["routes"], baseline)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "captures": args.captures,
+            "database": args.database,
+            "speed": args.speed,
+            "skipped": dict(skipped),
+            "baseline": args.baseline,
+        },
+        **results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import random
+import string
+from typing import List
+
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel
+
+from app.core.auth import get_password_hash
+from app.db.database import sync_database_url
+from app.models import Company, Rate, ShareHolder, User
+
+PASSWORD = "benchmark"
+WORDS = (
+    "acme alpha apex atlas aurora beacon cobalt delta ember falcon global "
+    "granite harbor helix horizon ion juniper keystone lumen meridian nova "
+    "orbit pioneer quantum redwood summit titan unity vertex vista zenith"
+).split()
+SUFFIXES = ["Holdings", "Group", "Labs", "Systems", "Energy", "Bank", "Capital"]
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CHF", "NGN"]
+
+
+def make_symbol(index: int) -> str:
+    letters = []
+    index += 26 * 26
+    while index:
+        index, rem = divmod(index, 26)
+        letters.append(string.ascii_uppercase[rem])
+    return "".join(reversed(letters))
+
+
+def make_name(rng: random.Random, index: int) -> str:
+    return "%s %s %s %d" % (
+        rng.choice(WORDS).title(),
+        rng.choice(WORDS).title(),
+        rng.choice(SUFFIXES),
+        index,
+    )
+
+
+def seed_database(
+    url: str,
+    users: int,
+    companies: int,
+    holdings: int,
+    hot_symbols: int = 1,
+    seed: int = 0,
+    chunk_size: int = 5000,
+) -> None:
+    rng = random.Random(seed)
+    engine = create_engine(sync_database_url(url))
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    # bcrypt is deliberately slow, so every seeded user shares one hash.
+    hashed_password = get_password_hash(PASSWORD)
+
+    with engine.begin() as conn:
+        conn.execute(
+            Rate.__table__.insert(),
+            [
+                {
+                    "base": "EUR",
+                    "currency": currency,
+                    "date": "2022-03-21",
+                    "rate": 1.0
+                    if currency == "EUR"
+                    else round(rng.uniform(0.5, 500), 6),
+                }
+                for currency in CURRENCIES
+            ],
+        )
+        for start in range(0, users, chunk_size):
+            conn.execute(
+                User.__table__.insert(),
+                [
+                    {
+                        "id": i + 1,
+                        "username": "user%d" % i,
+                        "hashed_password": hashed_password,
+                        "email": "user%d@example.com" % i,
+                        "full_name": "User %d" % i,
+                        "disabled": False,
+                    }
+                    for i in range(start, min(start + chunk_size, users))
+                ],
+            )
+        for start in range(0, companies, chunk_size):
+            conn.execute(
+                Company.__table__.insert(),
+                [
+                    {
+                        "id": i + 1,
+                        "name": make_name(rng, i),
+                        "symbol": make_symbol(i),
+                        "currency": rng.choice(CURRENCIES),
+                        "price": round(rng.uniform(1, 2000), 2),
+                        # hot symbols are sized so contention, not depletion,
+                        # limits them
+                        "available_shares": 10**9
+                        if i < hot_symbols
+                        else rng.randint(0, 100000),
+                    }
+                    for i in range(start, min(start + chunk_size, companies))
+                ],
+            )
+
+        # Every user holds every hot symbol so that sells never hit an empty position.
+        pairs = {(u, c) for u in range(1, users + 1) for c in range(1, hot_symbols + 1)}
+        target = len(pairs) + holdings
+        max_pairs = users * companies
+        while len(pairs) < min(target, max_pairs):
+            pairs.add((rng.randint(1, users), rng.randint(1, companies)))
+        rows: List[dict] = [
+            {"user_id": u, "company_id": c, "quantity": float(rng.randint(10, 1000))}
+            for u, c in sorted(pairs)
+        ]
+        for start in range(0, len(rows), chunk_size):
+            end = start + chunk_size
+            conn.execute(ShareHolder.__table__.insert(), rows[start:end])
+        if engine.dialect.name == "postgresql":
+            # ids were inserted explicitly, so move the sequences past them
+            for table in ("user", "company"):
+                conn.execute(
+                    text(
+                        "SELECT setval(pg_get_serial_sequence('\"%s\"', 'id'), "
+                        '(SELECT MAX(id) FROM "%s"))' % (table, table)
+                    )
+                )
+    engine.dispose()
@@ -0,0 +1,142 @@
+"""CPU cost of serializing large responses, per response path.
+
+Compares FastAPI's stock path (validate against ``response_model`` then
+``json``) with the fast path (orjson, no re-validation), and the cost of
+gzip/brotli on top. Reports CPU milliseconds per 10k companies:
+
+    python -m benchmarks.serialization --companies 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from benchmarks.load import configure_environment
+
+
+def build_companies(count: int, rng: random.Random):
+    from app.schemas.company import CompanyModelSchema
+
+    now = datetime(2022, 3, 21, 20, 30)
+    return [
+        CompanyModelSchema(
+            id=i + 1,
+            name="Company %d Holdings" % i,
+            symbol="SYM%d" % i,
+            currency=rng.choice(["USD", "EUR", "GBP"]),
+            price=round(rng.uniform(1, 2000), 2),
+            available_shares=rng.randint(0, 100000),
+            created_at=now - timedelta(days=i % 365),
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def build_user(companies):
+    from app.schemas.shares import ShareModelSchema
+    from app.schemas.user import UserModelSchema
+
+    return UserModelSchema(
+        id=1,
+        username="user0",
+        disabled=False,
+        email="user0@example.com",
+        full_name="User 0",
+        hashed_password="x" * 60,
+        shares=[
+            ShareModelSchema(company=company, quantity=10) for company in companies
+        ],
+    )
+
+
+def cpu_ms(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        timings.append(time.process_time() - started)
+    return min(timings) * 1000
+
+
+def measure(name: str, content, response_type, repeat: int, per: float) -> dict:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    from app.core.compression import brotli
+    from app.core.responses import FastJSONResponse
+
+    field = create_response_field(name="Response", type_=response_type)
+
+    def stock() -> bytes:
+        data = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(data).body
+
+    def fast() -> bytes:
+        return FastJSONResponse(content).body
+
+    body = fast()
+    report = {
+        "stock_ms": cpu_ms(stock, repeat),
+        "fast_ms": cpu_ms(fast, repeat),
+        "gzip_ms": cpu_ms(lambda: gzip.compress(body, compresslevel=6), repeat),
+        "identity_bytes": len(body),
+        "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+    }
+    if brotli is not None:
+        report["brotli_ms"] = cpu_ms(lambda: brotli.compress(body, quality=4), repeat)
+        report["brotli_bytes"] = len(brotli.compress(body, quality=4))
+    for key in list(report):
+        if key.endswith("_ms"):
+            report[key] = round(report[key] * per, 3)
+    report["speedup"] = round(report["stock_ms"] / max(report["fast_ms"], 1e-9), 2)
+    return {name: report}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    configure_environment(os.environ.get("DATABASE_URL", "sqlite+aiosqlite://"))
+
+    from app.schemas.company import CompanyModelSchema
+    from app.schemas.user import UserModelSchema
+
+    rng = random.Random(args.seed)
+    companies = build_companies(args.companies, rng)
+    per = 10000.0 / args.companies
+    results = {}
+    results.update(
+        measure(
+            "GET /company",
+            companies,
+            List[CompanyModelSchema],
+            args.repeat,
+            per,
+        )
+    )
+    results.update(
+        measure(
+            "UserModelSchema with shares",
+            build_user(companies),
+            UserModelSchema,
+            args.repeat,
+            per,
+        )
+    )
+    report = {"unit": "CPU ms per 10k companies", "config": vars(args), **results}
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
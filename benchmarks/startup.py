@@ -0,0 +1,108 @@
+"""Cold-start profile: import time per module and time per startup phase.
+
+Imports ``app.main`` in a fresh interpreter under ``-X importtime``, then
+runs the startup hooks and warm-up in-process against a seeded throwaway
+SQLite database and reports both as JSON:
+
+    python -m benchmarks.startup --companies 10000 --top 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmarks.load import configure_environment
+
+
+def import_times(top: int) -> dict:
+    # -X importtime writes "import time: self [us] | cumulative | package"
+    # lines to stderr, nested imports indented under the one that pulled them in
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+        env=os.environ,
+    )
+    if result.returncode:
+        raise RuntimeError("importing app.main failed:\n%s" % result.stderr[-2000:])
+    modules = []
+    packages: Dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        prefix = len("import time:")
+        own, cumulative, name = line[prefix:].split("|")
+        name = name.strip()
+        modules.append((name, int(own), int(cumulative)))
+        packages[name.split(".")[0]] += int(own)
+    total = sum(own for _, own, _ in modules)
+    slowest = sorted(modules, key=lambda module: module[2], reverse=True)[:top]
+    return {
+        "total_s": round(total / 1e6, 3),
+        "modules": {
+            name: round(cumulative / 1e6, 4) for name, _, cumulative in slowest
+        },
+        "packages": {
+            name: round(own / 1e6, 4)
+            for name, own in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+    }
+
+
+async def startup_phases() -> dict:
+    from app.core.startup import startup
+    from app.db.database import engine
+    from app.main import app
+
+    started = time.perf_counter()
+    await app.router.startup()
+    hooks = time.perf_counter() - started
+    try:
+        if startup.task is not None:
+            await startup.task
+    finally:
+        await app.router.shutdown()
+        await engine.dispose()
+    return {"hooks_s": round(hooks, 4), **startup.report()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=5000)
+    parser.add_argument("--holdings", type=int, default=20000)
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "startup.db")
+    configure_environment("sqlite+aiosqlite:///%s" % path)
+    # the warm-up is part of what this measures
+    os.environ["WARMUP_ENABLED"] = "true"
+
+    from benchmarks.seed import seed_database
+
+    seed_database(
+        os.environ["DATABASE_URL"],
+        users=args.users,
+        companies=args.companies,
+        holdings=args.holdings,
+        seed=args.seed,
+    )
+    report = {"config": vars(args), "imports": import_times(args.top)}
+    started = time.perf_counter()
+    import app.main  # noqa: F401
+
+    report["import_s"] = round(time.perf_counter() - started, 3)
+    report["startup"] = asyncio.run(startup_phases())
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
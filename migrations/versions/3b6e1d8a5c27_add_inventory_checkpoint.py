@@ -0,0 +1,30 @@
+"""add inventory_checkpoint
+
+Revision ID: 3b6e1d8a5c27
+Revises: e8b14f0c9d35
+Create Date: 2026-10-19 18:12:40.532107
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b6e1d8a5c27"
+down_revision = "e8b14f0c9d35"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "inventory_checkpoint",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("company_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("inventory_checkpoint")
@@ -0,0 +1,53 @@
+"""drop sqlite triggers
+
+Revision ID: 5b9f3e7d21ac
+Revises: c4e81d0b7a93
+Create Date: 2026-10-19 14:26:08.640317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5b9f3e7d21ac"
+down_revision = "c4e81d0b7a93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # updated_at and repricing on rate changes are done by the app now
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER IF EXISTS updated_at_trigger")
+    op.execute("DROP TRIGGER IF EXISTS updated_rate_trigger")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(
+        """
+        CREATE TRIGGER updated_at_trigger
+        AFTER UPDATE OF name, currency, price, available_shares, symbol
+        ON company
+        FOR EACH ROW
+        BEGIN
+            UPDATE company
+            SET updated_at = CURRENT_TIMESTAMP
+            WHERE id = new.id;
+        END;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER updated_rate_trigger
+        AFTER UPDATE OF rate
+        ON rate
+        BEGIN
+            UPDATE company
+            SET price = ROUND(((new.rate / old.rate) * price), 2)
+            WHERE currency = old.currency;
+        END;
+        """
+    )
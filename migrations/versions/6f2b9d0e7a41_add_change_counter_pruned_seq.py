@@ -0,0 +1,35 @@
+"""add change_counter pruned_seq
+
+Revision ID: 6f2b9d0e7a41
+Revises: d1e5a83c4f92
+Create Date: 2026-10-20 11:05:12.277340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6f2b9d0e7a41"
+down_revision = "d1e5a83c4f92"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("change_counter", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("pruned_seq", sa.Integer(), server_default="0", nullable=False)
+        )
+    with op.batch_alter_table("company_tombstone", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_company_tombstone_deleted_at", ["deleted_at"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("company_tombstone", schema=None) as batch_op:
+        batch_op.drop_index("ix_company_tombstone_deleted_at")
+
+    with op.batch_alter_table("change_counter", schema=None) as batch_op:
+        batch_op.drop_column("pruned_seq")
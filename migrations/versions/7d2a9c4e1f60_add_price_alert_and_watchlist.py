@@ -0,0 +1,67 @@
+"""add price_alert and watchlist
+
+Revision ID: 7d2a9c4e1f60
+Revises: 5b9f3e7d21ac
+Create Date: 2026-10-19 15:48:12.905513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "7d2a9c4e1f60"
+down_revision = "5b9f3e7d21ac"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "price_alert",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column("triggered_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("direction", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("threshold", sa.Float(), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.Column("triggered_price", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("price_alert", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_price_alert_user_id_active", ["user_id", "active"], unique=False
+        )
+
+    op.create_table(
+        "watchlist",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "company_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("watchlist")
+    with op.batch_alter_table("price_alert", schema=None) as batch_op:
+        batch_op.drop_index("ix_price_alert_user_id_active")
+
+    op.drop_table("price_alert")
@@ -0,0 +1,56 @@
+"""add company change_seq and company_tombstone
+
+Revision ID: 9a4c7e2b6d13
+Revises: 3b6e1d8a5c27
+Create Date: 2026-10-19 19:02:17.408815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9a4c7e2b6d13"
+down_revision = "3b6e1d8a5c27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("company", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("change_seq", sa.Integer(), server_default="0", nullable=False)
+        )
+    # existing companies count as changed once, in id order
+    op.execute("UPDATE company SET change_seq = id")
+    with op.batch_alter_table("company", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_company_change_seq"), ["change_seq"], unique=False
+        )
+
+    op.create_table(
+        "company_tombstone",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("change_seq", sa.Integer(), nullable=False),
+        sa.Column(
+            "deleted_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("company_id"),
+    )
+    with op.batch_alter_table("company_tombstone", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_company_tombstone_change_seq"), ["change_seq"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("company_tombstone", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_company_tombstone_change_seq"))
+
+    op.drop_table("company_tombstone")
+    with op.batch_alter_table("company", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_company_change_seq"))
+        batch_op.drop_column("change_seq")
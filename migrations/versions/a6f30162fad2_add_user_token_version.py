@@ -0,0 +1,28 @@
+"""add user token_version
+
+Revision ID: a6f30162fad2
+Revises: 8155959765e6
+Create Date: 2026-10-19 09:12:40.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6f30162fad2"
+down_revision = "8155959765e6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("token_version", sa.Integer(), server_default="0", nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.drop_column("token_version")
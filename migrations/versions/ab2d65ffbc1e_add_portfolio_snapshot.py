@@ -0,0 +1,44 @@
+"""add portfolio_snapshot
+
+Revision ID: ab2d65ffbc1e
+Revises: a6f30162fad2
+Create Date: 2026-10-19 10:02:17.640391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "ab2d65ffbc1e"
+down_revision = "a6f30162fad2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "portfolio_snapshot",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("taken_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=True),
+        sa.Column("currency", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("holdings", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("portfolio_snapshot", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_portfolio_snapshot_user_id_taken_at",
+            ["user_id", "taken_at"],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("portfolio_snapshot", schema=None) as batch_op:
+        batch_op.drop_index("ix_portfolio_snapshot_user_id_taken_at")
+
+    op.drop_table("portfolio_snapshot")
@@ -0,0 +1,54 @@
+"""add job
+
+Revision ID: c4e81d0b7a93
+Revises: f2bcd2c59bf9
+Create Date: 2026-10-19 13:02:41.218604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e81d0b7a93"
+down_revision = "f2bcd2c59bf9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job",
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("kind", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("status", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("params", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("progress", sa.Float(), nullable=False),
+        sa.Column("result", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("error", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("job", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_job_status"), ["status"], unique=False)
+        batch_op.create_index(
+            "ix_job_user_id_created_at", ["user_id", "created_at"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("job", schema=None) as batch_op:
+        batch_op.drop_index("ix_job_user_id_created_at")
+        batch_op.drop_index(batch_op.f("ix_job_status"))
+
+    op.drop_table("job")
@@ -0,0 +1,40 @@
+"""add change_counter
+
+Revision ID: d1e5a83c4f92
+Revises: 9a4c7e2b6d13
+Create Date: 2026-10-20 10:21:44.913562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d1e5a83c4f92"
+down_revision = "9a4c7e2b6d13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "change_counter",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # continues from the highest change_seq handed out so far
+    op.execute(
+        """
+        INSERT INTO change_counter (id, seq)
+        SELECT 1, MAX(seq) FROM (
+            SELECT COALESCE(MAX(change_seq), 0) AS seq FROM company
+            UNION ALL
+            SELECT COALESCE(MAX(change_seq), 0) AS seq FROM company_tombstone
+        ) AS seqs
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("change_counter")
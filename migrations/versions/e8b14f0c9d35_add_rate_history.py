@@ -0,0 +1,61 @@
+"""add rate_history
+
+Revision ID: e8b14f0c9d35
+Revises: 7d2a9c4e1f60
+Create Date: 2026-10-19 16:37:55.114820
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "e8b14f0c9d35"
+down_revision = "7d2a9c4e1f60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rate_history = op.create_table(
+        "rate_history",
+        sa.Column("observed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("base", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("currency", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("rate_history", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_rate_history_currency_observed_at",
+            ["currency", "observed_at"],
+            unique=False,
+        )
+
+    # the current rates start the history, observed on their provider date
+    rows = op.get_bind().execute(sa.text("SELECT base, currency, rate, date FROM rate"))
+    op.bulk_insert(
+        rate_history,
+        [
+            {
+                "base": base,
+                "currency": currency,
+                "rate": rate,
+                "observed_at": datetime.strptime(day, "%Y-%m-%d").replace(
+                    tzinfo=timezone.utc
+                ),
+            }
+            for base, currency, rate, day in rows
+        ],
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("rate_history", schema=None) as batch_op:
+        batch_op.drop_index("ix_rate_history_currency_observed_at")
+
+    op.drop_table("rate_history")
@@ -0,0 +1,49 @@
+"""add company_stats
+
+Revision ID: f2bcd2c59bf9
+Revises: ab2d65ffbc1e
+Create Date: 2026-10-19 11:20:53.507113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f2bcd2c59bf9"
+down_revision = "ab2d65ffbc1e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rows are backfilled by the app on startup
+    op.create_table(
+        "company_stats",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column("holders", sa.Integer(), nullable=False),
+        sa.Column("held_quantity", sa.Float(), nullable=False),
+        sa.Column("market_cap", sa.Float(), nullable=False),
+        sa.Column("market_cap_base", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("company_id"),
+    )
+    with op.batch_alter_table("shareholder", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_shareholder_company_id_quantity",
+            ["company_id", sa.text("quantity DESC")],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("shareholder", schema=None) as batch_op:
+        batch_op.drop_index("ix_shareholder_company_id_quantity")
+
+    op.drop_table("company_stats")
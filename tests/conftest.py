@@ -0,0 +1,134 @@
+"""Runs the app in-process against a migrated scratch database.
+
+SQLite in a temporary directory by default. Set ``TEST_DATABASE_URL`` to an
+async SQLAlchemy URL (e.g. ``postgresql+asyncpg://localhost/shares_test``) to
+run the same tests against that database instead; its tables are dropped
+first.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.engine import make_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="tests-")
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL") or "sqlite+aiosqlite:///%s" % (
+    os.path.join(WORKDIR, "test.db")
+)
+
+# Settings are read at import time, so this must run before the app is imported.
+os.environ.update(
+    DATABASE_URL=DATABASE_URL,
+    SCHEDULER_ENABLED="false",
+    WARMUP_ENABLED="false",
+    RATE_LIMIT_ENABLED="false",
+    HOT_SYMBOLS="[]",
+    JOB_RESULTS_DIR=os.path.join(WORKDIR, "job_results"),
+    INVENTORY_JOURNAL=os.path.join(WORKDIR, "inventory.journal"),
+)
+for name in ("SECRET_KEY", "PROJECT_NAME", "FX_API_URL", "FX_API_KEY"):
+    os.environ.setdefault(name, "test")
+
+RATES = {"USD": 1.0, "EUR": 0.9, "GBP": 0.75}
+PASSWORD = "password123"
+names = itertools.count(1)
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.set_main_option("sqlalchemy.url", DATABASE_URL)
+    return config
+
+
+# one id per backend, so reports say which database a run used
+@pytest.fixture(
+    scope="session",
+    params=[DATABASE_URL],
+    ids=lambda url: make_url(url).get_backend_name(),
+)
+def migrated():
+    from alembic import command
+    from sqlalchemy import text
+    from sqlmodel import SQLModel
+
+    from app.db.database import sync_engine
+    from app.models import Rate
+
+    if sync_engine.dialect.name != "sqlite":
+        SQLModel.metadata.drop_all(sync_engine)
+        with sync_engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    command.upgrade(alembic_config(), "head")
+    # before the app is imported: its Currency enum is read from this table
+    with sync_engine.begin() as conn:
+        conn.execute(
+            Rate.__table__.insert(),
+            [
+                {
+                    "base": "USD",
+                    "currency": currency,
+                    "date": "2022-03-21",
+                    "rate": rate,
+                }
+                for currency, rate in RATES.items()
+            ],
+        )
+    return sync_engine
+
+
+@pytest.fixture(scope="session")
+def client(migrated):
+    from starlette.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_company(client):
+    def make_company(**values) -> dict:
+        number = next(names)
+        body = {
+            "name": "Company %d" % number,
+            "symbol": "SYM%d" % number,
+            "price": 10.5,
+            "available_shares": 100,
+            "currency": "USD",
+            **values,
+        }
+        response = client.post("/company", json=body)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return make_company
+
+
+def register(client) -> dict:
+    number = next(names)
+    username = "user%d" % number
+    response = client.post(
+        "/account/auth/register",
+        json={
+            "username": username,
+            "password": PASSWORD,
+            "email": "%s@example.com" % username,
+        },
+    )
+    assert response.status_code in (200, 201), response.text
+    response = client.post(
+        "/account/login", data={"username": username, "password": PASSWORD}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": "Bearer %s" % response.json()["access_token"]}
+
+
+@pytest.fixture
+def auth_headers(client):
+    return register(client)
@@ -0,0 +1,78 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.admission import AdmissionMiddleware, classify
+from app.core.auth import create_access_token
+from app.db.database import pool_stats
+
+
+def admitted_app(**options) -> TestClient:
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/{path:path}", endpoint, methods=["GET", "POST"])])
+    options = {
+        "rate": 0.001,
+        "burst": 3.0,
+        "concurrency": {"trade": 1, "write": 1},
+        "shed_wait": 0.5,
+        **options,
+    }
+    return TestClient(AdmissionMiddleware(app, **options))
+
+
+def bearer(subject: str) -> dict:
+    return {"Authorization": "Bearer %s" % create_access_token({"sub": subject})}
+
+
+def test_classify():
+    assert classify("POST", "/shares/buy/1") == ("trade", 5.0)
+    assert classify("POST", "/company/bulk") == ("write", 20.0)
+    assert classify("GET", "/company") == ("read", 1.0)
+    assert classify("DELETE", "/company/1") == ("write", 2.0)
+
+
+def test_rate_limit():
+    client = admitted_app()
+    for _ in range(3):
+        assert client.get("/company").status_code == 200
+    response = client.get("/company")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # users have their own buckets; an invalid token falls back to the IP
+    assert client.get("/company", headers=bearer("alice")).status_code == 200
+    assert client.get("/company", headers=bearer("bob")).status_code == 200
+    invalid = {"Authorization": "Bearer nonsense"}
+    assert client.get("/company", headers=invalid).status_code == 429
+
+    # a cost above the burst is capped rather than never admitted
+    assert client.post("/company/bulk", headers=bearer("carol")).status_code == 200
+
+
+def test_concurrency_limit():
+    client = admitted_app(rate=1000.0, burst=1000.0)
+    middleware = client.app
+    middleware.in_flight["trade"] = 1
+    response = client.post("/shares/buy/1")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # other classes are unaffected
+    assert client.post("/company/prices").status_code == 200
+
+    middleware.in_flight["trade"] = 0
+    assert client.post("/shares/buy/1").status_code == 200
+    assert middleware.in_flight == {"trade": 0, "write": 0}
+
+
+def test_sheds_db_bound_requests(monkeypatch):
+    client = admitted_app(rate=1000.0, burst=1000.0)
+    monkeypatch.setattr(pool_stats, "recent_wait", lambda: 1.0)
+    assert client.post("/shares/buy/1").status_code == 503
+    assert client.post("/company/prices").status_code == 503
+    assert client.get("/company").status_code == 200
+
+    monkeypatch.setattr(pool_stats, "recent_wait", lambda: 0.1)
+    assert client.post("/shares/buy/1").status_code == 200
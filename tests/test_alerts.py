@@ -0,0 +1,78 @@
+import time
+
+
+def create_alert(client, headers, company: dict, direction: str, threshold: float):
+    response = client.post(
+        "/alerts",
+        json={
+            "company_id": company["id"],
+            "direction": direction,
+            "threshold": threshold,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def deliveries(client, headers) -> list:
+    response = client.get("/alerts/deliveries", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_alert_fires_on_price_change(client, make_company, auth_headers):
+    company = make_company(price=10.0)
+    above = create_alert(client, auth_headers, company, "above", 12.0)
+    below = create_alert(client, auth_headers, company, "below", 5.0)
+    assert above["active"] and above["triggered_at"] is None
+    assert deliveries(client, auth_headers) == []
+
+    path = "/company/%d" % company["id"]
+    assert client.patch(path, json={"price": 11.0}).status_code == 200
+    assert deliveries(client, auth_headers) == []
+    assert client.patch(path, json={"price": 12.5}).status_code == 200
+    [delivery] = deliveries(client, auth_headers)
+    assert delivery["alert_id"] == above["id"]
+    assert delivery["price"] == 12.5
+    assert delivery["symbol"] == company["symbol"]
+    # delivered once
+    assert deliveries(client, auth_headers) == []
+
+    # marked inactive in the background
+    for _ in range(50):
+        listed = client.get("/alerts", headers=auth_headers).json()
+        if not next(alert for alert in listed if alert["id"] == above["id"])["active"]:
+            break
+        time.sleep(0.05)
+    active = client.get("/alerts", params={"active": True}, headers=auth_headers)
+    assert [alert["id"] for alert in active.json()] == [below["id"]]
+
+    # one-shot: crossing again does not fire it a second time
+    assert client.patch(path, json={"price": 11.0}).status_code == 200
+    assert client.patch(path, json={"price": 13.0}).status_code == 200
+    assert deliveries(client, auth_headers) == []
+
+
+def test_alert_satisfied_on_creation(client, make_company, auth_headers):
+    company = make_company(price=10.0)
+    alert = create_alert(client, auth_headers, company, "below", 10.0)
+    assert not alert["active"]
+    assert alert["triggered_price"] == 10.0
+    assert alert["triggered_at"] is not None
+    [delivery] = deliveries(client, auth_headers)
+    assert delivery["alert_id"] == alert["id"]
+
+    listed = client.get("/alerts", headers=auth_headers).json()
+    assert [(row["id"], row["active"]) for row in listed] == [(alert["id"], False)]
+
+
+def test_watchlist(client, make_company, auth_headers):
+    first, second = make_company(), make_company()
+    for company in (first, second):
+        path = "/alerts/watchlist/%d" % company["id"]
+        assert client.put(path, headers=auth_headers).ok
+    path = "/alerts/watchlist/%d" % first["id"]
+    assert client.delete(path, headers=auth_headers).ok
+    watched = client.get("/alerts/watchlist", headers=auth_headers).json()
+    assert [company["id"] for company in watched] == [second["id"]]
@@ -0,0 +1,66 @@
+import asyncio
+
+from sqlalchemy import update
+
+from app.core.auth import TokenRevocations, create_access_token, revocations
+from app.models import User
+
+from .conftest import PASSWORD
+
+
+def login(client, username: str) -> dict:
+    response = client.post(
+        "/account/login", data={"username": username, "password": PASSWORD}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": "Bearer %s" % response.json()["access_token"]}
+
+
+def me(client, headers: dict):
+    return client.get("/account/users/me/", headers=headers)
+
+
+def test_logout_revokes_every_token(client, auth_headers, migrated):
+    user = me(client, auth_headers).json()
+    other_device = login(client, user["username"])
+    assert me(client, other_device).status_code == 200
+
+    assert client.post("/account/logout", headers=auth_headers).status_code == 204
+    assert me(client, auth_headers).status_code == 401
+    assert me(client, other_device).status_code == 401
+    assert client.post("/account/logout", headers=auth_headers).status_code == 401
+
+    # tokens issued afterwards carry the new version
+    fresh = login(client, user["username"])
+    assert me(client, fresh).status_code == 200
+
+    # other processes pick the revocation up from the table
+    elsewhere = TokenRevocations(60)
+    asyncio.run(elsewhere.refresh())
+    assert elsewhere.versions[user["id"]] == revocations.versions[user["id"]]
+
+
+def test_disabled_users(client, auth_headers, migrated):
+    user = me(client, auth_headers).json()
+    with migrated.begin() as conn:
+        conn.execute(update(User).where(User.id == user["id"]).values(disabled=True))
+    try:
+        asyncio.run(revocations.refresh())
+        assert user["id"] in revocations.disabled
+        assert me(client, auth_headers).status_code == 401
+    finally:
+        with migrated.begin() as conn:
+            conn.execute(
+                update(User).where(User.id == user["id"]).values(disabled=False)
+            )
+        asyncio.run(revocations.refresh())
+    assert me(client, auth_headers).status_code == 200
+
+
+def test_legacy_token(client, auth_headers):
+    # issued before the claims were added: the user is looked up by name
+    user = me(client, auth_headers).json()
+    legacy = create_access_token({"sub": user["username"]})
+    response = me(client, {"Authorization": "Bearer %s" % legacy})
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == user["id"]
@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.db.database import engine
+
+
+@contextmanager
+def statements():
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def batch(client, **params):
+    return client.get("/company/batch", params=params)
+
+
+def test_batch(client, make_company, auth_headers):
+    first = make_company(price=9.0)
+    second = make_company(price=18.0, currency="EUR")
+    held = make_company()
+    response = client.post(
+        "/shares/buy/%d" % held["id"], json={"quantity": 1}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+
+    with statements() as seen:
+        response = batch(
+            client,
+            ids=["%d,999999" % second["id"], str(first["id"])],
+            symbols=[first["symbol"].lower(), "%s,NOPE" % held["symbol"]],
+        )
+    assert response.status_code == 200, response.text
+    result = response.json()
+    # ids first, in request order, then symbols; each company once
+    assert [row["id"] for row in result["companies"]] == [
+        second["id"],
+        first["id"],
+        held["id"],
+    ]
+    assert result["missing"] == {"ids": [999999], "symbols": ["NOPE"]}
+    # rows are read as columns, without loading their shareholders
+    assert not [sql for sql in seen if "shareholder" in sql.lower()]
+
+    converted = batch(client, ids=[first["id"], second["id"]], currency="EUR").json()
+    assert [row["price"] for row in converted["companies"]] == [8.1, 18.0]
+
+
+def test_batch_limits(client):
+    empty = batch(client).json()
+    assert empty == {"companies": [], "missing": {"ids": [], "symbols": []}}
+
+    response = batch(client, ids=",".join(map(str, range(1, 301))), symbols=["X"] * 2)
+    assert response.status_code == 200
+    response = batch(
+        client,
+        ids=",".join(map(str, range(1, 301))),
+        symbols=",".join("S%d" % n for n in range(201)),
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"] == "At most 500 ids and symbols"
+
+    response = batch(client, ids="1,two")
+    assert response.status_code == 422
+    assert response.json()["detail"] == "ids must be integers"
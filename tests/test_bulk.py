@@ -0,0 +1,70 @@
+import json
+import uuid
+
+from app.core.config import settings
+
+
+def bulk(client, body: str, content_type: str):
+    return client.post(
+        "/company/bulk", data=body.encode(), headers={"Content-Type": content_type}
+    )
+
+
+def test_csv_partial_failure(client, make_company, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_IMPORT_CHUNK_SIZE", 2)
+    existing = make_company()
+    tag = uuid.uuid4().hex[:6].upper()
+    lines = [
+        "name,symbol,price,available_shares,currency",
+        "Bulk %s A,BA%s,1.5,10,USD" % (tag, tag),
+        "Bulk %s B,BB%s,x,10,USD" % (tag, tag),
+        "Bulk %s C,BC%s,2.5,10" % (tag, tag),
+        "%s,BD%s,3,10,USD" % (existing["name"], tag),
+        "Bulk %s E,BE%s,4,10,EUR" % (tag, tag),
+        "Bulk %s F,BA%s,5,10,USD" % (tag, tag),
+        "",
+        "Bulk %s G,BG%s,6,10,GBP" % (tag, tag),
+    ]
+    response = bulk(client, "\r\n".join(lines) + "\r\n", "text/csv; charset=utf-8")
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["inserted"] == 3
+    assert result["rejected"] == 4
+    assert [error["line"] for error in result["errors"]] == [3, 4, 5, 7]
+    assert result["errors"][1]["detail"] == "expected 5 fields, got 4"
+    assert result["errors"][2]["detail"] == "Company already exists"
+    assert result["errors"][3]["detail"] == "Symbol already exists"
+
+    # visible to the in-memory views right away
+    found = client.get("/company/search", params={"q": "Bulk %s" % tag}).json()
+    assert sorted(row["symbol"] for row in found) == [
+        "BA" + tag,
+        "BE" + tag,
+        "BG" + tag,
+    ]
+    listed = client.get("/company", params={"name": "Bulk %s" % tag}).json()
+    assert len(listed) == 3
+    stats = client.get("/company/%d/stats" % found[0]["id"])
+    assert stats.status_code == 200
+
+
+def test_ndjson(client):
+    tag = uuid.uuid4().hex[:6].upper()
+    row = {
+        "name": "Nd %s" % tag,
+        "symbol": "ND" + tag,
+        "price": 1,
+        "available_shares": 5,
+        "currency": "USD",
+    }
+    body = "\n".join([json.dumps(row), "{not json", "[1, 2]", json.dumps(row)])
+    response = bulk(client, body, "application/x-ndjson")
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["rejected"]) == (1, 3)
+    assert [error["line"] for error in result["errors"]] == [2, 3, 4]
+    assert result["errors"][1]["detail"] == "expected a JSON object"
+
+
+def test_unsupported_media_type(client):
+    assert bulk(client, "{}", "application/json").status_code == 415
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.auth import create_access_token
+from app.core.capture import CaptureMiddleware, capture
+from benchmarks.replay import build_request, load_capture
+
+
+@pytest.fixture
+def captured(tmp_path):
+    async def endpoint(request):
+        await request.body()
+        return PlainTextResponse("ok", status_code=201)
+
+    app = Starlette(
+        routes=[
+            Route("/items/{item_id}", endpoint, methods=["GET", "POST"]),
+            Route("/account/login", endpoint, methods=["POST"]),
+        ]
+    )
+    path = str(tmp_path / "requests.jsonl")
+    capture.start(path, max_bytes=1 << 20, backups=1)
+    try:
+        yield TestClient(CaptureMiddleware(app, sample_rate=1.0, max_body=64)), path
+    finally:
+        capture.stop()
+
+
+def test_capture_and_replay(captured):
+    client, path = captured
+    token = create_access_token({"sub": "alice"})
+    client.get(
+        "/items/3?fields=a&fields=b", headers={"Authorization": "Bearer " + token}
+    )
+    client.post("/items/4", data=b"\xff\x00", headers={"Content-Type": "x/binary"})
+    client.post("/account/login", data={"username": "alice", "password": "secret"})
+    client.post("/items/5", data=b"x" * 65)
+    capture.stop()
+
+    with open(path) as fh:
+        get, binary, login, large = [json.loads(line) for line in fh]
+    assert (get["route"], get["path"]) == ("/items/{item_id}", "/items/3")
+    assert (get["subject"], get["status"]) == ("alice", 201)
+    assert token not in json.dumps(get)
+    assert binary["base64"] is True
+    assert login["redacted"] is True and login["body"] is None
+    assert "secret" not in json.dumps(login)
+    assert large["truncated"] == 65
+
+    records, skipped = load_capture([path])
+    assert records == [get, binary]
+    assert skipped == {"redacted": 1, "truncated": 1}
+
+    request = build_request(get, {"alice": "signed"})
+    assert request["params"] == {"fields": ["a", "b"]}
+    assert request["headers"] == {"Authorization": "Bearer signed"}
+    assert build_request(get, {}) is None
+    assert build_request(binary, {})["content"] == b"\xff\x00"
+
+
+def test_sampling(captured):
+    client, path = captured
+    client.app.sample_rate = 0.0
+    assert client.get("/items/1").status_code == 201
+    capture.stop()
+    with open(path) as fh:
+        assert fh.read() == ""
@@ -0,0 +1,59 @@
+import pytest
+
+from app.db.database import pool_stats
+
+
+def checkouts(send) -> int:
+    # requests run one at a time, so the counter only sees this one
+    before = pool_stats.checkouts
+    response = send()
+    assert response.status_code < 400, response.text
+    return pool_stats.checkouts - before
+
+
+@pytest.fixture
+def company(client, make_company):
+    # bulk writes in earlier tests leave the views to reload on their next read
+    client.get("/company", params={"price__sort": "asc", "limit": "1"})
+    client.get("/company/search", params={"q": "comp"})
+    return make_company()
+
+
+@pytest.mark.parametrize(
+    "path, params, expected",
+    [
+        ("/company", {"price__sort": "asc", "limit": "50"}, 0),
+        ("/company", {"name": "Company"}, 1),
+        ("/company/search", {"q": "comp"}, 0),
+        ("/company/{id}", {}, 1),
+        ("/company/{id}", {"currency": "EUR"}, 1),
+        ("/company/batch", {"ids": "{id}", "currency": "EUR"}, 1),
+        ("/company/changes", {}, 1),
+    ],
+)
+def test_reads(client, company, path, params, expected):
+    path = path.format(id=company["id"])
+    params = {key: value.format(id=company["id"]) for key, value in params.items()}
+    assert checkouts(lambda: client.get(path, params=params)) == expected
+
+
+def test_revalidated_detail(client, company):
+    path = "/company/%d" % company["id"]
+    headers = {"If-None-Match": client.get(path).headers["etag"]}
+    assert checkouts(lambda: client.get(path, headers=headers)) == 0
+
+
+def test_trades(client, company, auth_headers):
+    # one connection up to the commit and one to read the result back
+    buy = "/shares/buy/%d" % company["id"]
+    sell = "/shares/sell/%d" % company["id"]
+    body = {"quantity": 2}
+    assert checkouts(lambda: client.post(buy, json=body, headers=auth_headers)) == 2
+    assert checkouts(lambda: client.post(sell, json=body, headers=auth_headers)) == 2
+
+
+def test_login(client, auth_headers):
+    form = {"username": "nobody", "password": "wrong"}
+    before = pool_stats.checkouts
+    assert client.post("/account/login", data=form).status_code == 401
+    assert pool_stats.checkouts - before == 1
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, select, text, update
+from sqlmodel import SQLModel
+
+from app.models import ChangeCounter, Company, CompanyTombstone
+from app.services.changes import prune_tombstones
+
+
+def test_migrations_match_models(migrated):
+    with migrated.connect() as conn:
+        diffs = compare_metadata(MigrationContext.configure(conn), SQLModel.metadata)
+    # SQLite reports INTEGER PRIMARY KEY columns as nullable
+    diffs = [
+        diff
+        for diff in diffs
+        if not (
+            isinstance(diff, list)
+            and diff[0][0] == "modify_nullable"
+            and diff[0][3] == "id"
+        )
+    ]
+    assert diffs == []
+
+
+def test_company_crud(client, make_company):
+    company = make_company(price=12.25, available_shares=40)
+    path = "/company/%d" % company["id"]
+    assert client.get(path).json()["price"] == 12.25
+
+    response = client.patch(path, json={"price": 13.5})
+    assert response.status_code == 200, response.text
+    assert response.json()["price"] == 13.5
+
+    body = {**company, "name": company["name"] + " Renamed", "available_shares": 41}
+    response = client.put(path, json=body)
+    assert response.status_code == 200, response.text
+    assert client.get(path).json()["available_shares"] == 41
+
+    found = client.get("/company", params={"name": "Renamed"}).json()
+    assert [row["id"] for row in found] == [company["id"]]
+
+    assert client.post("/company", json=company).status_code >= 400
+    assert client.delete(path).status_code == 204
+    assert client.get(path).status_code == 404
+
+
+def test_trades(client, make_company, auth_headers):
+    company = make_company(available_shares=10)
+    buy = "/shares/buy/%d" % company["id"]
+    sell = "/shares/sell/%d" % company["id"]
+
+    assert client.post(buy, json={"quantity": 4}, headers=auth_headers).ok
+    assert (
+        client.post(buy, json={"quantity": 7}, headers=auth_headers).status_code == 406
+    )
+    assert client.post(sell, json={"quantity": 1}, headers=auth_headers).ok
+    assert (
+        client.post(sell, json={"quantity": 9}, headers=auth_headers).status_code == 406
+    )
+
+    assert client.get("/company/%d" % company["id"]).json()["available_shares"] == 7
+    stats = client.get("/company/%d/stats" % company["id"]).json()
+    assert stats["holders"] == 1
+    assert stats["held_quantity"] == 3
+
+
+def changes(client, token=None) -> dict:
+    params = {"limit": 10000} if token is None else {"since": token, "limit": 10000}
+    response = client.get("/company/changes", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_change_feed(client, make_company):
+    token = changes(client)["token"]
+    created = make_company()
+    updated = make_company()
+    deleted = make_company()
+    client.patch("/company/%d" % updated["id"], json={"price": 99.5})
+    client.delete("/company/%d" % deleted["id"])
+
+    page = changes(client, token)
+    assert {row["id"] for row in page["changed"]} == {created["id"], updated["id"]}
+    assert page["deleted"] == [deleted["id"]]
+    assert not page["more"]
+
+    assert changes(client, page["token"])["changed"] == []
+    assert client.get("/company/changes", params={"since": "nope"}).status_code == 422
+
+
+def test_change_feed_pages(client, make_company):
+    token = changes(client)["token"]
+    ids = {make_company()["id"] for _ in range(5)}
+    seen = set()
+    more = True
+    while more:
+        response = client.get("/company/changes", params={"since": token, "limit": 2})
+        page = response.json()
+        seen.update(row["id"] for row in page["changed"])
+        token, more = page["token"], page["more"]
+    assert seen == ids
+
+
+def test_change_feed_after_pruning(client, make_company, migrated):
+    old = changes(client)["token"]
+    company = make_company()
+    client.delete("/company/%d" % company["id"])
+
+    with migrated.begin() as conn:
+        conn.execute(
+            update(CompanyTombstone.__table__).values(
+                deleted_at=datetime.now(timezone.utc) - timedelta(days=365)
+            )
+        )
+    assert prune_tombstones() >= 1
+
+    assert client.get("/company/changes", params={"since": old}).status_code == 410
+    fresh = changes(client)
+    assert company["id"] not in {row["id"] for row in fresh["changed"]}
+    assert changes(client, fresh["token"])["deleted"] == []
+
+
+def test_change_seq_per_transaction(migrated, make_company):
+    first, second = make_company(), make_company()
+    ids = [first["id"], second["id"]]
+    counter = select(ChangeCounter.seq)
+    with migrated.begin() as conn:
+        before = conn.execute(counter).scalar()
+        for price in (20.0, 21.0):
+            conn.execute(update(Company).where(Company.id.in_(ids)).values(price=price))
+    with migrated.connect() as conn:
+        assert conn.execute(counter).scalar() == before + 1
+        rows = conn.execute(select(Company.change_seq).where(Company.id.in_(ids)))
+        assert set(rows.scalars()) == {before + 1}
+
+    # other engines, e.g. the benchmark seeders, are left alone
+    other = create_engine(migrated.url)
+    with other.begin() as conn:
+        conn.execute(text("UPDATE company SET price = 22.0 WHERE id = %d" % ids[0]))
+        conn.execute(update(Company).where(Company.id == ids[0]).values(price=23.0))
+    with migrated.connect() as conn:
+        assert conn.execute(counter).scalar() == before + 1
+    other.dispose()
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.deadlines import (
+    MIB,
+    DeadlineMiddleware,
+    exceeded,
+    mark_committing,
+    remaining,
+    route_timeout,
+    within_deadline,
+)
+
+
+async def slow(request):
+    await asyncio.sleep(float(request.query_params.get("sleep", 0)))
+    return JSONResponse({"remaining": remaining()})
+
+
+async def bounded(request):
+    # what sessions and upstream calls do with the deadline
+    await within_deadline(asyncio.sleep(1))
+    return JSONResponse({})
+
+
+async def commits(request):
+    mark_committing()
+    await asyncio.sleep(0.3)
+    return JSONResponse({}, status_code=201)
+
+
+@pytest.fixture
+def client():
+    app = Starlette(
+        routes=[
+            Route("/slow", slow),
+            Route("/bounded", bounded),
+            Route("/commits", commits, methods=["POST"]),
+        ]
+    )
+    return TestClient(DeadlineMiddleware(app, default=0.1))
+
+
+def test_route_timeout():
+    assert route_timeout("GET", "/company", 5.0) == 5.0
+    assert route_timeout("GET", "/jobs/1", 5.0) == 60.0
+    assert route_timeout("POST", "/company/bulk", 5.0, 10 * MIB) == 160.0
+
+
+def test_deadline_exceeded(client):
+    before = exceeded["GET /slow"]
+    response = client.get("/slow", params={"sleep": 0.3})
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Deadline exceeded"}
+    assert exceeded["GET /slow"] == before + 1
+
+    # the handler sees what is left of its budget
+    left = client.get("/slow").json()["remaining"]
+    assert 0 < left <= 0.1
+
+    assert client.get("/bounded").status_code == 504
+
+
+def test_header_shortens_only(client):
+    def sleep(seconds: float, timeout: str) -> int:
+        response = client.get(
+            "/slow", params={"sleep": seconds}, headers={"X-Request-Timeout": timeout}
+        )
+        return response.status_code
+
+    assert sleep(0.05, "0.01") == 504
+    assert sleep(0.3, "10") == 504
+    assert sleep(0, "soon") == 200
+
+
+def test_commits_run_to_the_end(client):
+    assert client.post("/commits").status_code == 201
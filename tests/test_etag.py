@@ -0,0 +1,53 @@
+def revalidate(client, path: str, etag: str, **params):
+    return client.get(path, params=params, headers={"If-None-Match": etag})
+
+
+def test_detail_not_modified(client, make_company):
+    company = make_company(price=10.0)
+    path = "/company/%d" % company["id"]
+    response = client.get(path)
+    etag = response.headers["ETag"]
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+    response = revalidate(client, path, etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+    assert client.patch(path, json={"price": 11.0}).status_code == 200
+    response = revalidate(client, path, etag)
+    assert response.status_code == 200
+    assert response.json()["price"] == 11.0
+    assert response.headers["ETag"] != etag
+
+
+def test_detail_converted_follows_rates(client, make_company):
+    # imported once the app is: the Currency enum reads the migrated rates
+    from app.services.rates import current_rates
+
+    company = make_company(price=10.0, currency="USD")
+    path = "/company/%d" % company["id"]
+    etag = client.get(path, params={"currency": "EUR"}).headers["ETag"]
+    assert client.get(path).headers["ETag"] != etag
+    assert revalidate(client, path, etag, currency="EUR").status_code == 304
+
+    # new EUR rates do not reprice a USD company, but change its EUR price
+    current_rates.bump()
+    response = revalidate(client, path, etag, currency="EUR")
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_list_not_modified(client, make_company):
+    make_company()
+    response = client.get("/company", headers={"Accept-Encoding": "gzip"})
+    etag = response.headers["ETag"]
+    assert revalidate(client, "/company", etag).status_code == 304
+
+    make_company()
+    response = client.get(
+        "/company", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
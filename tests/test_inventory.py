@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.services.inventory import Inventory, Journal, UnknownCompany
+
+
+def user_id(client, headers) -> int:
+    return client.get("/account/users/me/", headers=headers).json()["id"]
+
+
+async def start(symbol: str, path: str) -> Inventory:
+    inventory = Inventory([symbol], 3600, Journal(path))
+    await inventory.load()
+    return inventory
+
+
+async def settle(inventory: Inventory) -> None:
+    await inventory.flush()
+    if inventory.journal.writing is not None:
+        await inventory.journal.writing
+
+
+async def crash(inventory: Inventory) -> None:
+    inventory.task.cancel()
+    await asyncio.gather(inventory.task, return_exceptions=True)
+    inventory.journal.close()
+
+
+def test_journal_recovery(client, make_company, auth_headers, tmp_path):
+    company = make_company(available_shares=10)
+    buyer = user_id(client, auth_headers)
+    path = str(tmp_path / "inventory.journal")
+
+    async def reserve():
+        inventory = await start(company["symbol"], path)
+        await inventory.buy(buyer, company["id"], 3)
+        await settle(inventory)
+        # rotated down to what the database does not have yet
+        assert inventory.journal.read() == []
+        await inventory.buy(buyer, company["id"], 2)
+        assert len(inventory.journal.read()) == 1
+        await crash(inventory)
+
+    async def recover():
+        inventory = await start(company["symbol"], path)
+        assert inventory.available[company["id"]] == 5
+        assert inventory.journal.read() == []
+        await inventory.stop()
+
+    asyncio.run(reserve())
+    asyncio.run(recover())
+    # replayed once
+    asyncio.run(recover())
+    assert client.get("/company/%d" % company["id"]).json()["available_shares"] == 5
+    stats = client.get("/company/%d/stats" % company["id"]).json()
+    assert stats["held_quantity"] == 5
+
+
+def test_journal_drops_deleted_company(client, make_company, auth_headers, tmp_path):
+    company = make_company(available_shares=10)
+    kept = make_company(available_shares=10)
+    buyer = user_id(client, auth_headers)
+    path = str(tmp_path / "inventory.journal")
+
+    async def reserve():
+        inventory = Inventory([company["symbol"], kept["symbol"]], 3600, Journal(path))
+        await inventory.load()
+        await inventory.buy(buyer, company["id"], 3)
+        await inventory.buy(buyer, kept["id"], 4)
+        inventory.delete([company["id"]])
+        with pytest.raises(UnknownCompany):
+            await inventory.buy(buyer, company["id"], 1)
+        if inventory.journal.writing is not None:
+            await inventory.journal.writing
+        assert [entry["company_id"] for entry in inventory.journal.read()] == [
+            kept["id"]
+        ]
+        await settle(inventory)
+        await inventory.stop()
+
+    asyncio.run(reserve())
+    assert client.delete("/company/%d" % company["id"]).status_code == 204
+    assert client.get("/company/%d" % kept["id"]).json()["available_shares"] == 6
@@ -0,0 +1,98 @@
+import json
+import logging
+import queue
+import sys
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core import logs
+from app.core.logs import (
+    ContextFilter,
+    JSONFormatter,
+    NonBlockingQueueHandler,
+    RequestIdMiddleware,
+    request_id,
+)
+
+
+def record(name: str, level: int = logging.INFO, msg: str = "hello", args=None):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_request_id():
+    async def endpoint(request):
+        return PlainTextResponse(request_id.get())
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    client = TestClient(RequestIdMiddleware(app))
+
+    response = client.get("/", headers={"X-Request-ID": "req-1.a_b"})
+    assert response.headers["X-Request-ID"] == response.text == "req-1.a_b"
+    for invalid in ("has spaces", "x" * 65, ""):
+        response = client.get("/", headers={"X-Request-ID": invalid})
+        assert response.headers["X-Request-ID"] == response.text
+        assert len(response.text) == 32 and response.text != invalid
+    assert request_id.get() is None
+
+
+def test_app_echoes_request_id(client):
+    response = client.get("/company/search", params={"q": "x"})
+    generated = response.headers["X-Request-ID"]
+    response = client.get(
+        "/company/search", params={"q": "x"}, headers={"X-Request-ID": generated}
+    )
+    assert response.headers["X-Request-ID"] == generated
+
+
+def test_sampling(monkeypatch):
+    context = ContextFilter({"app": 0.5, "app.api": 0.0, "uvicorn.access": 0.0})
+    assert context.rate("app.services.rates") == 0.5
+    assert context.rate("app.api.company") == 0.0
+    assert context.rate("application") == 1.0
+    assert context.rate("uvicorn") == 1.0
+
+    monkeypatch.setattr(logs.random, "random", lambda: 0.4)
+    assert context.filter(record("app.services"))
+    assert not context.filter(record("app.api.company"))
+    # warnings and above are never sampled away
+    assert context.filter(record("app.api.company", logging.WARNING))
+
+    token = request_id.set("abc")
+    try:
+        kept = record("other")
+        assert context.filter(kept)
+        assert kept.request_id == "abc"
+    finally:
+        request_id.reset(token)
+
+
+def test_queue_handler_drops_when_full():
+    records: queue.Queue = queue.Queue(1)
+    handler = NonBlockingQueueHandler(records)
+    handler.handle(record("app", msg="%s of %d", args=("one", 2)))
+    handler.handle(record("app", msg="two"))
+    assert handler.dropped == 1
+
+    queued = records.get_nowait()
+    # resolved before crossing to the writer thread
+    assert (queued.msg, queued.args) == ("one of 2", None)
+
+
+def test_json_formatter():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        entry = record("app", logging.ERROR, "failed %s", ("job",))
+        entry.exc_info = sys.exc_info()
+    entry.request_id = "abc"
+    entry.job_id = 7
+    entry.exc_text = logging.Formatter().formatException(entry.exc_info)
+
+    line = json.loads(JSONFormatter().format(entry))
+    assert line["message"] == "failed job"
+    assert (line["level"], line["logger"]) == ("ERROR", "app")
+    assert (line["request_id"], line["job_id"]) == ("abc", 7)
+    assert "ValueError: boom" in line["exception"]
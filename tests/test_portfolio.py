@@ -0,0 +1,48 @@
+from app.services.portfolio import snapshot_portfolios
+
+
+def buy(client, company: dict, quantity: int, headers: dict) -> None:
+    response = client.post(
+        "/shares/buy/%d" % company["id"], json={"quantity": quantity}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+
+
+def history(client, headers: dict, **params) -> list:
+    response = client.get("/shares/portfolio/history", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_snapshots(client, make_company, auth_headers):
+    buy(client, make_company(price=10.0), 2, auth_headers)
+    buy(client, make_company(price=9.0, currency="EUR"), 3, auth_headers)
+    assert history(client, auth_headers) == []
+
+    # EUR is quoted at 0.9 to the dollar
+    assert snapshot_portfolios("USD") > 0
+    assert snapshot_portfolios("EUR") > 0
+
+    newest, oldest = history(client, auth_headers)
+    assert (oldest["currency"], oldest["value"], oldest["holdings"]) == (
+        "USD",
+        50.0,
+        2,
+    )
+    assert (newest["currency"], newest["value"], newest["holdings"]) == (
+        "EUR",
+        45.0,
+        2,
+    )
+    assert history(client, auth_headers, limit=1) == [newest]
+    assert history(client, auth_headers, since=newest["taken_at"]) == [newest]
+
+
+def test_users_without_holdings(client, auth_headers):
+    snapshot_portfolios()
+    [snapshot] = history(client, auth_headers)
+    assert (snapshot["value"], snapshot["holdings"]) == (0.0, 0)
+
+
+def test_history_needs_a_token(client):
+    assert client.get("/shares/portfolio/history").status_code == 401
@@ -0,0 +1,35 @@
+def test_bulk_prices(client, make_company):
+    first = make_company(price=10.0)
+    second = make_company(price=20.0)
+    unchanged = make_company(price=30.0)
+    before = client.get("/company/%d" % unchanged["id"]).json()
+
+    response = client.post(
+        "/company/prices",
+        json={
+            first["symbol"].lower(): 11.5,
+            second["symbol"]: 21.0,
+            unchanged["symbol"]: 30.0,
+            "NOPE-NOT-LISTED": 1.0,
+            "BAD": -1,
+        },
+    )
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["applied"] == 3
+    assert sorted(result["rejected"]) == ["BAD", "NOPE-NOT-LISTED"]
+    assert result["rejected"]["NOPE-NOT-LISTED"] == "Company not found"
+
+    assert client.get("/company/%d" % first["id"]).json()["price"] == 11.5
+    assert client.get("/company/%d" % second["id"]).json()["price"] == 21.0
+    # an equal price is not a write
+    after = client.get("/company/%d" % unchanged["id"]).json()
+    assert after["updated_at"] == before["updated_at"]
+
+    # the in-memory views follow
+    listed = client.get(
+        "/company", params={"price__gt": 11.4, "price__sort": "asc", "limit": 1000}
+    ).json()
+    prices = {row["id"]: row["price"] for row in listed}
+    assert prices[first["id"]] == 11.5
+    assert prices[second["id"]] == 21.0
@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.models import RateHistory
+
+table = RateHistory.__table__
+OBSERVED = [
+    ("USD", 1.0, datetime(2022, 1, 1, 9)),
+    ("EUR", 0.8, datetime(2022, 1, 1, 9)),
+    ("EUR", 0.84, datetime(2022, 3, 1, 9)),
+    ("EUR", 0.85, datetime(2022, 3, 1, 17)),
+]
+
+
+@pytest.fixture
+def history(client, migrated):
+    # imported once the app is: the Currency enum reads the migrated rates
+    from app.services.rates import rate_history
+
+    with migrated.begin() as conn:
+        conn.execute(delete(table))
+        conn.execute(
+            table.insert(),
+            [
+                {
+                    "base": "USD",
+                    "currency": currency,
+                    "rate": rate,
+                    "observed_at": observed_at.replace(tzinfo=timezone.utc),
+                }
+                for currency, rate, observed_at in OBSERVED
+            ],
+        )
+    rate_history.invalidate()
+    yield rate_history
+    with migrated.begin() as conn:
+        conn.execute(delete(table))
+    rate_history.invalidate()
+
+
+def converted(client, company: dict, **params):
+    return client.get(
+        "/company/%d" % company["id"], params={"currency": "USD", **params}
+    )
+
+
+def test_as_of(client, make_company, history):
+    company = make_company(price=17.0, currency="EUR")
+    # the close of the day, not the first rate seen that day
+    response = converted(client, company, as_of="2022-03-01")
+    assert response.status_code == 200, response.text
+    assert response.json()["price"] == 20.0
+    assert converted(client, company, as_of="2022-02-15").json()["price"] == 21.25
+    # the current rate table still quotes EUR at 0.9
+    assert converted(client, company).json()["price"] == 18.89
+
+    response = converted(client, company, as_of="2021-12-31")
+    assert response.status_code == 404
+    assert "No exchange rate" in response.json()["detail"]
+
+    batch = client.get(
+        "/company/batch",
+        params={"ids": str(company["id"]), "currency": "USD", "as_of": "2022-03-01"},
+    )
+    assert batch.status_code == 200, batch.text
+    assert [row["price"] for row in batch.json()["companies"]] == [20.0]
+
+
+def test_etag_follows_history(client, make_company, history):
+    company = make_company(price=17.0, currency="EUR")
+    etag = converted(client, company, as_of="2022-03-01").headers["etag"]
+    assert converted(client, company, as_of="2022-02-15").headers["etag"] != etag
+
+    history.invalidate()
+    response = client.get(
+        "/company/%d" % company["id"],
+        params={"currency": "USD", "as_of": "2022-03-01"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+
+
+def test_compaction_keeps_lookups(client, make_company, migrated, history):
+    from app.services.rates import compact_rate_history
+
+    company = make_company(price=17.0, currency="EUR")
+    before = [
+        converted(client, company, as_of=day).json()["price"]
+        for day in ("2022-01-01", "2022-02-15", "2022-03-01")
+    ]
+    assert compact_rate_history(days=0) == 1
+    with migrated.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(table)).scalar() == 3
+    after = [
+        converted(client, company, as_of=day).json()["price"]
+        for day in ("2022-01-01", "2022-02-15", "2022-03-01")
+    ]
+    assert after == before
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import Response
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, brotli, negotiate
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, respond
+from app.schemas.alerts import PriceAlertSchema
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0, br;q=0", None),
+        ("br;q=0, *", "gzip"),
+        ("br", "br" if brotli else None),
+        ("gzip, br;q=0.5", "br" if brotli else "gzip"),
+    ],
+)
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+
+def compressed_app(body: str) -> TestClient:
+    async def endpoint(request):
+        return PlainTextResponse(body)
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    return TestClient(CompressionMiddleware(app, minimum_size=100))
+
+
+def test_compression():
+    client = compressed_app("x" * 1000)
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) < 100
+    # decoded by the client
+    assert response.text == "x" * 1000
+
+    response = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.text == "x" * 1000
+
+    # too small to be worth it
+    response = compressed_app("x" * 99).get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_fast_json_response():
+    at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    alert = PriceAlertSchema(
+        id=1,
+        company_id=2,
+        direction="above",
+        threshold=1.5,
+        active=True,
+        created_at=at,
+        triggered_at=None,
+        triggered_price=None,
+    )
+    body = json.loads(FastJSONResponse([alert]).body)
+    assert body == [json.loads(alert.json())]
+
+
+def test_respond(monkeypatch):
+    injected = Response(headers={"ETag": '"tag"'})
+    monkeypatch.setattr(settings, "FAST_JSON", False)
+    assert respond({"a": 1}, response=injected) == {"a": 1}
+
+    monkeypatch.setattr(settings, "FAST_JSON", True)
+    response = respond({"a": 1}, status_code=201, response=injected)
+    assert isinstance(response, FastJSONResponse)
+    assert response.status_code == 201
+    assert response.headers["ETag"] == '"tag"'
+    assert json.loads(response.body) == {"a": 1}
@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.config import settings
+
+# far above what other tests create, so only this module's rows match
+FLOOR = 900000
+
+
+def screen(client, **params) -> list:
+    response = client.get("/company", params=params)
+    assert response.status_code == 200, response.text
+    return [row["id"] for row in response.json()]
+
+
+@pytest.fixture
+def companies(client, make_company):
+    created = [
+        make_company(price=price, available_shares=FLOOR + shares, currency=currency)
+        for price, shares, currency in (
+            (30.0, 1, "USD"),
+            (10.0, 4, "EUR"),
+            (20.0, 3, "USD"),
+            (40.0, 2, "GBP"),
+        )
+    ]
+    yield created
+    for company in created:
+        client.delete("/company/%d" % company["id"])
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"price__sort": "asc"},
+        {"price__sort": "desc", "limit": 2},
+        {"currency": "USD", "price__sort": "asc"},
+        {"available__lt": FLOOR + 3, "price__sort": "asc"},
+        {"available": FLOOR + 2, "available__gt": 0},
+        {"price__gt": 15, "updated": "desc"},
+    ],
+)
+def test_matches_sql(client, companies, monkeypatch, params):
+    params = {"available__gt": FLOOR, **params}
+    served = screen(client, **params)
+    monkeypatch.setattr(settings, "SCREENER_ENABLED", False)
+    assert served == screen(client, **params)
+
+
+def test_follows_writes(client, companies):
+    ids = [company["id"] for company in companies]
+    params = {"available__gt": FLOOR, "price__sort": "asc"}
+    assert screen(client, **params) == [ids[1], ids[2], ids[0], ids[3]]
+
+    path = "/company/%d" % ids[3]
+    assert client.patch(path, json={"price": 5.0}).status_code == 200
+    assert client.delete("/company/%d" % ids[1]).status_code == 204
+    assert screen(client, **params) == [ids[3], ids[2], ids[0]]
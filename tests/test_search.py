@@ -0,0 +1,47 @@
+import uuid
+
+from app.models import Company
+from app.services.search import CompanySearchIndex
+
+
+def test_ranking():
+    index = CompanySearchIndex()
+    index.rebuild(
+        [
+            (1, "Northwind Traders", "NWT"),
+            (2, "Acme North", "ACN"),
+            (3, "North", "NOR"),
+            (4, "Contoso", "NORTH"),
+        ]
+    )
+    # symbol prefix, then name prefix (exact first), then a later word
+    assert [id_ for id_, _, _ in index.search("nor")] == [3, 4, 1, 2]
+    assert [id_ for id_, _, _ in index.search("north", limit=2)] == [4, 3]
+    assert index.search("  ") == []
+
+    index.apply_upsert([Company(id=3, name="South", symbol="SOU")])
+    index.apply_delete([4])
+    assert [id_ for id_, _, _ in index.search("nor")] == [1, 2]
+
+
+def test_search_follows_writes(client, make_company):
+    word = uuid.uuid4().hex[:8]
+    company = make_company(name="Zq %s Holdings" % word)
+
+    def found(query: str) -> list:
+        response = client.get("/company/search", params={"q": query})
+        assert response.status_code == 200, response.text
+        return [row["id"] for row in response.json()]
+
+    assert found(word) == [company["id"]]
+    assert found(word.upper()[:5]) == [company["id"]]
+
+    path = "/company/%d" % company["id"]
+    renamed = "Zq %s Renamed" % uuid.uuid4().hex[:8]
+    assert client.patch(path, json={"name": renamed}).status_code == 200
+    assert found(word) == []
+    assert found(renamed) == [company["id"]]
+
+    assert client.delete(path).status_code == 204
+    assert found(renamed) == []
+    assert client.get("/company/search", params={"q": ""}).status_code == 422
@@ -0,0 +1,64 @@
+import pytest
+
+from .conftest import register
+
+
+def trade(client, side: str, company: dict, quantity: int, headers: dict) -> None:
+    response = client.post(
+        "/shares/%s/%d" % (side, company["id"]),
+        json={"quantity": quantity},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+
+
+def stats(client, company: dict) -> dict:
+    response = client.get("/company/%d/stats" % company["id"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_stats_follow_writes(client, make_company, auth_headers):
+    company = make_company(price=9.0, available_shares=100, currency="EUR")
+    created = stats(client, company)
+    assert (created["holders"], created["held_quantity"]) == (0, 0)
+    # EUR is quoted at 0.9 to the dollar
+    assert (created["market_cap"], created["currency"]) == (900.0, "EUR")
+    assert created["market_cap_base"] == pytest.approx(1000.0)
+    assert created["base_currency"] == "USD"
+
+    other_headers = register(client)
+    trade(client, "buy", company, 5, auth_headers)
+    trade(client, "buy", company, 3, other_headers)
+    traded = stats(client, company)
+    assert (traded["holders"], traded["held_quantity"]) == (2, 8)
+    # shares change hands, the cap does not
+    assert traded["market_cap"] == 900.0
+
+    trade(client, "sell", company, 3, other_headers)
+    assert stats(client, company)["holders"] == 1
+
+    path = "/company/%d" % company["id"]
+    assert client.patch(path, json={"price": 10.0}).status_code == 200
+    repriced = stats(client, company)
+    assert repriced["market_cap"] == 1000.0
+    assert repriced["market_cap_base"] == pytest.approx(1000.0 / 0.9)
+
+    assert client.delete(path).status_code == 204
+    assert client.get(path + "/stats").status_code == 404
+
+
+def test_top_holders(client, make_company, auth_headers):
+    company = make_company()
+    other_headers = register(client)
+    trade(client, "buy", company, 2, auth_headers)
+    trade(client, "buy", company, 7, other_headers)
+    other = client.get("/account/users/me/", headers=other_headers).json()
+
+    path = "/company/%d/holders" % company["id"]
+    holders = client.get(path).json()
+    assert [holder["quantity"] for holder in holders] == [7, 2]
+    assert holders[0]["user_id"] == other["id"]
+    assert holders[0]["username"] == other["username"]
+    assert client.get(path, params={"top": 1}).json() == holders[:1]
+    assert client.get(path, params={"top": 0}).status_code == 422
@@ -0,0 +1,64 @@
+import json
+import time
+
+from app.core.config import settings
+
+
+def wait_for(check, timeout: float = settings.TICK_FLUSH_INTERVAL * 5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def stats(client) -> dict:
+    response = client.get("/company/ticks/stats")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_ticks(client, make_company, monkeypatch):
+    # imports the Currency enum, which needs the migrated rate table
+    from app.services.ticks import ticks
+
+    async def held():
+        pass
+
+    company = make_company(price=10.0)
+    path = "/company/%d" % company["id"]
+    before = stats(client)
+    monkeypatch.setattr(ticks, "flush", held)
+
+    with client.websocket_connect("/company/ticks") as websocket:
+        websocket.send_text("not json")
+        websocket.send_text("[1, 2]")
+        websocket.send_text(
+            json.dumps(
+                {
+                    company["symbol"].lower(): 11.0,
+                    "NOPE-NOT-LISTED": 1.0,
+                    "BAD": "12",
+                    company["symbol"]: -1,
+                }
+            )
+        )
+        websocket.send_text(json.dumps({company["symbol"]: 12.5}))
+
+        # served from the pipeline while nothing is written
+        wait_for(lambda: client.get(path).json()["price"] == 12.5)
+        listed = client.get("/company", params={"name": company["name"]}).json()
+        assert [row["price"] for row in listed] == [12.5]
+
+    after = stats(client)
+    assert after["received"] - before["received"] == 5
+    assert after["rejected"] - before["rejected"] == 5
+    assert after["applied"] == before["applied"]
+
+    monkeypatch.undo()
+
+    def applied() -> bool:
+        current = stats(client)
+        return current["applied"] > before["applied"] and not current["pending"]
+
+    wait_for(applied)
+    assert client.get(path).json()["price"] == 12.5
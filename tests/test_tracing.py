@@ -0,0 +1,115 @@
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.tracing import (
+    FILE,
+    Span,
+    TracingMiddleware,
+    exporter,
+    otlp_payload,
+    parse_traceparent,
+    span,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+async def work(request):
+    with span("work", item=request.path_params["item"]):
+        try:
+            with span("lookup"):
+                raise KeyError(request.path_params["item"])
+        except KeyError:
+            pass
+    return PlainTextResponse("ok")
+
+
+def traced_app(sample_rate: float) -> TestClient:
+    app = Starlette(routes=[Route("/work/{item}", work)])
+    return TestClient(TracingMiddleware(app, sample_rate=sample_rate))
+
+
+@pytest.fixture
+def exported(tmp_path):
+    path = str(tmp_path / "spans.jsonl")
+    exporter.start(FILE, path, "", "test")
+
+    def spans() -> list:
+        exporter.stop()
+        with open(path) as fh:
+            return [json.loads(line) for line in fh]
+
+    try:
+        yield spans
+    finally:
+        exporter.stop()
+
+
+def test_sampled_request(exported):
+    response = traced_app(1.0).get("/work/7")
+    trace_id = response.headers["X-Trace-Id"]
+
+    lookup, work_span, root = exported()
+    assert {lookup["trace_id"], work_span["trace_id"], root["trace_id"]} == {trace_id}
+    assert (root["name"], root["parent_id"]) == ("GET /work/{item}", None)
+    assert root["attributes"]["http.status_code"] == 200
+    assert work_span["parent_id"] == root["span_id"]
+    assert work_span["attributes"] == {"item": "7"}
+    assert lookup["parent_id"] == work_span["span_id"]
+    # the type only, never the message
+    assert lookup["attributes"] == {"error": "KeyError"}
+
+
+def test_traceparent_decides(exported):
+    sampled = "00-%s-%s-01" % (TRACE_ID, PARENT_ID)
+    response = traced_app(0.0).get("/work/1", headers={"traceparent": sampled})
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+
+    unsampled = "00-%s-%s-00" % (TRACE_ID, PARENT_ID)
+    response = traced_app(1.0).get("/work/2", headers={"traceparent": unsampled})
+    assert "X-Trace-Id" not in response.headers
+
+    root = exported()[-1]
+    assert (root["trace_id"], root["parent_id"]) == (TRACE_ID, PARENT_ID)
+
+
+def test_exporter_stopped():
+    # nothing would ship the trace, so nothing is traced
+    assert "X-Trace-Id" not in traced_app(1.0).get("/work/1").headers
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "00-%s-%s" % (TRACE_ID, PARENT_ID),
+        "00-%s-%s-01" % (TRACE_ID[:16], PARENT_ID),
+        "00-%s-%s-zz" % (TRACE_ID, PARENT_ID),
+    ],
+)
+def test_malformed_traceparent(value):
+    assert parse_traceparent(value) is None
+
+
+def test_otlp_payload():
+    root = Span("GET /work/{item}", TRACE_ID, None, [], {"http.status_code": 200})
+    root.child("work", {"cached": True, "ratio": 0.5}).finish()
+    root.finish()
+    [resource] = otlp_payload("shares", root.spans)["resourceSpans"]
+    assert resource["resource"]["attributes"][0]["value"] == {"stringValue": "shares"}
+    child, parent = resource["scopeSpans"][0]["spans"]
+    assert (parent["kind"], parent["parentSpanId"]) == (2, "")
+    assert (child["kind"], child["parentSpanId"]) == (1, root.span_id)
+    assert parent["attributes"] == [
+        {"key": "http.status_code", "value": {"intValue": "200"}}
+    ]
+    assert child["attributes"] == [
+        {"key": "cached", "value": {"boolValue": True}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+    ]